@@ -0,0 +1,117 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Epsilon greedy action selection
+
+import argparse
+import time
+import numpy as np
+
+#=============================
+# EpsilonGreedy
+#
+# - Class to pick epsilon greedy actions over flat action indices, one state at a time
+# - random numbers are drawn from the learner's np.random.Generator a block at a time (into the same buffers),
+#	every choice uses up one draw of each block whichever way it goes
+#=============================
+class EpsilonGreedy():
+
+	#=============================
+	# __init__()
+	#@param	num_actions			number of (flat) actions
+	#@param	random_generator	np.random.Generator to draw from
+	#@param	block_size			draws per refill
+	#@param	random_ties			False = the first best action (like np.argmax), True = a random one of the best actions
+	#=============================
+	def __init__(self, num_actions, random_generator, block_size=4096, random_ties=False):
+		self.num_actions = num_actions
+		self.random_generator = random_generator
+		self.block_size = block_size
+		self.random_ties = random_ties
+		self.draw_buffer = np.empty((3, block_size))
+		self.is_max = np.empty(num_actions, dtype=bool)
+		self.max_counts = np.empty(num_actions, dtype=np.intp)
+		self.refill()
+
+	#=============================
+	# refill()
+	#	- draw the next block of random numbers
+	#	- lists, indexing them is cheaper than indexing an ndarray from python
+	#=============================
+	def refill(self):
+		self.random_generator.random(out=self.draw_buffer)
+		self.explore_draws = self.draw_buffer[0].tolist()
+		self.random_actions = (self.draw_buffer[1] * self.num_actions).astype(np.intp).tolist()
+		self.tie_draws = self.draw_buffer[2].tolist()
+		self.draw_idx = 0
+
+	#=============================
+	# choose()
+	#	- epsilon greedy action
+	#@param	action_vals	ndarray of the state's (flat) action values
+	#@param	epsilon		probability of a random action
+	#@return	int flat action index
+	#=============================
+	def choose(self, action_vals, epsilon):
+		if self.draw_idx == self.block_size:
+			self.refill()
+		draw_idx = self.draw_idx
+		self.draw_idx += 1
+
+		if self.explore_draws[draw_idx] < epsilon:
+			return self.random_actions[draw_idx]
+
+		action = int(action_vals.argmax())
+		if self.random_ties:
+			#Pick one of the equal best actions w/out allocating: mark them, count them, then find the picked one
+			np.equal(action_vals, action_vals[action], out=self.is_max)
+			num_max = np.count_nonzero(self.is_max)
+			if num_max > 1:
+				np.cumsum(self.is_max, out=self.max_counts)
+				action = int(self.max_counts.searchsorted(int(self.tie_draws[draw_idx] * num_max) + 1))
+		return action
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing epsilon greedy action selection')
+	print()
+	parser = argparse.ArgumentParser(description='test epsilon greedy action selection')
+	parser.add_argument('--choices', type=int, default=200000, help='number of choices to time')
+	parser.add_argument('--epsilon', type=float, default=0.5, help='probability of a random action')
+	args = parser.parse_args()
+
+	num_states = 1000
+	q_table = np.random.rand(num_states, 3, 3) * -1
+	q_table_flat = q_table.reshape(num_states, -1)
+	states = np.random.randint(0, num_states, args.choices).tolist()
+
+	#The original per call selection (ReinforcementLearningQLearning.epsilon_greedy_action_choice())
+	start = time.time()
+	for state in states:
+		actions = q_table[state]
+		if np.random.random() < args.epsilon:
+			action = (np.random.randint(0,3), np.random.randint(0,3))
+		else:
+			raw_index = np.where(actions.max() == actions)
+			action = (raw_index[0][0], raw_index[1][0])
+	print('per call numpy, choices per second:', args.choices / (time.time() - start))
+
+	for random_ties in [False, True]:
+		selector = EpsilonGreedy(9, np.random.default_rng(0), random_ties=random_ties)
+		start = time.time()
+		for state in states:
+			action = selector.choose(q_table_flat[state], args.epsilon)
+		print('EpsilonGreedy random_ties', random_ties, 'choices per second:', args.choices / (time.time() - start))
+
+	#Ties resolve uniformly
+	selector = EpsilonGreedy(9, np.random.default_rng(0), random_ties=True)
+	tied = np.array([-1, 0, -1, 0, -1, -1, 0, -1, -1], dtype=float)
+	counts = np.bincount([selector.choose(tied, 0) for idx in range(30000)], minlength=9)
+	print('choices of 3 tied actions (1, 3, 6):', counts.tolist())
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,357 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Benchmark suite: timings of Track, Car & every solver, compared to a stored baseline
+
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from track import Track
+from car import Car
+from action_selection import EpsilonGreedy
+from track_generator import get_generated_track
+from reinforcement_learning_value_iteration import ReinforcementLearningValueIteration
+from reinforcement_learning_q_learning import ReinforcementLearningQLearning
+from reinforcement_learning_sarsa_learning import ReinforcementLearningSarsaLearning
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'baseline.json')
+
+#=============================
+# get_random_positions()
+#	- fixed random positions over (& just off) the grid of a track
+#@return	list of [x, y] positions
+#=============================
+def get_random_positions(track, random_generator, num_positions, margin=2):
+	x = random_generator.integers(-margin, track.shape[0] + margin, num_positions)
+	y = random_generator.integers(-margin, track.shape[1] + margin, num_positions)
+	return np.stack((x, y), axis=1).tolist()
+
+#=============================
+# benchmark_calibration()
+#	- fixed python & numpy work that no change to the repo touches, a measure of the machine's speed (see compare_results())
+#@return	(seconds, operations)
+#=============================
+def benchmark_calibration(track_file, seed, options):
+	values = np.random.default_rng(seed).random(1 << 16)
+	start_time = time.perf_counter()
+	total = 0
+	for idx in range(0, options['micro_operations']):
+		total += idx % 7
+	for idx in range(0, 100):
+		values = np.sort(values)[::-1]
+	return (time.perf_counter() - start_time, options['micro_operations'] + 100)
+
+#=============================
+# benchmark_is_wall_point()
+#	- Track.is_wall_point() on fixed random positions
+#@return	(seconds, operations)
+#=============================
+def benchmark_is_wall_point(track_file, seed, options):
+	track = Track(track_file)
+	positions = get_random_positions(track, np.random.default_rng(seed), options['micro_operations'])
+	start_time = time.perf_counter()
+	for position in positions:
+		track.is_wall_point(position)
+	return (time.perf_counter() - start_time, len(positions))
+
+#=============================
+# benchmark_check_finish_line()
+#	- Track.check_finish_line() on fixed random moves (any velocity) from valid points
+#@return	(seconds, operations)
+#=============================
+def benchmark_check_finish_line(track_file, seed, options):
+	track = Track(track_file)
+	random_generator = np.random.default_rng(seed)
+	points = track.valid_point_array[random_generator.integers(0, len(track.valid_point_array), options['micro_operations'])]
+	velocities = random_generator.integers(-5, 6, points.shape)
+	positions1 = points.tolist()
+	positions2 = (points + velocities).tolist()
+	start_time = time.perf_counter()
+	for position1, position2 in zip(positions1, positions2):
+		track.check_finish_line(position1, position2)
+	return (time.perf_counter() - start_time, len(positions1))
+
+#=============================
+# benchmark_accelerate_move()
+#	- Car.accelerate() + Car.move() w/ fixed random accelerations, back to the start line after finishing
+#@return	(seconds, operations)
+#=============================
+def benchmark_accelerate_move(track_file, seed, options):
+	track = Track(track_file)
+	random_generator = np.random.default_rng(seed)
+	accelerations = random_generator.integers(-1, 2, (options['micro_operations'], 2)).tolist()
+	start_points = track.start_points
+	car = Car(track, list(start_points[0]), [0,0], options['crash_algo'])
+	start_time = time.perf_counter()
+	for idx, acceleration in enumerate(accelerations):
+		car.accelerate(acceleration)
+		if car.move():
+			car.position = list(start_points[idx % len(start_points)])
+			car.velocity = [0,0]
+	return (time.perf_counter() - start_time, len(accelerations))
+
+#=============================
+# benchmark_epsilon_greedy()
+#	- EpsilonGreedy.choose() on fixed random action values (doesn't use the track)
+#@return	(seconds, operations)
+#=============================
+def benchmark_epsilon_greedy(track_file, seed, options):
+	random_generator = np.random.default_rng(seed)
+	q_table = random_generator.random((1000, 9)) * -1
+	states = random_generator.integers(0, len(q_table), options['micro_operations']).tolist()
+	action_selector = EpsilonGreedy(9, random_generator)
+	start_time = time.perf_counter()
+	for state in states:
+		action_selector.choose(q_table[state], 0.5)
+	return (time.perf_counter() - start_time, len(states))
+
+#=============================
+# run_value_iteration()
+#	- value iteration (numpy engine, jacobi sweeps) from scratch, the transition model is built before the clock starts
+#@return	(seconds, sweeps)
+#=============================
+def run_value_iteration(track_file, crash_algo, max_iterations):
+	value_iteration = ReinforcementLearningValueIteration(track_file, 'numpy')
+	value_iteration.get_transition_model(crash_algo)
+	start_time = time.perf_counter()
+	learn_result = value_iteration.train(max_iterations, crash_algo)
+	return (time.perf_counter() - start_time, learn_result[0])
+
+#=============================
+# benchmark_value_iteration_sweep()
+#	- one value iteration sweep
+#@return	(seconds, sweeps)
+#=============================
+def benchmark_value_iteration_sweep(track_file, seed, options):
+	return run_value_iteration(track_file, options['crash_algo'], 1)
+
+#=============================
+# benchmark_value_iteration_solve()
+#	- value iteration until it converges
+#@return	(seconds, sweeps)
+#=============================
+def benchmark_value_iteration_solve(track_file, seed, options):
+	return run_value_iteration(track_file, options['crash_algo'], 999)
+
+#=============================
+# run_learner()
+#	- seeded train() episodes of a learner from scratch, the transition model is built before the clock starts
+#@return	(seconds, environment steps)
+#=============================
+def run_learner(learner_class, track_file, seed, options):
+	learner = learner_class(track_file, seed=seed)
+	learner.get_transition_model(options['crash_algo'])
+	start_time = time.perf_counter()
+	learn_result = learner.train(options['episodes'], options['crash_algo'])
+	return (time.perf_counter() - start_time, int(np.sum(learn_result[0])))
+
+#=============================
+# benchmark_q_learning_episodes()
+#@return	(seconds, environment steps)
+#=============================
+def benchmark_q_learning_episodes(track_file, seed, options):
+	return run_learner(ReinforcementLearningQLearning, track_file, seed, options)
+
+#=============================
+# benchmark_sarsa_episodes()
+#@return	(seconds, environment steps)
+#=============================
+def benchmark_sarsa_episodes(track_file, seed, options):
+	return run_learner(ReinforcementLearningSarsaLearning, track_file, seed, options)
+
+BENCHMARKS = {'calibration': benchmark_calibration,
+		'is_wall_point': benchmark_is_wall_point,
+		'check_finish_line': benchmark_check_finish_line,
+		'accelerate_move': benchmark_accelerate_move,
+		'epsilon_greedy': benchmark_epsilon_greedy,
+		'value_iteration_sweep': benchmark_value_iteration_sweep,
+		'value_iteration_solve': benchmark_value_iteration_solve,
+		'q_learning_episodes': benchmark_q_learning_episodes,
+		'sarsa_episodes': benchmark_sarsa_episodes}
+TRACK_INDEPENDENT = ['calibration', 'epsilon_greedy'] #run once, not once per track
+CALIBRATION_KEY = 'any/calibration'
+
+#=============================
+# get_loops()
+#	- calls of a benchmark per timed sample, so a sample takes at least min_seconds (short runs are mostly timer & scheduler noise)
+#@param	seconds		timed seconds of one call
+#=============================
+def get_loops(seconds, min_seconds):
+	if seconds <= 0:
+		return 1
+	return max(1, int(np.ceil(min_seconds / seconds)))
+
+#=============================
+# run_benchmarks()
+#	- run every benchmark repeats times, every run w/ the same seed
+#	- a run calls its benchmark enough times to take at least min_seconds (see get_loops()), its seconds are per call
+#	- runs are interleaved (every benchmark once per round), so a slow spell of the machine hits every benchmark
+#		a little instead of one benchmark a lot, the median run of each is kept (the fastest run is an outlier too)
+#@param	runs	list of (track file, benchmark name), track file None for the TRACK_INDEPENDENT ones
+#@return	dict 'track name/benchmark name' -> dict: seconds (median run, per call), min_seconds, mean_seconds, operations (of one call),
+#			operations_per_second, loops (calls per run), runs (seconds of every run, per call)
+#=============================
+def run_benchmarks(runs, seed, repeats, options, min_seconds=0.2):
+	#One untimed warm up round (first imports, file caches, allocations) that also sizes the runs,
+	#no garbage collection pauses while timing (same as timeit)
+	loops = list()
+	for track_file, benchmark_name in runs:
+		loops.append(get_loops(BENCHMARKS[benchmark_name](track_file, seed, options)[0], min_seconds))
+	run_seconds = [list() for run in runs]
+	operations = [0] * len(runs)
+	gc.disable()
+	for repeat in range(0, repeats):
+		for run_idx, (track_file, benchmark_name) in enumerate(runs):
+			seconds = 0
+			for loop in range(0, loops[run_idx]):
+				call_seconds, operations[run_idx] = BENCHMARKS[benchmark_name](track_file, seed, options)
+				seconds += call_seconds
+			run_seconds[run_idx].append(seconds / loops[run_idx])
+	gc.enable()
+
+	results = dict()
+	for run_idx, (track_file, benchmark_name) in enumerate(runs):
+		track_name = os.path.splitext(os.path.basename(track_file))[0] if track_file is not None else 'any'
+		seconds = float(np.median(run_seconds[run_idx]))
+		results['%s/%s' % (track_name, benchmark_name)] = {'seconds': seconds,
+				'min_seconds': min(run_seconds[run_idx]),
+				'mean_seconds': float(np.mean(run_seconds[run_idx])),
+				'operations': operations[run_idx],
+				'operations_per_second': operations[run_idx] / seconds if seconds > 0 else 0.0,
+				'loops': loops[run_idx],
+				'runs': run_seconds[run_idx]}
+	return results
+
+#=============================
+# compare_results()
+#	- results vs a baseline, a benchmark regresses when its median run is more than threshold (relative) slower
+#	- normalize = divide every ratio by the calibration ratio, for a baseline from a faster or slower machine
+#		(or the same machine in a faster or slower spell)
+#	- benchmarks missing from either side are skipped
+#@return	list of (key, baseline seconds, seconds, ratio, regressed) by key
+#=============================
+def compare_results(results, baseline, threshold, normalize=False):
+	machine_ratio = 1.0
+	if normalize and CALIBRATION_KEY in results and CALIBRATION_KEY in baseline:
+		machine_ratio = results[CALIBRATION_KEY]['seconds'] / baseline[CALIBRATION_KEY]['seconds']
+	comparison = list()
+	for key in sorted(results):
+		if key not in baseline or key == CALIBRATION_KEY:
+			continue
+		baseline_seconds = baseline[key]['seconds']
+		seconds = results[key]['seconds']
+		ratio = seconds / baseline_seconds / machine_ratio if baseline_seconds > 0 else 1.0
+		comparison.append((key, baseline_seconds, seconds, ratio, ratio > 1 + threshold))
+	return comparison
+
+#=============================
+# confirm_regressions()
+#	- run the benchmarks that regressed again & keep the faster median of the two, a benchmark only regresses if it is slow both times
+#@param	runs		the runs results came from
+#@return	(results w/ the re-run benchmarks updated, new comparison)
+#=============================
+def confirm_regressions(results, comparison, baseline, runs, seed, repeats, options, min_seconds, threshold, normalize=False):
+	regressed_keys = [key for key, baseline_seconds, seconds, ratio, regressed in comparison if regressed]
+	rerun_keys = set(regressed_keys + ([CALIBRATION_KEY] if normalize and CALIBRATION_KEY in results else []))
+	reruns = [(track_file, benchmark_name) for track_file, benchmark_name in runs \
+			if '%s/%s' % (os.path.splitext(os.path.basename(track_file))[0] if track_file is not None else 'any', benchmark_name) in rerun_keys]
+	rerun_results = run_benchmarks(reruns, seed, repeats, options, min_seconds)
+	results = dict(results)
+	for key, result in rerun_results.items():
+		if key == CALIBRATION_KEY:
+			#The machine speed of the re-runs, not the fastest of two
+			results[key] = result
+		elif result['seconds'] < results[key]['seconds']:
+			results[key] = result
+	return (results, compare_results(results, baseline, threshold, normalize))
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - benchmark suite')
+	parser = argparse.ArgumentParser(description='benchmark suite, exits w/ 1 if a benchmark regressed vs the baseline')
+	parser.add_argument('track_files', type=str, nargs='*', help='track file names, default = every track in data/')
+	parser.add_argument('--generated_sizes', type=int, nargs='*', default=[], help='also benchmark generated (size x size) tracks')
+	parser.add_argument('--benchmarks', type=str, nargs='+', default=list(BENCHMARKS), help='benchmarks to run')
+	parser.add_argument('--repeats', type=int, default=5, help='runs of every benchmark, the median is kept')
+	parser.add_argument('--min_seconds', type=float, default=0.2, help='a run repeats its benchmark until it takes at least this long')
+	parser.add_argument('--micro_operations', type=int, default=50000, help='calls per micro benchmark run')
+	parser.add_argument('--episodes', type=int, default=200, help='episodes per learner run')
+	parser.add_argument('--crash_algo', type=int, default=0, help='crash algo: 0 = minor, 1 = major')
+	parser.add_argument('--seed', type=int, default=0, help='seed of every run')
+	parser.add_argument('--output', type=str, default=None, help='json file to write the results to')
+	parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='json results to compare against')
+	parser.add_argument('--threshold', type=float, default=0.25, help='slowdown (relative) vs the baseline that counts as a regression')
+	parser.add_argument('--absolute', action='store_true', help='compare raw seconds, not scaled by the calibration benchmark (machine speed)')
+	parser.add_argument('--save_baseline', action='store_true', help='write the results as the new baseline instead of comparing')
+	args = parser.parse_args()
+
+	track_files = args.track_files if len(args.track_files) > 0 else sorted(glob.glob(os.path.join(DATA_DIR, '*.txt')))
+	track_files = track_files + [get_generated_track(size, size) for size in args.generated_sizes]
+	options = {'micro_operations': args.micro_operations, 'episodes': args.episodes, 'crash_algo': args.crash_algo}
+
+	print()
+	print('track/benchmark, seconds (median of %d), operations, operations per second, calls per run' % args.repeats)
+	benchmark_names = args.benchmarks
+	normalize = not args.absolute
+	if normalize and 'calibration' not in benchmark_names:
+		benchmark_names = ['calibration'] + benchmark_names
+	runs = [(None, benchmark_name) for benchmark_name in benchmark_names if benchmark_name in TRACK_INDEPENDENT]
+	runs += [(track_file, benchmark_name) for track_file in track_files for benchmark_name in benchmark_names \
+			if benchmark_name not in TRACK_INDEPENDENT]
+	results = run_benchmarks(runs, args.seed, args.repeats, options, args.min_seconds)
+	for key, result in results.items():
+		print(key, '%.6f' % result['seconds'], result['operations'], '%.1f' % result['operations_per_second'], result['loops'])
+
+	report = {'python': platform.python_version(),
+			'numpy': np.__version__,
+			'machine': platform.platform(),
+			'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+			'options': {name: value for name, value in vars(args).items() if name not in ['output', 'baseline']},
+			'results': results}
+	if args.output is not None:
+		with open(args.output, 'w') as output_file:
+			json.dump(report, output_file, indent=1)
+		print('results written to', args.output)
+
+	if args.save_baseline:
+		os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+		with open(args.baseline, 'w') as baseline_file:
+			json.dump(report, baseline_file, indent=1)
+		print('baseline written to', args.baseline)
+		return
+	if not os.path.exists(args.baseline):
+		print('no baseline at', args.baseline, '(write one w/ --save_baseline)')
+		return
+
+	with open(args.baseline) as baseline_file:
+		baseline = json.load(baseline_file)['results']
+	comparison = compare_results(results, baseline, args.threshold, normalize)
+	if any(regressed for key, baseline_seconds, seconds, ratio, regressed in comparison):
+		#A single slow spell of the machine is not a regression
+		print()
+		print('re-running', sum(1 for entry in comparison if entry[4]), 'slow benchmark(s)')
+		results, comparison = confirm_regressions(results, comparison, baseline, runs, args.seed, args.repeats, options,
+				args.min_seconds, args.threshold, normalize)
+	print()
+	print('benchmark, baseline seconds, seconds, ratio, regressed (> %.2f)' % (1 + args.threshold))
+	for key, baseline_seconds, seconds, ratio, regressed in comparison:
+		print(key, '%.6f' % baseline_seconds, '%.6f' % seconds, '%.2f' % ratio, 'REGRESSION' if regressed else 'ok')
+	regressions = [key for key, baseline_seconds, seconds, ratio, regressed in comparison if regressed]
+	print()
+	print('regressions:', len(regressions), 'of', len(comparison), 'benchmarks compared')
+	if len(regressions) > 0:
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
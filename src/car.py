@@ -6,6 +6,7 @@
 
 from track import Track
 import argparse
+import random
 
 #=============================
 # Car
@@ -17,13 +18,17 @@ class Car():
 	# __init__()
 	#	- constructor
 	#	- Crash_type = 0 for minor, 1 for major
+	#	- acceleration_failure = probability an acceleration has no effect (0 = deterministic)
+	#	- path_table = optional PathTable, check the whole path of a move instead of only the landing cell
 	#=============================
-	def __init__(self, track, position=[0,0], velocity=[0,0], crash_type=0):
+	def __init__(self, track, position=[0,0], velocity=[0,0], crash_type=0, acceleration_failure=0, path_table=None):
 		self.track = track
 		self.position = position
 		self.previous_position = position
 		self.velocity = velocity
 		self.velocity_limit = 5
+		self.acceleration_failure = acceleration_failure
+		self.path_table = path_table
 		if (crash_type == 0):
 			self.crash = self.minor_crash
 		else:
@@ -32,6 +37,7 @@ class Car():
 	#=============================
 	# accelerate()
 	#	- apply acceleration (effectivley change velocity)
+	#	- fails (velocity unchanged) w/ probability acceleration_failure
 	#@param		acceleration	(x,y) values
 	#=============================
 	def accelerate(self, acceleration):
@@ -40,6 +46,9 @@ class Car():
 			print('bad acceleration:', acceleration)
 			return
 
+		if self.acceleration_failure > 0 and random.random() < self.acceleration_failure:
+			return self.velocity
+
 		new_x_velocity = self.velocity[0] + acceleration[0]
 		new_y_velocity = self.velocity[1] + acceleration[1]
 
@@ -53,16 +62,23 @@ class Car():
 	#=============================
 	# move()
 	#	- apply velocity to position, check for walls & finish line
+	#	- w/ a path_table, walls & finish cells anywhere along the path count (one lookup, no tunneling)
 	#@return	crossed finish line True, False
 	#=============================
 	def move(self):
 		self.previous_position = self.position
 		next_position = [self.position[0] + self.velocity[0], self.position[1] + self.velocity[1]]
 
-		if (self.track.check_finish_line(self.position, next_position)):
+		if self.path_table is not None:
+			crossed_finish, crashed = self.path_table.get_path_result(self.position, self.velocity)
+		else:
+			crossed_finish = self.track.check_finish_line(self.position, next_position)
+			crashed = not crossed_finish and self.will_crash(next_position)
+
+		if (crossed_finish):
 			#Crossed the finish line!
 			return True
-		elif (self.will_crash(next_position)):
+		elif (crashed):
 			#Handle crash
 			self.crash()
 		else:
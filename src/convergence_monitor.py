@@ -0,0 +1,103 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Early stopping criteria for Q-learning & SARSA training
+
+import numpy as np
+
+#=============================
+# ConvergenceMonitor
+#
+# - Class to decide when a training run has converged, checked once per episode
+# - steps: the mean steps of the last window episodes moved <= steps_tolerance (relative) from the window before
+# - q_change: no q-value changed by more than q_change_tolerance in the last window episodes
+# - policy: every policy_check_interval episodes the greedy policy (first best action of every state) is compared
+#	to the last check, <= policy_tolerance of the states changing counts as stable, policy_checks stable checks in a row are needed
+# - training stops once every criterion in criteria is met
+#=============================
+class ConvergenceMonitor():
+
+	#=============================
+	# __init__()
+	#@param	criteria	criteria that must all be met, any of 'steps', 'q_change', 'policy'
+	#=============================
+	def __init__(self, criteria=('steps', 'q_change', 'policy'), window=100, steps_tolerance=0.1, q_change_tolerance=0.05,
+			policy_check_interval=100, policy_tolerance=0.001, policy_checks=3):
+		self.criteria = criteria
+		self.window = window
+		self.steps_tolerance = steps_tolerance
+		self.q_change_tolerance = q_change_tolerance
+		self.policy_check_interval = policy_check_interval
+		self.policy_tolerance = policy_tolerance
+		self.policy_checks = policy_checks
+
+	#=============================
+	# start()
+	#	- reset for a new training run
+	#@param	q_table	the learner's q_table (any shape w/ states first)
+	#=============================
+	def start(self, q_table):
+		self.q_table = q_table.reshape(len(q_table), -1)
+		self.episode_steps = list()
+		self.q_changes = list()
+		self.policy = np.argmax(self.q_table, axis=1)
+		self.stable_policy_checks = 0
+		self.policy_change = 1.0
+
+	#=============================
+	# get_steps_change()
+	#	- relative change of the mean steps of the last window episodes vs the window before, None = too few episodes
+	#=============================
+	def get_steps_change(self):
+		if len(self.episode_steps) < 2 * self.window:
+			return None
+		last_mean = np.mean(self.episode_steps[-self.window:])
+		previous_mean = np.mean(self.episode_steps[-2 * self.window:-self.window])
+		return abs(last_mean - previous_mean) / previous_mean
+
+	#=============================
+	# check_policy()
+	#	- compare the greedy policy to the last check's
+	#=============================
+	def check_policy(self):
+		policy = np.argmax(self.q_table, axis=1)
+		self.policy_change = float(np.mean(policy != self.policy))
+		self.policy = policy
+		if self.policy_change <= self.policy_tolerance:
+			self.stable_policy_checks += 1
+		else:
+			self.stable_policy_checks = 0
+
+	#=============================
+	# end_episode()
+	#	- record an episode & check the criteria
+	#@param	steps		steps the episode took
+	#@param	q_change	biggest absolute q-value change made during the episode
+	#@return	the reason to stop (a description of every criterion met), None = keep training
+	#=============================
+	def end_episode(self, steps, q_change):
+		self.episode_steps.append(steps)
+		self.q_changes.append(q_change)
+		if len(self.episode_steps) % self.policy_check_interval == 0:
+			self.check_policy()
+
+		reasons = list()
+		if 'steps' in self.criteria:
+			steps_change = self.get_steps_change()
+			if steps_change is None or steps_change > self.steps_tolerance:
+				return None
+			reasons.append('mean steps of the last %d episodes changed %.3f <= %g' % (self.window, steps_change, self.steps_tolerance))
+		if 'q_change' in self.criteria:
+			if len(self.q_changes) < self.window:
+				return None
+			q_change = max(self.q_changes[-self.window:])
+			if q_change > self.q_change_tolerance:
+				return None
+			reasons.append('max q change of the last %d episodes %.4f <= %g' % (self.window, q_change, self.q_change_tolerance))
+		if 'policy' in self.criteria:
+			if self.stable_policy_checks < self.policy_checks:
+				return None
+			reasons.append('greedy policy stable for %d checks (last change %.4f <= %g of the states)' % (self.stable_policy_checks,
+					self.policy_change, self.policy_tolerance))
+		return ', '.join(reasons)
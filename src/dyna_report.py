@@ -0,0 +1,79 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Dyna-Q vs plain Q-learning convergence report
+
+import argparse
+import time
+import numpy as np
+from reinforcement_learning_q_learning import ReinforcementLearningQLearning
+
+#=============================
+# run_q_learning()
+#	- train one seeded q-learning model & time it (the transition model is built before the clock starts)
+#@param	planning_steps	0 = train(), > 0 = train_dyna()
+#@return	(steps per episode array, seconds)
+#=============================
+def run_q_learning(track_file, crash_algo, number_of_iterations, planning_steps, seed, buffer_capacity=100000):
+	q_learning = ReinforcementLearningQLearning(track_file, seed=seed)
+	q_learning.get_transition_model(crash_algo)
+	start_time = time.time()
+	if planning_steps > 0:
+		learn_result = q_learning.train_dyna(number_of_iterations, crash_algo, planning_steps, buffer_capacity)
+	else:
+		learn_result = q_learning.train(number_of_iterations, crash_algo)
+	return (np.array(learn_result[0]), time.time() - start_time)
+
+#=============================
+# get_rolling_mean()
+#	- mean steps of the last window episodes, for every episode from the window-th on
+#=============================
+def get_rolling_mean(episode_steps, window):
+	totals = np.cumsum(np.concatenate(([0], episode_steps)))
+	return (totals[window:] - totals[:-window]) / window
+
+#=============================
+# get_episodes_to_convergence()
+#	- first episode at which the rolling mean of steps is at or under target_steps, None = never
+#=============================
+def get_episodes_to_convergence(rolling_mean, window, target_steps):
+	converged = np.flatnonzero(rolling_mean <= target_steps)
+	if len(converged) == 0:
+		return None
+	return int(converged[0]) + window
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - Dyna-Q convergence report')
+	parser = argparse.ArgumentParser(description='Dyna-Q convergence report')
+	parser.add_argument('track_files', type=str, nargs='+', help='track file names')
+	parser.add_argument('--crash_algorithms', type=int, nargs='+', default=[0], help='crash algos: 0 = minor, 1 = major')
+	parser.add_argument('--episodes', type=int, default=3000, help='episodes per run')
+	parser.add_argument('--planning_steps', type=int, nargs='+', default=[0, 4, 16], help='planning updates per step, 0 = plain q-learning')
+	parser.add_argument('--buffer_capacity', type=int, default=100000, help='transitions kept for planning')
+	parser.add_argument('--window', type=int, default=100, help='episodes in the rolling mean of steps')
+	parser.add_argument('--tolerance', type=float, default=1.5, help='converged = rolling mean <= tolerance * best rolling mean of the track')
+	parser.add_argument('--seed', type=int, default=0, help='seed of every run')
+	args = parser.parse_args()
+
+	print()
+	print('track, crash algo, planning steps, seconds, total steps, episodes to convergence, final rolling mean steps')
+	for track_file in args.track_files:
+		for crash_algo in args.crash_algorithms:
+			runs = list()
+			for planning_steps in args.planning_steps:
+				episode_steps, seconds = run_q_learning(track_file, crash_algo, args.episodes, planning_steps, args.seed, args.buffer_capacity)
+				runs.append((planning_steps, seconds, episode_steps, get_rolling_mean(episode_steps, args.window)))
+
+			#Every run of a track is held to the same target
+			target_steps = args.tolerance * min([np.min(run[3]) for run in runs])
+			for planning_steps, seconds, episode_steps, rolling_mean in runs:
+				print(track_file, crash_algo, planning_steps, '%.2f' % seconds, int(np.sum(episode_steps)),
+						get_episodes_to_convergence(rolling_mean, args.window, target_steps), '%.1f' % rolling_mean[-1])
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,163 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Whole-episode Q-learning/SARSA kernels, compiled w/ numba when it's installed
+
+import argparse
+import time
+import numpy as np
+from track import Track
+from transition_model import TransitionModel
+
+try:
+	from numba import njit
+	from numba.extending import register_jitable
+except ImportError:
+	njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+#=============================
+# choose_action()
+#	- epsilon greedy action (the first best action) from 2 pre-drawn uniforms
+#@return	flat action index
+#=============================
+def choose_action(q_table, state, epsilon, explore_draw, action_draw):
+	num_actions = q_table.shape[1]
+	if explore_draw < epsilon:
+		return int(action_draw * num_actions)
+	action = 0
+	for idx in range(1, num_actions):
+		if q_table[state, idx] > q_table[state, action]:
+			action = idx
+	return action
+
+#=============================
+# run_episodes()
+#	- Q-learning or SARSA episodes, same updates & decays as the learners' train()
+#	- dynamics, crashes (minor or major, whichever the transition model was built w/) & the finish line
+#		all come from the transition model tables
+#	- every step uses one row of draws: (explore, random action, acceleration failure, start point),
+#		the start point column is only used by an episode's first row (& not at all w/ start_by_episode)
+#	- stops when episode_steps is full or the rows left might not fit a whole episode
+#@param	next_state, reward, finish	TransitionModel tables
+#@param	q_table			(states, actions) table, updated in place
+#@param	start_states	state ids episodes start from (a random one each)
+#@param	start_by_episode	True = start_states holds the start state of every episode, in order
+#@param	draws			(rows, 4) uniforms
+#@param	rates			[learning_rate, min_learning_rate, discount_factor, epsilon, decay], updated in place
+#@param	episode_steps	out, steps of each episode
+#@param	crossed_finish	out, whether each episode crossed the finish line
+#@return	(episodes run, rows of draws used)
+#=============================
+def run_episodes(next_state, reward, finish, q_table, start_states, draws, max_steps, acceleration_failure, failure_action,
+		sarsa, rates, episode_steps, crossed_finish, start_by_episode=False):
+	draw_idx = 0
+	episode = 0
+	while episode < episode_steps.shape[0] and draw_idx + max_steps <= draws.shape[0]:
+		if start_by_episode:
+			state = start_states[episode]
+		else:
+			state = start_states[int(draws[draw_idx, 3] * start_states.shape[0])]
+
+		#Reduce learning & epsilon value over time to explore less and learn less
+		if rates[0] > rates[1]:
+			rates[0] *= rates[4]
+		rates[3] *= rates[4]
+		learning_rate = rates[0]
+		discount_factor = rates[2]
+		epsilon = rates[3]
+
+		action = choose_action(q_table, state, epsilon, draws[draw_idx, 0], draws[draw_idx, 1])
+		steps = 0
+		done = False
+		while not done and steps < max_steps:
+			steps += 1
+			applied_action = action
+			if draws[draw_idx, 2] < acceleration_failure:
+				applied_action = failure_action
+			draw_idx += 1
+
+			state_next = next_state[state, applied_action]
+			done = finish[state, applied_action] == 1
+			if not done:
+				if sarsa:
+					action_next = choose_action(q_table, state_next, epsilon, draws[draw_idx, 0], draws[draw_idx, 1])
+					q_val_next = q_table[state_next, action_next]
+				else:
+					q_val_next = q_table[state_next, 0]
+					for idx in range(1, q_table.shape[1]):
+						if q_table[state_next, idx] > q_val_next:
+							q_val_next = q_table[state_next, idx]
+
+				q_table[state, action] += learning_rate * \
+						(reward[state, applied_action] + discount_factor * q_val_next - q_table[state, action])
+
+				#Q-learning picks the next action after the update, same as train()
+				if not sarsa:
+					action_next = choose_action(q_table, state_next, epsilon, draws[draw_idx, 0], draws[draw_idx, 1])
+				action = action_next
+			state = state_next
+
+		episode_steps[episode] = steps
+		crossed_finish[episode] = done
+		episode += 1
+	return (episode, draw_idx)
+
+#The interpreted kernel, always available (the compiled one gives bit-identical results)
+#choose_action() stays a plain Python function, register_jitable only lets the compiled kernel call (& compile) it
+run_episodes_python = run_episodes
+if NUMBA_AVAILABLE:
+	register_jitable(choose_action)
+	run_episodes = njit(cache=True)(run_episodes_python)
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing episode kernels')
+	print()
+	parser = argparse.ArgumentParser(description='test episode kernels')
+	parser.add_argument('file_name', type=str, help='track file name')
+	parser.add_argument('crash_algo', type=int, help='crash algorithm, 0 or 1')
+	parser.add_argument('--episodes', type=int, default=200, help='episodes to time')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the draws')
+	args = parser.parse_args()
+	print('INPUT VALUES')
+	print('--------------')
+	print('file_name: ', args.file_name)
+	print('crash_algo: ', args.crash_algo)
+	print('numba available: ', NUMBA_AVAILABLE)
+	print()
+
+	track = Track(args.file_name)
+	transition_model = TransitionModel(track, args.crash_algo)
+	start_states = np.array([transition_model.encode_state(point, [0,0]) for point in track.start_points], dtype=np.int64)
+	max_steps = 999
+	draws = np.random.default_rng(args.seed).random((args.episodes * max_steps, 4))
+
+	kernels = [('python', run_episodes_python)]
+	if NUMBA_AVAILABLE:
+		kernels.append(('numba', run_episodes))
+	for sarsa in [False, True]:
+		results = []
+		for name, kernel in kernels:
+			np.random.seed(args.seed)
+			q_table = np.random.rand(transition_model.num_states, transition_model.num_actions) * -1
+			rates = np.array([0.75, 0.01, 0.95, 0.5, 0.9999])
+			episode_steps = np.zeros(args.episodes, dtype=np.int64)
+			crossed_finish = np.zeros(args.episodes, dtype=bool)
+			start = time.time()
+			episodes, rows = kernel(transition_model.next_state, transition_model.reward, transition_model.finish, q_table,
+					start_states, draws, max_steps, transition_model.acceleration_failure, transition_model.failure_action,
+					sarsa, rates, episode_steps, crossed_finish)
+			seconds = time.time() - start
+			results.append(q_table)
+			print('sarsa' if sarsa else 'q-learning', name, 'episodes:', episodes, 'steps:', rows, 'steps per second:', rows / seconds)
+		if len(results) > 1:
+			print('bit-identical q_tables:', np.array_equal(results[0], results[1]))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,78 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Fixed capacity ring buffer of observed transitions
+
+import argparse
+import time
+import numpy as np
+
+#=============================
+# ExperienceBuffer
+#
+# - Class to store the last capacity transitions, one (state, action, reward, next_state) row each
+#	(rewards are the transition model's integer rewards)
+# - once full, every add() overwrites the oldest transition
+#=============================
+class ExperienceBuffer():
+
+	#=============================
+	# __init__()
+	#@param	capacity			max transitions stored
+	#@param	random_generator	np.random.Generator sample() draws from
+	#=============================
+	def __init__(self, capacity, random_generator):
+		self.capacity = capacity
+		self.random_generator = random_generator
+		self.transitions = np.zeros((capacity, 4), dtype=np.int64)
+		self.size = 0
+		self.next_idx = 0
+
+	#=============================
+	# add()
+	#	- store one transition
+	#=============================
+	def add(self, state, action, reward, next_state):
+		idx = self.next_idx
+		self.transitions[idx] = (state, action, reward, next_state)
+		self.next_idx = idx + 1 if idx + 1 < self.capacity else 0
+		if self.size < self.capacity:
+			self.size += 1
+
+	#=============================
+	# sample()
+	#	- uniformly sample stored transitions (w/ replacement)
+	#@return	(num_samples, 4) array, columns state, action, reward, next_state
+	#=============================
+	def sample(self, num_samples):
+		return self.transitions[self.random_generator.integers(0, self.size, num_samples)]
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing experience buffer')
+	print()
+	parser = argparse.ArgumentParser(description='test experience buffer')
+	parser.add_argument('--capacity', type=int, default=1000, help='buffer capacity')
+	parser.add_argument('--transitions', type=int, default=100000, help='transitions to add')
+	parser.add_argument('--num_samples', type=int, default=16, help='transitions per sample')
+	args = parser.parse_args()
+
+	experience_buffer = ExperienceBuffer(args.capacity, np.random.default_rng(0))
+	start = time.time()
+	for idx in range(args.transitions):
+		experience_buffer.add(idx, idx % 9, -1, idx + 1)
+	print('adds per second:', args.transitions / (time.time() - start))
+	states = experience_buffer.transitions[:, 0]
+	print('size:', experience_buffer.size, 'oldest state:', int(np.min(states)), 'newest state:', int(np.max(states)))
+
+	start = time.time()
+	for idx in range(args.transitions // 10):
+		samples = experience_buffer.sample(args.num_samples)
+	print('samples of', args.num_samples, 'per second:', (args.transitions // 10) / (time.time() - start))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,64 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Eligibility trace (lambda) vs one step learning curve report
+
+import argparse
+import time
+import numpy as np
+from reinforcement_learning_q_learning import ReinforcementLearningQLearning
+from reinforcement_learning_sarsa_learning import ReinforcementLearningSarsaLearning
+
+LEARNERS = {'q_learning': ReinforcementLearningQLearning, 'sarsa': ReinforcementLearningSarsaLearning}
+
+#=============================
+# run_lambda()
+#	- train one seeded model & time it (the transition model is built before the clock starts)
+#@param	trace_decay	0 = one step train(), > 0 = train_lambda()
+#@return	(steps per episode array, seconds, mean greedy steps from the start line, start points finished)
+#=============================
+def run_lambda(learner_name, track_file, crash_algo, number_of_iterations, trace_decay, seed):
+	learner = LEARNERS[learner_name](track_file, seed=seed)
+	learner.get_transition_model(crash_algo)
+	start_time = time.time()
+	if trace_decay > 0:
+		learn_result = learner.train_lambda(number_of_iterations, crash_algo, trace_decay)
+	else:
+		learn_result = learner.train(number_of_iterations, crash_algo)
+	seconds = time.time() - start_time
+
+	evaluation = learner.evaluate(crash_algo, 1)
+	return (np.array(learn_result[0]), seconds, evaluation['mean_steps'], int(np.sum(evaluation['crossed_finish'])))
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - eligibility trace learning curve report')
+	parser = argparse.ArgumentParser(description='eligibility trace learning curve report')
+	parser.add_argument('track_files', type=str, nargs='+', help='track file names')
+	parser.add_argument('--crash_algorithms', type=int, nargs='+', default=[0], help='crash algos: 0 = minor, 1 = major')
+	parser.add_argument('--learners', type=str, nargs='+', default=['q_learning', 'sarsa'], help='learners to compare')
+	parser.add_argument('--trace_decays', type=float, nargs='+', default=[0, 0.5, 0.9], help='lambdas, 0 = one step')
+	parser.add_argument('--episodes', type=int, default=2000, help='episodes per run')
+	parser.add_argument('--curve_points', type=int, default=5, help='blocks of episodes in the learning curve')
+	parser.add_argument('--seed', type=int, default=0, help='seed of every run')
+	args = parser.parse_args()
+
+	print()
+	print('track, crash algo, learner, lambda, seconds, total steps, greedy mean steps, start points finished, mean steps per block of',
+			args.episodes // args.curve_points, 'episodes')
+	for track_file in args.track_files:
+		for crash_algo in args.crash_algorithms:
+			for learner_name in args.learners:
+				for trace_decay in args.trace_decays:
+					episode_steps, seconds, greedy_steps, finished = run_lambda(learner_name, track_file, crash_algo, args.episodes,
+							trace_decay, args.seed)
+					learning_curve = ['%.1f' % np.mean(block) for block in np.array_split(episode_steps, args.curve_points)]
+					print(track_file, crash_algo, learner_name, trace_decay, '%.2f' % seconds, int(np.sum(episode_steps)),
+							'%.1f' % greedy_steps, finished, ' '.join(learning_curve))
+
+
+if __name__ == '__main__':
+	main()
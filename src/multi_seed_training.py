@@ -0,0 +1,126 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Independent Q-learning/SARSA training runs w/ different seeds across a process pool
+
+import argparse
+import multiprocessing
+import time
+import numpy as np
+from reinforcement_learning_q_learning import ReinforcementLearningQLearning
+from reinforcement_learning_sarsa_learning import ReinforcementLearningSarsaLearning
+
+LEARNERS = {'q_learning': ReinforcementLearningQLearning, 'sarsa': ReinforcementLearningSarsaLearning}
+
+#=============================
+# create_learner()
+#	- construct a learner by name (see LEARNERS)
+#=============================
+def create_learner(learner_name, track_file, reachable_only=False, acceleration_failure=0, path_collisions=False, seed=None):
+	return LEARNERS[learner_name](track_file, reachable_only, acceleration_failure, path_collisions, seed)
+
+#=============================
+# train_seed_worker()
+#	- one training run, the learner's seed drives every random draw (q_table init, start points, actions, acceleration failures)
+#	- runs in a pool process, only arrays go back to the parent
+#@param	training	'serial' = train(), 'kernel' = train_kernel(), 'batch' = train_batch()
+#@return	(seed, q_table as (states, actions) float64, steps per episode int32, crossed finish per episode bool)
+#=============================
+def train_seed_worker(learner_name, track_file, crash_algo, number_of_iterations, seed, training='serial', reachable_only=False,
+		acceleration_failure=0, path_collisions=False, num_cars=256):
+	learner = create_learner(learner_name, track_file, reachable_only, acceleration_failure, path_collisions, seed)
+	if training == 'kernel':
+		learn_result = learner.train_kernel(number_of_iterations, crash_algo)
+	elif training == 'batch':
+		learn_result = learner.train_batch(number_of_iterations, crash_algo, num_cars)
+	else:
+		learn_result = learner.train(number_of_iterations, crash_algo)
+	q_table = learner.q_table.reshape(len(learner.q_table), -1)
+	return (seed, q_table, np.array(learn_result[0], dtype=np.int32), np.array(learn_result[1], dtype=bool))
+
+#=============================
+# train_seeds()
+#	- train_seed_worker() for every seed, across a pool of workers processes (in this process if workers == 1)
+#@return	list of train_seed_worker() results, in seed order
+#=============================
+def train_seeds(learner_name, track_file, crash_algo, number_of_iterations, seeds, workers=1, training='serial',
+		reachable_only=False, acceleration_failure=0, path_collisions=False, num_cars=256):
+	tasks = [(learner_name, track_file, crash_algo, number_of_iterations, seed, training, reachable_only, acceleration_failure,
+			path_collisions, num_cars) for seed in seeds]
+	if workers <= 1:
+		return [train_seed_worker(*task) for task in tasks]
+	context = multiprocessing.get_context()
+	with context.Pool(min(workers, len(tasks))) as pool:
+		return pool.starmap(train_seed_worker, tasks, chunksize=1)
+
+#=============================
+# get_run_score()
+#	- mean steps of the last score_episodes episodes of a run, lower is better
+#=============================
+def get_run_score(episode_steps, score_episodes):
+	return float(np.mean(episode_steps[-score_episodes:]))
+
+#=============================
+# merge_q_tables()
+#	- combine the runs' q_tables into one
+#@param	merge			'mean' = average of every run's q_table, 'best' = the q_table of the best scoring run
+#@param	score_episodes	episodes at the end of each run scored by get_run_score()
+#@return	(merged (states, actions) q_table, index of the best run)
+#=============================
+def merge_q_tables(results, merge='mean', score_episodes=100):
+	scores = [get_run_score(result[2], score_episodes) for result in results]
+	best_run = int(np.argmin(scores))
+	if merge == 'best':
+		return (results[best_run][1].copy(), best_run)
+	q_table = np.zeros_like(results[0][1])
+	for result in results:
+		q_table += result[1]
+	q_table /= len(results)
+	return (q_table, best_run)
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - multi seed training')
+	parser = argparse.ArgumentParser(description='multi seed training')
+	parser.add_argument('track_file', type=str, help='track file name')
+	parser.add_argument('number_of_iterations', type=int, help='number of episodes per run')
+	parser.add_argument('crash_algorithm', type=int, help='crash algo: 0 = minor, 1 = major')
+	parser.add_argument('--learner', type=str, default='q_learning', choices=list(LEARNERS.keys()), help='learner to train')
+	parser.add_argument('--seeds', type=int, nargs='+', default=list(range(8)), help='seed of each run')
+	parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='pool processes')
+	parser.add_argument('--training', type=str, default='serial', choices=['serial', 'kernel', 'batch'], help='training method per run')
+	parser.add_argument('--num_cars', type=int, default=256, help='cars per run for batch training')
+	parser.add_argument('--merge', type=str, default='mean', choices=['mean', 'best', 'none'], help='how to merge the q_tables')
+	parser.add_argument('--score_episodes', type=int, default=100, help='last episodes of each run used to score it')
+	parser.add_argument('--reachable_only', action='store_true', help='only store states reachable from the start line')
+	parser.add_argument('--acceleration_failure', type=float, default=0, help='probability an acceleration has no effect')
+	parser.add_argument('--path_collisions', action='store_true', help='check walls & the finish line along the whole path of a move')
+	args = parser.parse_args()
+
+	print()
+	print('Training file:', args.track_file, 'for', args.number_of_iterations, ' and crash algo:', args.crash_algorithm, \
+			'runs:', len(args.seeds), 'workers:', args.workers)
+	start_time = time.time()
+	results = train_seeds(args.learner, args.track_file, args.crash_algorithm, args.number_of_iterations, args.seeds, args.workers,
+			args.training, args.reachable_only, args.acceleration_failure, args.path_collisions, args.num_cars)
+	print('Training results, seconds:', time.time() - start_time)
+
+	print()
+	print('seed, total steps, crossed finish, score (mean steps of the last', args.score_episodes, 'episodes)')
+	for seed, q_table, episode_steps, crossed_finish in results:
+		print(seed, int(np.sum(episode_steps)), int(np.sum(crossed_finish)), get_run_score(episode_steps, args.score_episodes))
+
+	if args.merge != 'none':
+		q_table, best_run = merge_q_tables(results, args.merge, args.score_episodes)
+		print()
+		print('merge:', args.merge, 'best seed:', results[best_run][0])
+		learner = create_learner(args.learner, args.track_file, args.reachable_only, args.acceleration_failure, args.path_collisions)
+		learner.q_table[...] = q_table.reshape(learner.q_table.shape)
+		test_result = learner.test(args.crash_algorithm)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,140 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Precomputed path (ray-cast) collision table of a track
+
+import argparse
+import time
+import numpy as np
+from track import Track
+from car import Car
+
+#=============================
+# PathTable
+#
+# - Class to encapsulate what a move passes through, for every (cell, velocity) of a track
+# - a move from (x, y) w/ velocity (vx, vy) visits the Bresenham cells
+#	(x + round(k * vx / n), y + round(k * vy / n)) for k = 1..n, n = max(|vx|, |vy|)
+# - the last cell visited is the landing cell, so the move is O(1) table lookups no matter how fast
+# - indexed like the learners' tables: (x, y, x_vel_idx, y_vel_idx), velocities offset by 5
+#=============================
+class PathTable():
+
+	#=============================
+	# __init__()
+	#	- build the tables
+	#@param	track	Track object
+	#=============================
+	def __init__(self, track):
+		self.track = track
+		self.velocity_range = 11 # This is {+/-5} offset from 0
+		self.velocity_offset = 5
+		self.table_shape = (track.shape[0], track.shape[1], self.velocity_range, self.velocity_range)
+		self.build()
+
+	#=============================
+	# build()
+	#	- trace every (cell, velocity) path at once, one step (k) at a time
+	#	- wall_step = first step onto a wall (or off the grid), finish_step = first step onto a finish cell, -1 = never
+	#	- crossed_finish = the path reaches the finish before any wall, crashed = it reaches a wall first
+	#=============================
+	def build(self):
+		velocities = np.arange(self.velocity_range) - self.velocity_offset
+		x = np.arange(self.table_shape[0]).reshape(-1,1,1,1)
+		y = np.arange(self.table_shape[1]).reshape(1,-1,1,1)
+		x_vel = velocities.reshape(1,1,-1,1)
+		y_vel = velocities.reshape(1,1,1,-1)
+		num_steps = np.maximum(np.abs(x_vel), np.abs(y_vel))
+
+		self.wall_step = np.full(self.table_shape, -1, dtype=np.int8)
+		self.finish_step = np.full(self.table_shape, -1, dtype=np.int8)
+		for step in range(1, self.velocity_offset + 1):
+			on_path = np.broadcast_to(step <= num_steps, self.table_shape)
+			#round half away from zero, so paths are symmetric in every direction
+			fraction = step / np.maximum(num_steps, 1)
+			path_x = x + (np.sign(x_vel) * np.floor(np.abs(x_vel) * fraction + 0.5)).astype(int)
+			path_y = y + (np.sign(y_vel) * np.floor(np.abs(y_vel) * fraction + 0.5)).astype(int)
+			path_x, path_y = np.broadcast_arrays(path_x, path_y)
+
+			cell_codes = self.track.get_cell_codes_vectorized((path_x, path_y))
+			wall = on_path & (cell_codes == self.track.WALL_CODE)
+			finish = on_path & (cell_codes == self.track.END_CODE)
+
+			self.wall_step[wall & (self.wall_step < 0)] = step
+			self.finish_step[finish & (self.finish_step < 0)] = step
+
+		reached_finish = self.finish_step >= 0
+		reached_wall = self.wall_step >= 0
+		self.crossed_finish = reached_finish & (~reached_wall | (self.finish_step < self.wall_step))
+		self.crashed = reached_wall & ~self.crossed_finish
+
+	#=============================
+	# get_path_result()
+	#	- look up a move, replaces check_finish_line() + will_crash() of the landing cell
+	#@param	position	(x,y) before the move
+	#@param	velocity	(x,y) velocity of the move
+	#@return	(crossed_finish_line, crashed)
+	#=============================
+	def get_path_result(self, position, velocity):
+		idx = (position[0], position[1], velocity[0] + self.velocity_offset, velocity[1] + self.velocity_offset)
+		return (bool(self.crossed_finish[idx]), bool(self.crashed[idx]))
+
+	#=============================
+	# get_path_result_vectorized()
+	#	- get_path_result() for whole arrays of moves at once
+	#@param	position	(x_array, y_array) before the moves
+	#@param	velocity	(x_vel_array, y_vel_array) of the moves
+	#@return	(crossed_finish_line bool array, crashed bool array)
+	#=============================
+	def get_path_result_vectorized(self, position, velocity):
+		idx = (position[0], position[1], np.asarray(velocity[0]) + self.velocity_offset, np.asarray(velocity[1]) + self.velocity_offset)
+		return (self.crossed_finish[idx], self.crashed[idx])
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing path table')
+	print()
+	parser = argparse.ArgumentParser(description='test path table')
+	parser.add_argument('file_name', type=str, help='track file name')
+	parser.add_argument('--moves', type=int, default=100000, help='number of Car moves to time')
+	args = parser.parse_args()
+	file_name = args.file_name
+	print('INPUT VALUES')
+	print('--------------')
+	print('file_name: ', file_name)
+	print()
+
+	track = Track(file_name)
+	start = time.time()
+	path_table = PathTable(track)
+	print('build time (s):', time.time() - start)
+	print('bytes:', path_table.wall_step.nbytes + path_table.finish_step.nbytes + path_table.crossed_finish.nbytes + path_table.crashed.nbytes)
+
+	#How many moves from cells a car can be on does the landing-cell-only check get wrong?
+	cells = np.array(track.valid_points)
+	velocities = np.arange(path_table.velocity_range) - path_table.velocity_offset
+	x, x_vel, y_vel = np.meshgrid(cells[:, 0], velocities, velocities, indexing='ij')
+	y = np.broadcast_to(cells[:, 1].reshape(-1,1,1), x.shape)
+	landing = (x + x_vel, y + y_vel)
+	landing_finish = track.check_finish_line_vectorized((x, y), landing)
+	landing_crash = ~landing_finish & track.is_wall_point_vectorized(landing)
+	path_finish, path_crash = path_table.get_path_result_vectorized((x, y), (x_vel, y_vel))
+	print('moves:', x.size, 'tunnel through a wall:', int(np.sum(path_crash & ~landing_crash)), \
+			'finish changed:', int(np.sum(path_finish != landing_finish)))
+
+	#Per move cost, landing cell check vs path lookup
+	for name, table in [('landing cell', None), ('path table', path_table)]:
+		car = Car(track, list(track.start_points[0]), [0,0], 0, path_table=table)
+		start = time.time()
+		for idx in range(args.moves):
+			car.position = list(track.start_points[0])
+			car.velocity = [-(idx % 6), idx % 3 - 1]
+			car.move()
+		print(name, 'seconds per move:', (time.time() - start) / args.moves)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,229 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Headless (no printing) high volume policy evaluation
+
+import argparse
+import time
+import numpy as np
+from track import Track
+from transition_model import TransitionModel
+from state_space import StateSpace
+
+#=============================
+# PolicyEvaluator
+#
+# - Class to race a policy (state id -> action index) many times at once over a TransitionModel, no I/O
+# - every rollout is an entry of a state array, each step is a few array gathers over the rollouts still racing,
+#	so a step costs the same no matter the policy or the track
+# - accelerations fail w/ the transition model's acceleration_failure, drawn from random_generator
+#=============================
+class PolicyEvaluator():
+
+	#=============================
+	# __init__()
+	#@param	transition_model	TransitionModel the policy races on (its state ids)
+	#@param	max_steps			rollouts are cut off after this many steps
+	#@param	random_generator	np.random.Generator for acceleration failures, None = a new unseeded one
+	#=============================
+	def __init__(self, transition_model, max_steps=999, random_generator=None):
+		self.transition_model = transition_model
+		self.max_steps = max_steps
+		self.random_generator = random_generator if random_generator is not None else np.random.default_rng()
+
+	#=============================
+	# rollout()
+	#	- race every start state once
+	#@param	policy			int array, action index per state id
+	#@param	start_states	state ids to start from (repeat a state to race it more than once)
+	#@return	(steps per rollout, crashes per rollout, crossed finish per rollout)
+	#=============================
+	def rollout(self, policy, start_states):
+		transition_model = self.transition_model
+		acceleration_failure = transition_model.acceleration_failure
+		states = np.array(start_states, dtype=np.int64)
+		steps = np.zeros(len(states), dtype=np.int32)
+		crashes = np.zeros(len(states), dtype=np.int32)
+		crossed_finish = np.zeros(len(states), dtype=bool)
+		running = np.arange(len(states))
+		for step in range(0, self.max_steps):
+			if len(running) == 0:
+				break
+			running_states = states[running]
+			actions = policy[running_states]
+			if acceleration_failure > 0:
+				failed = self.random_generator.random(len(running)) < acceleration_failure
+				actions = np.where(failed, transition_model.failure_action, actions)
+			finished = transition_model.finish[running_states, actions] == 1
+			crashes[running] += transition_model.crash[running_states, actions]
+			states[running] = transition_model.next_state[running_states, actions]
+			steps[running] += 1
+			crossed_finish[running[finished]] = True
+			running = running[~finished]
+		return (steps, crashes, crossed_finish)
+
+	#=============================
+	# evaluate()
+	#	- race num_rollouts rollouts from every start state & summarize them
+	#	- w/out acceleration failure every rollout from a state is the same, so each state is raced once & repeated
+	#@return	dict: rollouts, finish_rate, mean_steps, step_percentiles (5, 25, 50, 75, 95), step_counts (np.bincount of steps),
+	#			crashes (total), mean_crashes, crash_rate (rollouts w/ >= 1 crash), steps, crashes_per_rollout, crossed_finish
+	#=============================
+	def evaluate(self, policy, start_states, num_rollouts=1000):
+		start_states = np.asarray(start_states)
+		if self.transition_model.acceleration_failure > 0:
+			steps, crashes, crossed_finish = self.rollout(policy, np.repeat(start_states, num_rollouts))
+		else:
+			steps, crashes, crossed_finish = [np.repeat(result, num_rollouts) for result in self.rollout(policy, start_states)]
+		return {'rollouts': len(steps),
+				'finish_rate': float(np.mean(crossed_finish)),
+				'mean_steps': float(np.mean(steps)),
+				'step_percentiles': np.percentile(steps, [5, 25, 50, 75, 95]).tolist(),
+				'step_counts': np.bincount(steps),
+				'crashes': int(np.sum(crashes)),
+				'mean_crashes': float(np.mean(crashes)),
+				'crash_rate': float(np.mean(crashes > 0)),
+				'steps': steps,
+				'crashes_per_rollout': crashes,
+				'crossed_finish': crossed_finish}
+
+	#=============================
+	# get_steps_to_finish()
+	#	- steps the policy takes to cross the finish line from EVERY state, w/ the acceleration always working
+	#	- under a fixed policy each state has exactly one next state, so steps are found by pointer doubling:
+	#		after round k every state knows where it is 2^k steps later (or that it finished before) & how many steps that took,
+	#		ceil(log2(states)) rounds of array gathers cover every path
+	#	- a state that never finishes runs into a loop (the only way a path can go on forever)
+	#@param	policy	int array, action index per state id
+	#@return	(steps per state id (-1 = never finishes), never finishes mask)
+	#=============================
+	def get_steps_to_finish(self, policy):
+		transition_model = self.transition_model
+		num_states = len(policy)
+		states = np.arange(num_states)
+		finished = transition_model.finish[states, policy] == 1
+
+		#State num_states stands for 'crossed the finish line', it stays put & costs nothing
+		jump = np.append(np.where(finished, num_states, transition_model.next_state[states, policy]), num_states)
+		steps = np.append(np.ones(num_states, dtype=np.int64), 0)
+		for round_idx in range(0, max(1, int(np.ceil(np.log2(num_states + 1))))):
+			steps += steps[jump]
+			jump = jump[jump]
+			if np.all(jump == num_states):
+				break
+
+		loops = jump[:num_states] != num_states
+		steps = np.where(loops, -1, steps[:num_states])
+		return (steps, loops)
+
+	#=============================
+	# evaluate_all_states()
+	#	- get_steps_to_finish() for every state, laid out over (x, y, x_vel_idx, y_vel_idx), & per start point stats
+	#@param	policy			int array, action index per state id
+	#@param	start_states	state ids of the start points (w/ 0 velocity)
+	#@return	dict: steps (per state id), loops (per state id), steps_grid (x, y, x_vel_idx, y_vel_idx, -1 = never finishes or
+	#			not a state), finish_rate (states that finish), mean_steps & max_steps (of the states that finish),
+	#			start_steps & start_loops (per start point)
+	#=============================
+	def evaluate_all_states(self, policy, start_states):
+		transition_model = self.transition_model
+		steps, loops = self.get_steps_to_finish(policy)
+		steps_grid = np.full(transition_model.state_shape, -1, dtype=np.int64)
+		if transition_model.state_space is not None:
+			steps_grid.reshape(-1)[transition_model.state_space.flat_states] = steps
+		else:
+			steps_grid.reshape(-1)[:] = steps
+		finishing_steps = steps[~loops]
+		return {'steps': steps,
+				'loops': loops,
+				'steps_grid': steps_grid,
+				'finish_rate': float(np.mean(~loops)),
+				'mean_steps': float(np.mean(finishing_steps)) if len(finishing_steps) > 0 else 0.0,
+				'max_steps': int(np.max(finishing_steps)) if len(finishing_steps) > 0 else 0,
+				'start_steps': steps[start_states],
+				'start_loops': loops[start_states]}
+
+#=============================
+# get_policy_indices()
+#	- any policy table as action indices: a q_table (greedy), action indices, or [x_accel, y_accel] per state
+#		(the loop value iteration engine's p_table)
+#@return	int array, action index per state id
+#=============================
+def get_policy_indices(policy, accel_offset=1, accel_range=3):
+	policy = np.asarray(policy)
+	if policy.ndim == 1:
+		return policy.astype(np.int64)
+	if policy.ndim == 2 and policy.shape[1] == 2:
+		return ((policy[:, 0] + accel_offset) * accel_range + policy[:, 1] + accel_offset).astype(np.int64)
+	return get_greedy_policy(policy)
+
+#=============================
+# get_greedy_policy()
+#	- first best action of every state of a q_table (any shape w/ states first)
+#@return	int array, action index per state id
+#=============================
+def get_greedy_policy(q_table):
+	return np.argmax(q_table.reshape(len(q_table), -1), axis=1)
+
+#=============================
+# get_start_states()
+#	- state ids of the track's starting points w/ 0 velocity
+#=============================
+def get_start_states(transition_model, track):
+	return np.array([transition_model.encode_state(point, [0,0]) for point in track.start_points], dtype=np.int64)
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing headless policy evaluation')
+	print()
+	parser = argparse.ArgumentParser(description='test headless policy evaluation')
+	parser.add_argument('file_name', type=str, help='track file name')
+	parser.add_argument('crash_algo', type=int, help='crash algorithm, 0 or 1')
+	parser.add_argument('--acceleration_failure', type=float, default=0.2, help='probability an acceleration has no effect')
+	parser.add_argument('--num_rollouts', type=int, nargs='+', default=[100, 1000, 10000], help='rollouts per start point to time')
+	parser.add_argument('--policy_file', type=str, default=None, help='.npy policy (e.g. a cached p_table.npy or q_table) for evaluate_all_states()')
+	args = parser.parse_args()
+	print('INPUT VALUES')
+	print('--------------')
+	print('file_name: ', args.file_name)
+	print('crash_algo: ', args.crash_algo)
+	print('acceleration_failure: ', args.acceleration_failure)
+	print()
+
+	track = Track(args.file_name)
+	#Same (valid) state ids as the learners' tables
+	transition_model = TransitionModel(track, args.crash_algo, state_space=StateSpace(track), acceleration_failure=args.acceleration_failure)
+	policy_evaluator = PolicyEvaluator(transition_model, random_generator=np.random.default_rng(0))
+	start_states = get_start_states(transition_model, track)
+
+	#A random policy crashes a lot, a good benchmark of the per step cost
+	policy = np.random.default_rng(0).integers(0, transition_model.num_actions, transition_model.num_states)
+	for num_rollouts in args.num_rollouts:
+		start = time.time()
+		result = policy_evaluator.evaluate(policy, start_states, num_rollouts)
+		seconds = time.time() - start
+		print('rollouts:', result['rollouts'], 'steps per second:', int(np.sum(result['steps']) / seconds), 'finish rate:', result['finish_rate'],
+				'mean steps:', result['mean_steps'], 'step percentiles:', result['step_percentiles'], 'mean crashes:', result['mean_crashes'])
+
+	#Every state at once (deterministic), a random policy & optionally a saved one
+	policies = [('random', policy)]
+	if args.policy_file is not None:
+		policies.append((args.policy_file, get_policy_indices(np.load(args.policy_file))))
+	print()
+	for name, policy in policies:
+		if len(policy) != transition_model.num_states:
+			print(name, 'has', len(policy), 'states, the transition model has', transition_model.num_states)
+			continue
+		start = time.time()
+		result = policy_evaluator.evaluate_all_states(policy, start_states)
+		seconds = time.time() - start
+		print(name, 'all', transition_model.num_states, 'states, seconds:', seconds, 'finish rate:', result['finish_rate'],
+				'mean steps:', result['mean_steps'], 'max steps:', result['max_steps'])
+		print('	start point steps:', result['start_steps'].tolist(), 'loops:', result['start_loops'].tolist())
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,133 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Vectorized (lockstep) race environment
+
+import argparse
+import random
+import time
+import numpy as np
+from track import Track
+from transition_model import TransitionModel
+
+#=============================
+# RaceEnvironment
+#
+# - Class to race N cars at once, each car is an entry of a state array (see TransitionModel)
+# - every step() moves every car, cars that cross the finish line or run out of steps start over
+#	at a random starting point w/ 0 velocity, or wherever start_distribution puts them
+#=============================
+class RaceEnvironment():
+
+	#=============================
+	# __init__()
+	#	- put every car on a starting point
+	#@param	transition_model	TransitionModel the cars move by
+	#@param	start_points	positions new episodes start from (w/ 0 velocity)
+	#@param	num_cars		number of cars raced in lockstep
+	#@param	max_steps		episodes are cut off after this many steps
+	#@param	start_distribution	optional StartDistribution (over the transition model's state ids) new episodes start from
+	#@param	number_of_episodes	episodes in the training run, for start_distribution's curriculum
+	#@param	random_generator	np.random.Generator for start points & acceleration failures, None = a new unseeded one
+	#=============================
+	def __init__(self, transition_model, start_points, num_cars, max_steps=999, start_distribution=None, number_of_episodes=0,
+			random_generator=None):
+		self.transition_model = transition_model
+		self.random_generator = random_generator if random_generator is not None else np.random.default_rng()
+		self.num_cars = num_cars
+		self.max_steps = max_steps
+		self.start_distribution = start_distribution
+		self.number_of_episodes = number_of_episodes
+		self.episodes_started = 0
+		self.start_states = np.array([transition_model.encode_state(point, [0,0]) for point in start_points], dtype=np.int64)
+		self.states = np.empty(num_cars, dtype=np.int64)
+		self.steps = np.zeros(num_cars, dtype=np.int64)
+		self.reset(np.ones(num_cars, dtype=bool))
+
+	#=============================
+	# reset()
+	#	- start new episodes for some cars
+	#@param	mask	bool array, True = reset that car
+	#=============================
+	def reset(self, mask):
+		num_resets = np.count_nonzero(mask)
+		if self.start_distribution is not None:
+			episodes = np.arange(self.episodes_started, self.episodes_started + num_resets)
+			self.states[mask] = self.start_distribution.sample_states(episodes, self.number_of_episodes)
+		else:
+			self.states[mask] = self.start_states[self.random_generator.integers(0, len(self.start_states), num_resets)]
+		self.steps[mask] = 0
+		self.episodes_started += num_resets
+
+	#=============================
+	# step()
+	#	- move every car, accelerations fail w/ the transition model's acceleration_failure
+	#	- cars whose episode ended are reset, self.states is where every car is now
+	#@param	actions	int array, action index (into TransitionModel.accelerations) per car
+	#@return	(next_states, rewards, crossed_finish_line, timed_out, episode_steps)
+	#			next_states are the states the moves led to (before any reset),
+	#			episode_steps = steps taken in each car's episode so far (incl. this one)
+	#=============================
+	def step(self, actions):
+		transition_model = self.transition_model
+		if transition_model.acceleration_failure > 0:
+			failed = self.random_generator.random(self.num_cars) < transition_model.acceleration_failure
+			actions = np.where(failed, transition_model.failure_action, actions)
+
+		next_states = transition_model.next_state[self.states, actions].astype(np.int64)
+		rewards = transition_model.reward[self.states, actions]
+		crossed_finish = transition_model.finish[self.states, actions] == 1
+		self.steps += 1
+		episode_steps = self.steps.copy()
+		timed_out = ~crossed_finish & (self.steps >= self.max_steps)
+
+		self.states = next_states.copy()
+		self.reset(crossed_finish | timed_out)
+		return (next_states, rewards, crossed_finish, timed_out, episode_steps)
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing race environment')
+	print()
+	parser = argparse.ArgumentParser(description='test race environment')
+	parser.add_argument('file_name', type=str, help='track file name')
+	parser.add_argument('crash_algo', type=int, help='crash algorithm, 0 or 1')
+	parser.add_argument('--num_cars', type=int, nargs='+', default=[1, 16, 256, 1024, 4096], help='batch sizes to time')
+	parser.add_argument('--seconds', type=float, default=1.0, help='seconds to time each batch size')
+	args = parser.parse_args()
+	print('INPUT VALUES')
+	print('--------------')
+	print('file_name: ', args.file_name)
+	print('crash_algo: ', args.crash_algo)
+	print()
+
+	track = Track(args.file_name)
+	transition_model = TransitionModel(track, args.crash_algo)
+
+	#One car at a time through TransitionModel.step()
+	state = transition_model.encode_state(track.start_points[0], [0,0])
+	steps = 0
+	start = time.time()
+	while time.time() - start < args.seconds:
+		for idx in range(1000):
+			state, reward, done = transition_model.step(state, random.randrange(transition_model.num_actions))
+			if done:
+				state = transition_model.encode_state(track.start_points[0], [0,0])
+		steps += 1000
+	print('single car, steps per second:', steps / (time.time() - start))
+
+	for num_cars in args.num_cars:
+		environment = RaceEnvironment(transition_model, track.start_points, num_cars)
+		steps = 0
+		start = time.time()
+		while time.time() - start < args.seconds:
+			environment.step(np.random.randint(0, transition_model.num_actions, num_cars))
+			steps += num_cars
+		print('cars:', num_cars, 'steps per second:', steps / (time.time() - start))
+
+
+if __name__ == '__main__':
+	main()
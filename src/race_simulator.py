@@ -6,6 +6,10 @@
 
 from track import Track
 from car import Car
+from transition_model import TransitionModel
+from state_space import StateSpace
+from path_table import PathTable
+from training_metrics import TrainingMetrics
 import numpy as np
 import pandas as pd
 import argparse
@@ -22,7 +26,7 @@ import copy
 #=============================
 class RaceSimulator:
 
-	def __init__(self, track, car_symbol='@'):
+	def __init__(self, track, car_symbol='@', acceleration_failure=0, path_collisions=False):
 		self.track = track
 		#Keep track of the board
 		self.display_track = copy.copy(track.data)
@@ -32,6 +36,11 @@ class RaceSimulator:
 		self.game_state = np.zeros(track.shape)
 		self.iterations = 0
 		self.history = list()
+		self.transition_models = dict() #built on demand, one per crash algorithm
+		self.state_space = None #full (x, y, x_vel, y_vel) grid until create_state_space()
+		self.acceleration_failure = acceleration_failure #probability an acceleration has no effect
+		self.path_table = PathTable(track) if path_collisions else None #None = only the landing cell of a move counts
+		self.training_listeners = list() #see add_training_listener()
 
 	#=============================
 	# print_state()
@@ -88,6 +97,62 @@ class RaceSimulator:
 
 		return False
 
+	#=============================
+	# create_state_space()
+	#	- compact state ids for the learners' tables (see StateSpace)
+	#@param	reachable_only	False = every non-wall state, True = only states reachable from the start
+	#						under either crash algorithm
+	#=============================
+	def create_state_space(self, reachable_only=False):
+		if reachable_only:
+			self.state_space = StateSpace(self.track, [TransitionModel(self.track, 0, path_table=self.path_table),
+					TransitionModel(self.track, 1, path_table=self.path_table)])
+		else:
+			self.state_space = StateSpace(self.track)
+		self.transition_models = dict()
+		return self.state_space
+
+	#=============================
+	# get_transition_model()
+	#	- precomputed accelerate + move results for every state-action (see TransitionModel)
+	#	- built (or loaded from the on-disk cache) once per crash algorithm
+	#	- states are self.state_space ids when one was created
+	#	- steps fail to accelerate w/ probability self.acceleration_failure
+	#	- whole paths are checked for walls & the finish line when self.path_table is set
+	#@param	crash_algo 0 = minor crash, 1 = major crash
+	#=============================
+	def get_transition_model(self, crash_algo):
+		if crash_algo not in self.transition_models:
+			self.transition_models[crash_algo] = TransitionModel(self.track, crash_algo, state_space=self.state_space,
+					acceleration_failure=self.acceleration_failure, path_table=self.path_table)
+		return self.transition_models[crash_algo]
+
+	#=============================
+	# add_training_listener()
+	#	- report every train() run to listener (a TrainingListener, see training_metrics)
+	#=============================
+	def add_training_listener(self, listener):
+		self.training_listeners.append(listener)
+
+	#=============================
+	# start_training_metrics()
+	#	- time & count a train() run for the training listeners
+	#@param	method				name of the train function
+	#@param	transition_model	the TransitionModel trained on
+	#@return	started TrainingMetrics, None when no listener is attached (nothing is timed or counted)
+	#=============================
+	def start_training_metrics(self, method, transition_model):
+		if len(self.training_listeners) == 0:
+			return None
+		training_metrics = TrainingMetrics(self.training_listeners, {'solver': type(self).__name__,
+				'method': method,
+				'num_states': int(transition_model.num_states),
+				'num_actions': int(transition_model.num_actions),
+				'table_bytes': int(self.get_bytes_per_state() * transition_model.num_states),
+				'transition_model_bytes': int(transition_model.get_bytes())})
+		training_metrics.start()
+		return training_metrics
+
 	#=============================
 	# create_start_car()
 	#	- initialize car
@@ -99,7 +164,7 @@ class RaceSimulator:
 		start_pos = random.randrange(num_start_pos)
 		start_pt = self.track.start_points[start_pos]
 		init_velocity = [0,0]
-		car = Car(self.track, start_pt, init_velocity, crash_algo)
+		car = Car(self.track, start_pt, init_velocity, crash_algo, self.acceleration_failure, self.path_table)
 		return car
 
 	#=============================
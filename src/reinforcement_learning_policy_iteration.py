@@ -0,0 +1,214 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Reinforcement Learning w/ Policy Iteration
+
+import numpy as np
+import argparse
+import time
+from reinforcement_learning_value_iteration import ReinforcementLearningValueIteration
+from training_metrics import JsonlListener
+
+try:
+	import scipy.sparse
+	import scipy.sparse.linalg
+except ImportError:
+	scipy = None
+
+#=============================
+# ReinforcementLearningPolicyIteration
+#
+# - Class to encapsulate a reinforcement learning (modified) policy iteration model
+# - Same tables (numpy engine), test() & policy lookup as ReinforcementLearningValueIteration
+#=============================
+class ReinforcementLearningPolicyIteration(ReinforcementLearningValueIteration):
+
+	#=============================
+	# __init__()
+	#	- create track, super class constructors, and create initial model states & values
+	#@param	evaluation		'linear' = exact policy evaluation w/ a sparse linear solve (needs scipy)
+	#						'modified' = evaluation_steps bellman backups of the current policy (modified policy iteration)
+	#@param	evaluation_steps	backups per evaluation for 'modified'
+	#@param	reachable_only	only store states reachable from the start line
+	#@param	acceleration_failure	probability an acceleration has no effect
+	#@param	path_collisions	check walls & the finish line along the whole path of a move
+	#=============================
+	def __init__(self, file_name, evaluation='linear', evaluation_steps=20, reachable_only=False, acceleration_failure=0,
+			path_collisions=False):
+		ReinforcementLearningValueIteration.__init__(self, file_name, 'numpy', reachable_only, acceleration_failure, path_collisions)
+		self.solver_name = 'policy_iteration'
+		if evaluation == 'linear' and scipy is None:
+			print('scipy not available, using modified policy evaluation')
+			evaluation = 'modified'
+		self.evaluation = evaluation
+		self.evaluation_steps = evaluation_steps
+
+	#=============================
+	# evaluate_policy()
+	#	- find the value of every state when following the current p_table
+	#	- crossing the finish line is worth 0, every other move -1
+	#	- w/ acceleration failure each state has 2 outcomes: the policy action & the (0,0) action
+	#=============================
+	def evaluate_policy(self, transition_model, discount_factor):
+		states = np.arange(len(self.v_table))
+		outcome_actions = [self.p_table]
+		outcome_probabilities = [1 - transition_model.acceleration_failure]
+		if transition_model.acceleration_failure > 0:
+			outcome_actions.append(np.full_like(self.p_table, transition_model.failure_action))
+			outcome_probabilities.append(transition_model.acceleration_failure)
+		next_state = np.stack([transition_model.next_state[states, actions] for actions in outcome_actions])
+		finish = np.stack([transition_model.finish[states, actions] == 1 for actions in outcome_actions])
+		reward = np.stack([transition_model.reward[states, actions] for actions in outcome_actions])
+		probabilities = np.array(outcome_probabilities).reshape(-1, 1)
+
+		if self.evaluation == 'linear':
+			#(I - discount * P) V = r, P holds the outcome probabilities, w/out the moves crossing the finish line
+			moves = ~finish
+			rows = np.broadcast_to(states, next_state.shape)
+			transitions = scipy.sparse.csr_matrix(((discount_factor * np.broadcast_to(probabilities, moves.shape))[moves],
+					(rows[moves], next_state[moves])), shape=(len(states), len(states)))
+			system = scipy.sparse.identity(len(states), format='csr') - transitions
+			self.v_table[:] = scipy.sparse.linalg.spsolve(system.tocsc(), np.sum(probabilities * reward, axis=0))
+		else:
+			for step in range(0, self.evaluation_steps):
+				v_table_next = self.v_table[next_state]
+				v_table_next *= discount_factor
+				v_table_next += reward
+				v_table_next[finish] = 0
+				v_table_next *= probabilities
+				self.v_table[:] = np.sum(v_table_next, axis=0)
+
+	#=============================
+	# get_first_best_actions()
+	#	- per state the first action whose q-value is within tolerance of the best one
+	#@param	q_vals		(states, actions) q-values
+	#@param	max_q_vals	max q-value per state
+	#@return	action index per state
+	#=============================
+	def get_first_best_actions(self, q_vals, max_q_vals, tolerance):
+		return np.argmax(q_vals >= (max_q_vals - tolerance)[:, np.newaxis], axis=-1)
+
+	#=============================
+	# train()
+	#	- Learn the policy via policy iteration: evaluate the policy, then make it greedy w/ respect to those values
+	#	- stops once the greedy policy stops changing (& for 'modified' the bellman error is below 0.1)
+	#@return	(training iterations, number of policy changes per iteration)
+	#=============================
+	def train(self, max_iterations, car_algo):
+		#initialize values
+		discount_factor = self.discount_factor
+		reward = -1
+		bellman_error_magnitude = 0.1
+		improvement_magnitude = 1e-9 #anything smaller is round-off from the evaluation
+		self.training_iterations = 0
+		policy_changes = 0
+		change_history = [policy_changes]
+
+		transition_model = self.get_transition_model(car_algo)
+		next_state = transition_model.next_state
+		finish = transition_model.finish == 1
+		states = np.arange(len(self.v_table))
+		training_metrics = self.start_training_metrics('train', transition_model)
+
+		done = False
+		while(not done and self.training_iterations < max_iterations):
+			self.training_iterations += 1
+			self.evaluate_policy(transition_model, discount_factor)
+
+			#q = r + discount * V(s'), crossing the finish line is worth 0
+			np.take(self.v_table, next_state, out=self.q_table)
+			self.q_table *= discount_factor
+			self.q_table += reward
+			self.q_table[finish] = 0
+			transition_model.get_expected_q(self.q_table)
+			max_q_vals = np.max(self.q_table, axis=-1)
+
+			#Only switch actions that are strictly better, otherwise ties can flip back & forth forever,
+			#to the first action within round-off of the best (value iteration's first best action)
+			improved = max_q_vals - self.q_table[states, self.p_table] > improvement_magnitude
+			policy_changes = int(np.sum(improved))
+			self.p_table[improved] = self.get_first_best_actions(self.q_table[improved], max_q_vals[improved], improvement_magnitude)
+			change_history.append(policy_changes)
+
+			bellman_error = float(np.max(np.abs(max_q_vals - self.v_table)))
+			if training_metrics is not None:
+				training_metrics.end_sweep(len(states), bellman_error)
+			if policy_changes == 0 and (self.evaluation == 'linear' or bellman_error < bellman_error_magnitude):
+				done = True
+		self.converged = done
+
+		#Report the greedy values & first best actions, same as value iteration: among the actions within round-off
+		#of the best (which the stable policy's is), not a raw argmax over round-off differences
+		max_q_vals = np.max(self.q_table, axis=-1)
+		self.v_table[:] = max_q_vals
+		self.p_table[:] = self.get_first_best_actions(self.q_table, max_q_vals, improvement_magnitude)
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.training_iterations, change_history)
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing policy iteration')
+	parser = argparse.ArgumentParser(description='test policy iteration')
+	parser.add_argument('track_file', type=str, default=1, help='track file name')
+	parser.add_argument('max_iterations', type=int, default=999, help='max number of iterations')
+	parser.add_argument('crash_algorithm', type=int, default=0, help='crash algo: 0 = minor, 1 = major')
+	parser.add_argument('learning_analysis', type=int, default=0, help='do learning analysis or not, 0 = no, 1 = yes')
+	parser.add_argument('--evaluation', type=str, default='linear', choices=['linear', 'modified'], help='policy evaluation')
+	parser.add_argument('--evaluation_steps', type=int, default=20, help='backups per modified policy evaluation')
+	parser.add_argument('--acceleration_failure', type=float, default=0, help='probability an acceleration has no effect')
+	parser.add_argument('--path_collisions', action='store_true', help='check walls & the finish line along the whole path of a move')
+	parser.add_argument('--retrain', action='store_true', help='train even if solved tables are cached')
+	parser.add_argument('--metrics_file', type=str, default=None, help='write per sweep/episode training metrics to this .jsonl file')
+	args = parser.parse_args()
+
+	track_file = args.track_file
+	max_iterations = args.max_iterations
+	crash_algo = args.crash_algorithm
+	learning_analysis = args.learning_analysis
+
+	print()
+	print('Training file:', track_file, 'for max itr', max_iterations, ' and crash algo:', crash_algo, 'evaluation:', args.evaluation)
+
+	print()
+	policy_iteration = ReinforcementLearningPolicyIteration(track_file, args.evaluation, args.evaluation_steps,
+			acceleration_failure=args.acceleration_failure, path_collisions=args.path_collisions)
+	metrics_listener = None
+	if args.metrics_file is not None:
+		metrics_listener = JsonlListener(args.metrics_file)
+		policy_iteration.add_training_listener(metrics_listener)
+	start_time = time.time()
+	if not args.retrain and policy_iteration.load_tables(crash_algo):
+		learn_result = (0, [0])
+		print('Loaded solved tables, seconds:', time.time() - start_time, 'from', policy_iteration.get_artifact_dir(crash_algo))
+	else:
+		learn_result = policy_iteration.train(max_iterations, crash_algo)
+		print('Training results, seconds:', time.time() - start_time)
+		print('training iterations', learn_result)
+		#Only cache converged tables
+		if policy_iteration.converged:
+			try:
+				print('Saved solved tables to', policy_iteration.save_tables(crash_algo))
+			except OSError as error:
+				print('Could not save solved tables -', error)
+	if metrics_listener is not None:
+		metrics_listener.close()
+		print('Training metrics written to', args.metrics_file)
+
+	print()
+	test_result = policy_iteration.test(crash_algo)
+
+	if learning_analysis != 0:
+		print()
+		print('learning analysis')
+		print('Training file:', track_file, 'for max iter', max_iterations, ' and crash algo:', crash_algo)
+		print('Train Itr, Policy Changes')
+		for idx in range(0, learn_result[0]):
+			print(idx, learn_result[1][idx])
+
+
+if __name__ == '__main__':
+	main()
@@ -10,10 +10,19 @@ import argparse
 import operator
 import random
 import copy
+import time
 from base_model2 import BaseModel
 from race_simulator import RaceSimulator
 from track import Track
 from car import Car
+from race_environment import RaceEnvironment
+from action_selection import EpsilonGreedy
+import episode_kernels
+from experience_buffer import ExperienceBuffer
+from start_distribution import StartDistribution
+from convergence_monitor import ConvergenceMonitor
+from policy_evaluator import PolicyEvaluator, get_greedy_policy, get_start_states
+from training_metrics import JsonlListener
 
 #=============================
 # ReinforcementLearningQLearning
@@ -25,44 +34,54 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 	#=============================
 	# __init__()
 	#	- create track, super class constructors, and create initial model states & values
+	#@param	reachable_only	only store states reachable from the start line (see StateSpace)
+	#@param	acceleration_failure	probability an acceleration has no effect (sampled by every step)
+	#@param	path_collisions	check walls & the finish line along the whole path of a move (see PathTable)
+	#@param	seed			seed of this learner's np.random.Generator (q_table init, start points, actions, acceleration failures),
+	#						None = unseeded
+	#@param	random_ties		break ties between the best actions randomly instead of taking the first one
+	#@param	start_distribution	where training episodes start: 'start_line', 'uniform' or 'curriculum' (see StartDistribution)
+	#@param	curriculum_fraction	fraction of the episodes the curriculum takes to reach the start line
 	#=============================
-	def __init__(self, file_name):
+	def __init__(self, file_name, reachable_only=False, acceleration_failure=0, path_collisions=False, seed=None,
+			random_ties=False, start_distribution='start_line', curriculum_fraction=0.5):
 		new_track = Track(file_name)
 		BaseModel.__init__(self, new_track.data)
-		RaceSimulator.__init__(self, new_track)
+		RaceSimulator.__init__(self, new_track, acceleration_failure=acceleration_failure, path_collisions=path_collisions)
 		#acceleration possible [(-1,-1),(-1,0),(-1,1), (0,-1),(0,0),(0,1), (1,-1),(1,0),(1,1)]
 		self.velocity_range = 11 # This is {+/-5} offset from 0
 		self.velocity_offset = 5
 		self.accel_range = 3 # This is {+/-1} offset from 0
 		self.accel_offset = 1
-		self.q_table = self.create_q_table(self.track.shape) 
+		self.create_state_space(reachable_only)
+		self.random_generator = np.random.default_rng(seed)
+		self.q_table = self.create_q_table(self.state_space.num_states) 
+		self.action_selector = EpsilonGreedy(self.accel_range * self.accel_range, self.random_generator, random_ties=random_ties)
+		self.start_distribution = None #None = the start line (see get_start_state())
+		if start_distribution != 'start_line':
+			self.start_distribution = StartDistribution(self.track, self.state_space, self.random_generator, start_distribution,
+					curriculum_fraction)
 
 	#=============================
 	# create_q_table()
-	#	- create the multi-dimensional table representing the state space
-	#	- NOTE: velocities will be offset to make indexing easier, -5:0, -4:1, -3:2 ... 0:5, 1:6, 2:7, ... 5:10
-	#		- simply add '5' to the velocity value to reach it's index
+	#	- create the table representing the state-action space, one entry per compact state id
+	#	- one contiguous (state, x_accel_idx, y_accel_idx) array, q_table[state] is a (3,3) view
 	#	- NOTE: acceleration will be offset to make indexing easier, -1:0, 0:1, 1:2
-	#		- simply add '5' to the velocity value to reach it's index
-	#=============================
-	def create_q_table(self, grid_shape):
-		state_action_tbl = list()
-		for x in range(grid_shape[0]):
-			x_list = list()
-			for y in range(grid_shape[1]):
-				y_list = list()
-				for x_vel in range(0, self.velocity_range):
-					x_vel_list = list()
-					for y_vel in range(0, self.velocity_range):
-						#initialize accelerateion reward value (offset like velocity)
-						random_init_vals = np.random.rand(self.accel_range, self.accel_range)
-						random_init_vals *= -1 #since everything is negative,  might as well
-						x_vel_list.append(random_init_vals)
-					y_list.append(x_vel_list)
-				x_list.append(y_list)
-			state_action_tbl.append(x_list)
+	#		- simply add '1' to the acceleration value to reach it's index
+	#=============================
+	def create_q_table(self, num_states):
+		#initialize accelerateion reward values (offset like velocity) w/ one draw from this learner's generator
+		state_action_tbl = self.random_generator.random((num_states, self.accel_range, self.accel_range))
+		state_action_tbl *= -1 #since everything is negative,  might as well
 		return state_action_tbl
 
+	#=============================
+	# get_bytes_per_state()
+	#	- bytes the q_table takes per state (3x3 float64 action values)
+	#=============================
+	def get_bytes_per_state(self):
+		return 8 * self.accel_range * self.accel_range
+
 	#=============================
 	# epsilon_greedy_action_choice()
 	#	- epsilon greedy approach
@@ -77,6 +96,45 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 			action = (raw_index[0][0], raw_index[1][0])
 		return action
 
+	#=============================
+	# epsilon_greedy_action_choice_batch()
+	#	- epsilon_greedy_action_choice() for many states at once
+	#@param	action_vals	(cars, 9) flat action values, flat index = x_accel_idx * 3 + y_accel_idx
+	#@return	int array of flat action indices (the first max, same as epsilon_greedy_action_choice())
+	#=============================
+	def epsilon_greedy_action_choice_batch(self, epsilon, action_vals):
+		explore = self.random_generator.random(len(action_vals)) < epsilon
+		actions = np.argmax(action_vals, axis=1)
+		actions[explore] = self.random_generator.integers(0, action_vals.shape[1], np.count_nonzero(explore))
+		return actions
+
+	#=============================
+	# update_q_batch()
+	#	- q(s,a) += learning_rate * td_error for many state-actions at once
+	#	- cars in the same state-action share one update w/ their mean td_error
+	#		(adding each car's update would multiply the step size by the number of cars)
+	#@param	q_table	(states, 9) flat action view of self.q_table
+	#=============================
+	def update_q_batch(self, q_table, states, actions, td_errors, learning_rate):
+		state_actions, car_idx = np.unique(states * q_table.shape[1] + actions, return_inverse=True)
+		mean_td_errors = np.bincount(car_idx, weights=td_errors) / np.bincount(car_idx)
+		q_table.reshape(-1)[state_actions] += learning_rate * mean_td_errors
+
+	#=============================
+	# end_episodes_batch()
+	#	- record the episodes that just ended & decay learning rate & epsilon once per episode, like train()
+	#@return	(learning_rate, epsilon_value)
+	#=============================
+	def end_episodes_batch(self, crossed_finish, timed_out, episode_steps, learning_rate, min_learning_rate, epsilon_value, decay):
+		done = crossed_finish | timed_out
+		self.history_of_learning.extend(episode_steps[done].tolist())
+		self.converge_result.extend(crossed_finish[done].tolist())
+		for episode in range(np.count_nonzero(done)):
+			if learning_rate > min_learning_rate:
+				learning_rate *= decay
+			epsilon_value *= decay
+		return (learning_rate, epsilon_value)
+
 	#=============================
 	# create_random_car()
 	#	- initialize car
@@ -88,14 +146,27 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 		start_pos = random.randrange(num_start_pos)
 		start_pt = self.track.valid_points[start_pos]
 		init_velocity = [0,0]
-		car = Car(self.track, start_pt, init_velocity, crash_algo)
+		car = Car(self.track, start_pt, init_velocity, crash_algo, self.acceleration_failure, self.path_table)
 		return car
 
+	#=============================
+	# get_start_state()
+	#	- start state of a training episode, from the start distribution if there is one,
+	#		else a random starting point w/ 0 velocity (same states as create_start_car())
+	#@return	int state id
+	#=============================
+	def get_start_state(self, transition_model, crash_algo, episode, number_of_episodes):
+		if self.start_distribution is None:
+			start_pt = self.track.start_points[self.random_generator.integers(0, len(self.track.start_points))]
+			return transition_model.encode_state(start_pt, [0,0])
+		return self.start_distribution.sample_state(episode, number_of_episodes)
+
 	#=============================
 	# train()
 	#	- Learn Values of every state (via q-learning)
+	#	- w/ a convergence_monitor training stops as soon as it's met, self.stop_reason says why training stopped
 	#=============================
-	def train(self, number_of_iterations, crash_algo):
+	def train(self, number_of_iterations, crash_algo, convergence_monitor=None):
 		#initialize values
 		learning_rate = 0.75
 		min_learning_rate = 0.01
@@ -106,10 +177,18 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 
 		self.history_of_learning = list() #store number of test_steps taken per iteration
 		self.converge_result = list() #store whether it converged
+		self.stop_reason = 'ran all %d episodes' % number_of_iterations
+		if convergence_monitor is not None:
+			convergence_monitor.start(self.q_table)
+
+		transition_model = self.get_transition_model(crash_algo)
+		q_table = self.q_table.reshape(len(self.q_table), -1) #view, flat action index = x_accel_idx * 3 + y_accel_idx
+		action_selector = self.action_selector
+		training_metrics = self.start_training_metrics('train', transition_model)
 
 		for idx in range(number_of_iterations):
-			#init the environment, aka put the car at a starting place w/ 0 velocity
-			car = self.create_start_car(crash_algo)
+			#init the environment, aka put the car at a starting place (see get_start_state())
+			state = self.get_start_state(transition_model, crash_algo, idx, number_of_iterations)
 
 			#Reduce learning & epsilon value over time to explore less and learn less
 			if learning_rate > min_learning_rate:
@@ -117,12 +196,7 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 			epsilon_value *= decay
 
 			test_steps = 0
-
-			#get proper indexing for state-action (q-table) 
-			x_idx = car.position[0]
-			y_idx = car.position[1]
-			x_vel_idx = car.velocity[0] + self.velocity_offset #account for offset to make index positive
-			y_vel_idx = car.velocity[1] + self.velocity_offset #account for offset to make index positive
+			max_q_change = 0
 
 			finish_line = False;
 			test_steps = 0
@@ -130,18 +204,14 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 			while (not finish_line and test_steps < max_test_steps):
 				#Keep track of test steps
 				test_steps += 1
-				if test_steps > max_test_steps:
-					self.converge_result.append(False)
 
 				#Get action 'a' to take via epsilon greedy algorithm
-				action_vals = self.q_table[x_idx][y_idx][x_vel_idx][y_vel_idx]
-				action = self.epsilon_greedy_action_choice(epsilon_value, action_vals) #This is the acceleration to choose
-				q_val = action_vals[action[0]][action[1]]
-
-				#Get next state via applying action
-				acceleration = [action[0] - self.accel_offset, action[1] - self.accel_offset]
-				car.accelerate(acceleration)
-				done  =  car.move()
+				action_vals = q_table[state]
+				action = action_selector.choose(action_vals, epsilon_value) #This is the acceleration to choose
+				q_val = action_vals[action]
+
+				#Get next state via applying action (same as car.accelerate() + car.move())
+				state, reward, done = transition_model.step(state, action, self.random_generator)
 				if done:
 					#We are finished, 
 					finish_line = True
@@ -149,22 +219,353 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 				else:
 
 					#Get next action values
-					#get proper indexing for state-action (q-table) 
-					x_idx = car.position[0]
-					y_idx = car.position[1]
-					x_vel_idx = car.velocity[0] + self.velocity_offset #account for offset to make index positive
-					y_vel_idx = car.velocity[1] + self.velocity_offset #account for offset to make index positive
-					action_vals_next = self.q_table[x_idx][y_idx][x_vel_idx][y_vel_idx]
-					max_q_val_next = np.max(action_vals_next)
+					max_q_val_next = q_table[state].max()
 
 					#Q-learning equation! 
-					action_vals[action[0]][action[1]] += learning_rate * \
-							(reward + discount_factor * max_q_val_next - q_val)
+					q_change = learning_rate * (reward + discount_factor * max_q_val_next - q_val)
+					action_vals[action] += q_change
+					if abs(q_change) > max_q_change:
+						max_q_change = abs(q_change)
 
+			if not finish_line:
+				self.converge_result.append(False) #ran out of steps
 			self.history_of_learning.append(test_steps) #track how many steps taken
+			if training_metrics is not None:
+				training_metrics.end_episode(test_steps, epsilon_value, learning_rate, max_q_change, finish_line)
+
+			if convergence_monitor is not None:
+				stop_reason = convergence_monitor.end_episode(test_steps, max_q_change)
+				if stop_reason is not None:
+					self.stop_reason = 'converged after %d episodes: %s' % (idx + 1, stop_reason)
+					break
 
+		if training_metrics is not None:
+			training_metrics.end_training()
 		return (self.history_of_learning, self.converge_result)
 
+	#=============================
+	# train_batch()
+	#	- Learn Values of every state (via q-learning) w/ num_cars cars racing in lockstep (see RaceEnvironment)
+	#	- same update as train() for every car at once (see update_q_batch())
+	#	- episodes start like train()'s (see get_start_state()), cars that start over are drawn from the start distribution
+	#	- runs until number_of_iterations episodes have ended
+	#=============================
+	def train_batch(self, number_of_iterations, crash_algo, num_cars=256):
+		#initialize values
+		learning_rate = 0.75
+		min_learning_rate = 0.01
+		discount_factor = 0.95
+		epsilon_value = 0.5 #half the time we explore, the other half we exploit
+		decay = 0.9999
+
+		self.history_of_learning = list() #store number of test_steps taken per iteration
+		self.converge_result = list() #store whether it converged
+
+		transition_model = self.get_transition_model(crash_algo)
+		environment = RaceEnvironment(transition_model, self.track.start_points, num_cars, start_distribution=self.start_distribution,
+				number_of_episodes=number_of_iterations, random_generator=self.random_generator)
+		q_table = self.q_table.reshape(len(self.q_table), -1) #view, flat action index
+		training_metrics = self.start_training_metrics('train_batch', transition_model)
+
+		while len(self.history_of_learning) < number_of_iterations:
+			#Get action 'a' to take via epsilon greedy algorithm
+			states = environment.states
+			actions = self.epsilon_greedy_action_choice_batch(epsilon_value, q_table[states])
+			next_states, rewards, crossed_finish, timed_out, episode_steps = environment.step(actions)
+
+			#Q-learning equation! (crossing the finish line isn't updated, same as train())
+			update = ~crossed_finish
+			states, actions = states[update], actions[update]
+			max_q_vals_next = np.max(q_table[next_states[update]], axis=1)
+			td_errors = rewards[update] + discount_factor * max_q_vals_next - q_table[states, actions]
+			self.update_q_batch(q_table, states, actions, td_errors, learning_rate)
+
+			learning_rate, epsilon_value = self.end_episodes_batch(crossed_finish, timed_out, episode_steps,
+					learning_rate, min_learning_rate, epsilon_value, decay)
+
+		del self.history_of_learning[number_of_iterations:]
+		del self.converge_result[number_of_iterations:]
+		if training_metrics is not None:
+			#Episodes end a batch at a time, only the totals are reported
+			training_metrics.end_training(len(self.history_of_learning), sum(self.history_of_learning))
+		return (self.history_of_learning, self.converge_result)
+
+	#=============================
+	# train_dyna()
+	#	- Learn Values of every state via Dyna-Q: train()'s q-learning, plus planning
+	#	- every real transition that gets updated is also stored in a ring buffer (see ExperienceBuffer),
+	#		after each real step planning_steps stored transitions are sampled & updated at once
+	#	- a state-action sampled more than once in a planning batch is updated once (by one of its samples)
+	#	- w/ a convergence_monitor training stops as soon as it's met (see train()), the q change counts the planning updates too
+	#@param	planning_steps	planning updates per real step, 0 = plain q-learning
+	#@param	buffer_capacity	transitions kept for planning
+	#=============================
+	def train_dyna(self, number_of_iterations, crash_algo, planning_steps=16, buffer_capacity=100000, convergence_monitor=None):
+		#initialize values
+		learning_rate = 0.75
+		min_learning_rate = 0.01
+		discount_factor = 0.95
+		reward = -1
+		epsilon_value = 0.5 #half the time we explore, the other half we exploit
+		decay = 0.9999
+
+		self.history_of_learning = list() #store number of test_steps taken per iteration
+		self.converge_result = list() #store whether it converged
+
+		transition_model = self.get_transition_model(crash_algo)
+		q_table = self.q_table.reshape(len(self.q_table), -1) #view, flat action index = x_accel_idx * 3 + y_accel_idx
+		action_selector = self.action_selector
+		q_table_values = q_table.reshape(-1) #view, flat state-action index = state * 9 + action
+		num_actions = q_table.shape[1]
+		experience_buffer = ExperienceBuffer(buffer_capacity, self.random_generator)
+		training_metrics = self.start_training_metrics('train_dyna', transition_model)
+		self.stop_reason = 'ran all %d episodes' % number_of_iterations
+		if convergence_monitor is not None:
+			convergence_monitor.start(self.q_table)
+
+		for idx in range(number_of_iterations):
+			#init the environment, aka put the car at a starting place (see get_start_state())
+			state = self.get_start_state(transition_model, crash_algo, idx, number_of_iterations)
+
+			#Reduce learning & epsilon value over time to explore less and learn less
+			if learning_rate > min_learning_rate:
+				learning_rate *= decay
+			epsilon_value *= decay
+
+			finish_line = False;
+			test_steps = 0
+			max_test_steps = 999
+			max_q_change = 0
+			while (not finish_line and test_steps < max_test_steps):
+				test_steps += 1
+
+				#Get action 'a' to take via epsilon greedy algorithm
+				action_vals = q_table[state]
+				action = action_selector.choose(action_vals, epsilon_value)
+				q_val = action_vals[action]
+
+				#Get next state via applying action (same as car.accelerate() + car.move())
+				last_state = state
+				state, reward, done = transition_model.step(state, action, self.random_generator)
+				if done:
+					finish_line = True
+					self.converge_result.append(True)
+				else:
+					#Q-learning equation! (the real step)
+					q_change = learning_rate * (reward + discount_factor * q_table[state].max() - q_val)
+					action_vals[action] += q_change
+					if abs(q_change) > max_q_change:
+						max_q_change = abs(q_change)
+					experience_buffer.add(last_state, action, reward, state)
+
+					#Planning: replay remembered transitions
+					if planning_steps > 0:
+						transitions = experience_buffer.sample(planning_steps)
+						state_actions = transitions[:, 0] * num_actions + transitions[:, 1]
+						q_changes = learning_rate * (transitions[:, 2] + \
+								discount_factor * q_table[transitions[:, 3]].max(axis=1) - q_table_values[state_actions])
+						q_table_values[state_actions] += q_changes
+						planning_q_change = float(np.abs(q_changes).max())
+						if planning_q_change > max_q_change:
+							max_q_change = planning_q_change
+
+			if not finish_line:
+				self.converge_result.append(False) #ran out of steps
+			self.history_of_learning.append(test_steps) #track how many steps taken
+			if training_metrics is not None:
+				training_metrics.end_episode(test_steps, epsilon_value, learning_rate, max_q_change, finish_line)
+
+			if convergence_monitor is not None:
+				stop_reason = convergence_monitor.end_episode(test_steps, max_q_change)
+				if stop_reason is not None:
+					self.stop_reason = 'converged after %d episodes: %s' % (idx + 1, stop_reason)
+					break
+
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.history_of_learning, self.converge_result)
+
+	#=============================
+	# train_lambda()
+	#	- Learn Values of every state via Watkins Q(lambda) (or SARSA(lambda), see sarsa)
+	#	- eligibility traces only for the state-actions visited this episode: a compact array of flat state-action ids
+	#		& an array of their trace values (replacing traces), so a step costs O(trace length)
+	#	- traces that decay under trace_threshold are dropped whenever the arrays fill up
+	#	- unlike train(), the move that crosses the finish line is updated too (target 0),
+	#		so every episode sends the finish line value back along its whole trace
+	#	- Watkins: the traces are cut whenever the next action is exploratory (not the first best action)
+	#	- w/ a convergence_monitor training stops as soon as it's met (see train()), a step's q change is its td update
+	#		(the state-action just taken has the full trace)
+	#@param	trace_decay		lambda
+	#@param	sarsa			False = Watkins Q(lambda), True = SARSA(lambda)
+	#=============================
+	def train_lambda(self, number_of_iterations, crash_algo, trace_decay=0.9, sarsa=False, trace_threshold=1e-3, trace_capacity=256,
+			convergence_monitor=None):
+		#initialize values
+		learning_rate = 0.75
+		min_learning_rate = 0.01
+		discount_factor = 0.95
+		epsilon_value = 0.5 #half the time we explore, the other half we exploit
+		decay = 0.9999
+		trace_step = discount_factor * trace_decay
+
+		self.history_of_learning = list() #store number of test_steps taken per iteration
+		self.converge_result = list() #store whether it converged
+
+		transition_model = self.get_transition_model(crash_algo)
+		q_table = self.q_table.reshape(len(self.q_table), -1) #view, flat action index = x_accel_idx * 3 + y_accel_idx
+		q_table_values = q_table.reshape(-1) #view, flat state-action index = state * 9 + action
+		num_actions = q_table.shape[1]
+		action_selector = self.action_selector
+		trace_ids = np.zeros(trace_capacity, dtype=np.int64)
+		trace_values = np.zeros(trace_capacity, dtype=np.float64)
+		training_metrics = self.start_training_metrics('train_lambda', transition_model)
+		self.stop_reason = 'ran all %d episodes' % number_of_iterations
+		if convergence_monitor is not None:
+			convergence_monitor.start(self.q_table)
+
+		for idx in range(number_of_iterations):
+			#init the environment, aka put the car at a starting place (see get_start_state())
+			state = self.get_start_state(transition_model, crash_algo, idx, number_of_iterations)
+
+			#Reduce learning & epsilon value over time to explore less and learn less
+			if learning_rate > min_learning_rate:
+				learning_rate *= decay
+			epsilon_value *= decay
+
+			trace_length = 0
+			trace_positions = dict() #flat state-action id -> index into the trace arrays
+			action = action_selector.choose(q_table[state], epsilon_value)
+
+			finish_line = False;
+			test_steps = 0
+			max_test_steps = 999
+			max_q_change = 0
+			while (not finish_line and test_steps < max_test_steps):
+				test_steps += 1
+				state_action = state * num_actions + action
+
+				#Get next state via applying action (same as car.accelerate() + car.move())
+				state, reward, done = transition_model.step(state, action, self.random_generator)
+				if done:
+					finish_line = True
+					self.converge_result.append(True)
+					td_error = reward - q_table_values[state_action]
+				else:
+					action_vals_next = q_table[state]
+					action_next = action_selector.choose(action_vals_next, epsilon_value)
+					if sarsa:
+						q_val_next = action_vals_next[action_next]
+					else:
+						q_val_next = action_vals_next.max()
+					td_error = reward + discount_factor * q_val_next - q_table_values[state_action]
+
+				#Replacing trace of the state-action just taken
+				position = trace_positions.get(state_action)
+				if position is None:
+					if trace_length == len(trace_ids):
+						#Drop the traces that decayed away, make room if they all still count
+						kept = np.flatnonzero(trace_values[:trace_length] >= trace_threshold)
+						trace_length = len(kept)
+						trace_ids[:trace_length] = trace_ids[kept]
+						trace_values[:trace_length] = trace_values[kept]
+						trace_positions = dict(zip(trace_ids[:trace_length].tolist(), range(trace_length)))
+						if trace_length == len(trace_ids):
+							trace_ids = np.concatenate((trace_ids, np.zeros_like(trace_ids)))
+							trace_values = np.concatenate((trace_values, np.zeros_like(trace_values)))
+					position = trace_length
+					trace_positions[state_action] = position
+					trace_ids[position] = state_action
+					trace_length += 1
+				trace_values[position] = 1
+
+				#Q(lambda) equation! every traced state-action moves toward the target
+				q_change = learning_rate * td_error
+				q_table_values[trace_ids[:trace_length]] += q_change * trace_values[:trace_length]
+				if abs(q_change) > max_q_change:
+					max_q_change = abs(q_change)
+
+				if not finish_line:
+					if sarsa or action_next == int(action_vals_next.argmax()):
+						trace_values[:trace_length] *= trace_step
+					else:
+						trace_length = 0
+						trace_positions.clear()
+					action = action_next
+
+			if not finish_line:
+				self.converge_result.append(False) #ran out of steps
+			self.history_of_learning.append(test_steps) #track how many steps taken
+			if training_metrics is not None:
+				training_metrics.end_episode(test_steps, epsilon_value, learning_rate, max_q_change, finish_line)
+
+			if convergence_monitor is not None:
+				stop_reason = convergence_monitor.end_episode(test_steps, max_q_change)
+				if stop_reason is not None:
+					self.stop_reason = 'converged after %d episodes: %s' % (idx + 1, stop_reason)
+					break
+
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.history_of_learning, self.converge_result)
+
+	#=============================
+	# train_kernel()
+	#	- Learn Values of every state w/ whole episodes run by episode_kernels.run_episodes()
+	#		(compiled w/ numba when it's installed, interpreted otherwise - same results for the same seed)
+	#	- same updates & decays as train(), the random numbers are drawn from self.random_generator a block at a time
+	#		(start points included), so runs w/ the same seed are identical
+	#	- w/ a start distribution every episode's start state is drawn from it up front
+	#@param	sarsa	False = q-learning update, True = SARSA update
+	#=============================
+	def train_kernel(self, number_of_iterations, crash_algo, sarsa=False, block_steps=65536):
+		#initialize values: [learning_rate, min_learning_rate, discount_factor, epsilon_value, decay]
+		rates = np.array([0.75, 0.01, 0.95, 0.5, 0.9999])
+		max_test_steps = 999
+
+		transition_model = self.get_transition_model(crash_algo)
+		q_table = self.q_table.reshape(len(self.q_table), -1) #view, flat action index
+		start_states = np.array([transition_model.encode_state(point, [0,0]) for point in self.track.start_points], dtype=np.int64)
+		start_by_episode = self.start_distribution is not None
+		if start_by_episode:
+			#The start state of every episode, drawn up front
+			start_states = self.start_distribution.sample_states(np.arange(number_of_iterations), number_of_iterations).astype(np.int64)
+		episode_steps = np.zeros(number_of_iterations, dtype=np.int64)
+		crossed_finish = np.zeros(number_of_iterations, dtype=bool)
+		draws = np.empty((max(block_steps, max_test_steps), 4))
+		training_metrics = self.start_training_metrics('train_kernel', transition_model)
+
+		episodes = 0
+		while episodes < number_of_iterations:
+			self.random_generator.random(out=draws)
+			result = episode_kernels.run_episodes(transition_model.next_state, transition_model.reward, transition_model.finish,
+					q_table, start_states[episodes:] if start_by_episode else start_states, draws, max_test_steps,
+					transition_model.acceleration_failure, transition_model.failure_action, sarsa, rates, episode_steps[episodes:],
+					crossed_finish[episodes:], start_by_episode)
+			episodes += result[0]
+
+		self.history_of_learning = episode_steps.tolist() #store number of test_steps taken per iteration
+		self.converge_result = crossed_finish.tolist() #store whether it converged
+		if training_metrics is not None:
+			#Whole blocks of episodes run at once, only the totals are reported
+			training_metrics.end_training(number_of_iterations, int(np.sum(episode_steps)))
+		return (self.history_of_learning, self.converge_result)
+
+	#=============================
+	# evaluate()
+	#	- headless test(): race the greedy policy num_rollouts times from every start point (or every state) w/out any I/O
+	#@param	all_states	start from every state in the state space instead of the start points
+	#@return	summary dict (see PolicyEvaluator.evaluate())
+	#=============================
+	def evaluate(self, crash_algo, num_rollouts=1000, all_states=False, max_steps=999):
+		transition_model = self.get_transition_model(crash_algo)
+		if all_states:
+			start_states = np.arange(transition_model.num_states)
+		else:
+			start_states = get_start_states(transition_model, self.track)
+		policy_evaluator = PolicyEvaluator(transition_model, max_steps, self.random_generator)
+		return policy_evaluator.evaluate(get_greedy_policy(self.q_table), start_states, num_rollouts)
+
 	#=============================
 	# test()
 	#
@@ -183,13 +584,10 @@ class ReinforcementLearningQLearning(BaseModel, RaceSimulator ) :
 		while(not crossed_finish and self.iterations < 999):
 			self.print_state(car)
 			#get proper indexing for state-action (q-table) 
-			x_idx = car.position[0]
-			y_idx = car.position[1]
-			x_vel_idx = car.velocity[0] + self.velocity_offset #account for offset to make index positive
-			y_vel_idx = car.velocity[1] + self.velocity_offset #account for offset to make index positive
+			state = self.state_space.get_state_id(car.position, car.velocity)
 
 			#Get action 'a' to take via epsilon greedy algorithm
-			action_vals = self.q_table[x_idx][y_idx][x_vel_idx][y_vel_idx]
+			action_vals = self.q_table[state]
 			action = self.epsilon_greedy_action_choice(epsilon_value, action_vals) #This is the acceleration to choose
 			acceleration = [action[0] - self.accel_offset, action[1] - self.accel_offset]
 			#Get next state via applying action
@@ -212,7 +610,24 @@ def main():
 	parser.add_argument('number_of_iterations', type=int, default=999, help='number of iterations')
 	parser.add_argument('crash_algorithm', type=int, default=0, help='crash algo: 0 = minor, 1 = major')
 	parser.add_argument('learning_analysis', type=int, default=0, help='do learning analysis or not, 0 = no, 1 = yes')
+	parser.add_argument('--reachable_only', action='store_true', help='only store states reachable from the start line')
+	parser.add_argument('--acceleration_failure', type=float, default=0, help='probability an acceleration has no effect')
+	parser.add_argument('--path_collisions', action='store_true', help='check walls & the finish line along the whole path of a move')
+	parser.add_argument('--num_cars', type=int, default=0, help='> 0 = train that many cars in lockstep (train_batch())')
+	parser.add_argument('--kernel', action='store_true', help='train w/ whole episode kernels (train_kernel())')
+	parser.add_argument('--trace_decay', type=float, default=0, help='> 0 = Q(lambda) w/ that lambda (train_lambda())')
+	parser.add_argument('--planning_steps', type=int, default=0, help='> 0 = Dyna-Q w/ that many planning updates per step (train_dyna())')
+	parser.add_argument('--start_distribution', type=str, default='start_line', choices=['start_line', 'uniform', 'curriculum'],
+			help='where training episodes start')
+	parser.add_argument('--curriculum_fraction', type=float, default=0.5, help='fraction of the episodes the curriculum takes to reach the start line')
+	parser.add_argument('--early_stopping', action='store_true', help='stop training once it converges (see ConvergenceMonitor)')
+	parser.add_argument('--evaluate_rollouts', type=int, default=0, help='> 0 = evaluate w/ that many headless rollouts per start point instead of test()')
+	parser.add_argument('--seed', type=int, default=None, help='seed of the learner\'s random generator')
+	parser.add_argument('--random_ties', action='store_true', help='break ties between the best actions randomly')
+	parser.add_argument('--metrics_file', type=str, default=None, help='write per sweep/episode training metrics to this .jsonl file')
 	args = parser.parse_args()
+	if args.early_stopping and (args.num_cars > 0 or args.kernel):
+		parser.error('--early_stopping does not work w/ --num_cars or --kernel')
 
 	track_file = args.track_file
 	num_iterations = args.number_of_iterations
@@ -223,11 +638,44 @@ def main():
 	print('Training file:', track_file, 'for', num_iterations, ' and crash algo:', crash_algo)
 
 	print()
-	q_learning = ReinforcementLearningQLearning(track_file)
-	learn_result = q_learning.train(num_iterations, crash_algo)
+	start_time = time.time()
+	q_learning = ReinforcementLearningQLearning(track_file, args.reachable_only, args.acceleration_failure, args.path_collisions,
+			args.seed, args.random_ties, args.start_distribution, args.curriculum_fraction)
+	print('construction seconds:', time.time() - start_time, 'q_table shape:', q_learning.q_table.shape, 'bytes:', q_learning.q_table.nbytes)
+	memory_report = q_learning.state_space.get_memory_report(q_learning.get_bytes_per_state())
+	print('states:', memory_report[0], 'of', memory_report[1], 'grid states, q_table bytes:', memory_report[3], \
+			'(grid:', memory_report[2], 'saved:', memory_report[4], ')')
+	metrics_listener = None
+	if args.metrics_file is not None:
+		metrics_listener = JsonlListener(args.metrics_file)
+		q_learning.add_training_listener(metrics_listener)
+	start_time = time.time()
+	if args.num_cars > 0:
+		learn_result = q_learning.train_batch(num_iterations, crash_algo, args.num_cars)
+	elif args.kernel:
+		print('numba available:', episode_kernels.NUMBA_AVAILABLE)
+		learn_result = q_learning.train_kernel(num_iterations, crash_algo)
+	else:
+		convergence_monitor = ConvergenceMonitor() if args.early_stopping else None
+		if args.trace_decay > 0:
+			learn_result = q_learning.train_lambda(num_iterations, crash_algo, args.trace_decay, convergence_monitor=convergence_monitor)
+		elif args.planning_steps > 0:
+			learn_result = q_learning.train_dyna(num_iterations, crash_algo, args.planning_steps, convergence_monitor=convergence_monitor)
+		else:
+			learn_result = q_learning.train(num_iterations, crash_algo, convergence_monitor)
+		print('Stopped:', q_learning.stop_reason)
+	print('Training results, seconds:', time.time() - start_time)
+	if metrics_listener is not None:
+		metrics_listener.close()
+		print('Training metrics written to', args.metrics_file)
 
 	print()
-	test_result = q_learning.test(crash_algo)
+	if args.evaluate_rollouts > 0:
+		evaluation = q_learning.evaluate(crash_algo, args.evaluate_rollouts)
+		print('Evaluation: rollouts:', evaluation['rollouts'], 'finish rate:', evaluation['finish_rate'], 'mean steps:', evaluation['mean_steps'],
+				'step percentiles (5, 25, 50, 75, 95):', evaluation['step_percentiles'], 'crashes:', evaluation['crashes'])
+	else:
+		test_result = q_learning.test(crash_algo)
 
 	if learning_analysis != 0:
 		print()
@@ -10,7 +10,12 @@ import argparse
 import operator
 import random
 import copy
+import time
 from reinforcement_learning_q_learning import ReinforcementLearningQLearning
+from race_environment import RaceEnvironment
+from convergence_monitor import ConvergenceMonitor
+from training_metrics import JsonlListener
+import episode_kernels
 from track import Track
 from car import Car
 
@@ -25,14 +30,16 @@ class ReinforcementLearningSarsaLearning(ReinforcementLearningQLearning) :
 	# __init__()
 	#	- create track, super class constructors, and create initial model states & values
 	#=============================
-	def __init__(self, file_name):
-		ReinforcementLearningQLearning.__init__(self, file_name)
+	def __init__(self, file_name, reachable_only=False, acceleration_failure=0, path_collisions=False, seed=None,
+			random_ties=False, start_distribution='start_line', curriculum_fraction=0.5):
+		ReinforcementLearningQLearning.__init__(self, file_name, reachable_only, acceleration_failure, path_collisions, seed,
+				random_ties, start_distribution, curriculum_fraction)
 
 	#=============================
 	# train()
 	#	- OVERRIDED from ReinforcementLearningQLearning - different update algo
 	#=============================
-	def train(self, number_of_iterations, crash_algo):
+	def train(self, number_of_iterations, crash_algo, convergence_monitor=None):
 		#initialize values
 		learning_rate = 0.75
 		min_learning_rate = 0.01
@@ -43,10 +50,18 @@ class ReinforcementLearningSarsaLearning(ReinforcementLearningQLearning) :
 
 		self.history_of_learning = list() #store number of test_steps taken per iteration
 		self.converge_result = list() #store whether it converged
+		self.stop_reason = 'ran all %d episodes' % number_of_iterations
+		if convergence_monitor is not None:
+			convergence_monitor.start(self.q_table)
+
+		transition_model = self.get_transition_model(crash_algo)
+		q_table = self.q_table.reshape(len(self.q_table), -1) #view, flat action index = x_accel_idx * 3 + y_accel_idx
+		action_selector = self.action_selector
+		training_metrics = self.start_training_metrics('train', transition_model)
 
 		for idx in range(number_of_iterations):
-			#init the environment, aka put the car at a starting place w/ 0 velocity
-			car = self.create_start_car(crash_algo)
+			#init the environment, aka put the car at a starting place (see get_start_state())
+			state = self.get_start_state(transition_model, crash_algo, idx, number_of_iterations)
 
 			#Reduce learning & epsilon value over time to explore less and learn less
 			if learning_rate > min_learning_rate:
@@ -54,18 +69,13 @@ class ReinforcementLearningSarsaLearning(ReinforcementLearningQLearning) :
 			epsilon_value *= decay
 
 			test_steps = 0
-
-			#get proper indexing for state-action (q-table) 
-			x_idx = car.position[0]
-			y_idx = car.position[1]
-			x_vel_idx = car.velocity[0] + self.velocity_offset #account for offset to make index positive
-			y_vel_idx = car.velocity[1] + self.velocity_offset #account for offset to make index positive
+			max_q_change = 0
 
 			#SARSA diff
 			#Get action 'a' to take via epsilon greedy algorithm
-			action_vals = self.q_table[x_idx][y_idx][x_vel_idx][y_vel_idx]
-			action = self.epsilon_greedy_action_choice(epsilon_value, action_vals) #This is the acceleration to choose
-			q_val = action_vals[action[0]][action[1]]
+			action_vals = q_table[state]
+			action = action_selector.choose(action_vals, epsilon_value) #This is the acceleration to choose
+			q_val = action_vals[action]
 
 			finish_line = False;
 			test_steps = 0
@@ -73,43 +83,114 @@ class ReinforcementLearningSarsaLearning(ReinforcementLearningQLearning) :
 			while (not finish_line and test_steps < max_test_steps):
 				#Keep track of test steps
 				test_steps += 1
-				if test_steps > max_test_steps:
-					self.converge_result.append(False)
 
-				#TAKE ACTION 'A' Get next state via applying action
-				acceleration = [action[0] - self.accel_offset, action[1] - self.accel_offset]
-				car.accelerate(acceleration)
-				done  =  car.move()
+				#TAKE ACTION 'A' Get next state via applying action (same as car.accelerate() + car.move())
+				state, reward, done = transition_model.step(state, action, self.random_generator)
 				if done:
 					#We are finished, 
 					finish_line = True
 					self.converge_result.append(True)
 				else:
 					#Get next action values
-					#get proper indexing for state-action (q-table) 
-					x_idx_next = car.position[0]
-					y_idx_next = car.position[1]
-					x_vel_idx_next = car.velocity[0] + self.velocity_offset #account for offset to make index positive
-					y_vel_idx_next = car.velocity[1] + self.velocity_offset #account for offset to make index positive
-
 					#Get action 'a' to take via epsilon greedy algorithm
-					action_vals_next = self.q_table[x_idx_next][y_idx_next][x_vel_idx_next][y_vel_idx_next]
-					action_next = self.epsilon_greedy_action_choice(epsilon_value, action_vals_next) #This is the acceleration to choose
-					q_val_next = action_vals_next[action_next[0]][action_next[1]]
+					action_vals_next = q_table[state]
+					action_next = action_selector.choose(action_vals_next, epsilon_value) #This is the acceleration to choose
+					q_val_next = action_vals_next[action_next]
 
 					#Q-learning equation! 
-					action_vals[action[0]][action[1]] += learning_rate * \
-							(reward + discount_factor * q_val_next - q_val)
+					q_change = learning_rate * (reward + discount_factor * q_val_next - q_val)
+					action_vals[action] += q_change
+					if abs(q_change) > max_q_change:
+						max_q_change = abs(q_change)
 
 					#Update for next round
 					action_vals = action_vals_next
 					action = action_next
 					q_val = q_val_next 
 
+			if not finish_line:
+				self.converge_result.append(False) #ran out of steps
 			self.history_of_learning.append(test_steps) #track how many steps taken
+			if training_metrics is not None:
+				training_metrics.end_episode(test_steps, epsilon_value, learning_rate, max_q_change, finish_line)
+
+			if convergence_monitor is not None:
+				stop_reason = convergence_monitor.end_episode(test_steps, max_q_change)
+				if stop_reason is not None:
+					self.stop_reason = 'converged after %d episodes: %s' % (idx + 1, stop_reason)
+					break
+
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.history_of_learning, self.converge_result)
+
+	#=============================
+	# train_batch()
+	#	- OVERRIDED from ReinforcementLearningQLearning - different update algo
+	#	- the next action is picked at the state the move led to, cars that start over pick a new action
+	#=============================
+	def train_batch(self, number_of_iterations, crash_algo, num_cars=256):
+		#initialize values
+		learning_rate = 0.75
+		min_learning_rate = 0.01
+		discount_factor = 0.95
+		epsilon_value = 0.5 #half the time we explore, the other half we exploit
+		decay = 0.9999
+
+		self.history_of_learning = list() #store number of test_steps taken per iteration
+		self.converge_result = list() #store whether it converged
+
+		transition_model = self.get_transition_model(crash_algo)
+		environment = RaceEnvironment(transition_model, self.track.start_points, num_cars, start_distribution=self.start_distribution,
+				number_of_episodes=number_of_iterations, random_generator=self.random_generator)
+		q_table = self.q_table.reshape(len(self.q_table), -1) #view, flat action index
+		training_metrics = self.start_training_metrics('train_batch', transition_model)
+
+		#SARSA diff
+		actions = self.epsilon_greedy_action_choice_batch(epsilon_value, q_table[environment.states])
+		while len(self.history_of_learning) < number_of_iterations:
+			#TAKE ACTION 'A'
+			states = environment.states
+			next_states, rewards, crossed_finish, timed_out, episode_steps = environment.step(actions)
+			actions_next = self.epsilon_greedy_action_choice_batch(epsilon_value, q_table[next_states])
+
+			#SARSA equation! (crossing the finish line isn't updated, same as train())
+			update = ~crossed_finish
+			q_vals_next = q_table[next_states[update], actions_next[update]]
+			td_errors = rewards[update] + discount_factor * q_vals_next - q_table[states[update], actions[update]]
+			self.update_q_batch(q_table, states[update], actions[update], td_errors, learning_rate)
+
+			#Update for next round, cars that start over need an action for their start state
+			done = crossed_finish | timed_out
+			actions = actions_next
+			actions[done] = self.epsilon_greedy_action_choice_batch(epsilon_value, q_table[environment.states[done]])
 
+			learning_rate, epsilon_value = self.end_episodes_batch(crossed_finish, timed_out, episode_steps,
+					learning_rate, min_learning_rate, epsilon_value, decay)
+
+		del self.history_of_learning[number_of_iterations:]
+		del self.converge_result[number_of_iterations:]
+		if training_metrics is not None:
+			#Episodes end a batch at a time, only the totals are reported
+			training_metrics.end_training(len(self.history_of_learning), sum(self.history_of_learning))
 		return (self.history_of_learning, self.converge_result)
 
+	#=============================
+	# train_lambda()
+	#	- OVERRIDED from ReinforcementLearningQLearning - SARSA(lambda) update
+	#=============================
+	def train_lambda(self, number_of_iterations, crash_algo, trace_decay=0.9, sarsa=True, trace_threshold=1e-3, trace_capacity=256,
+			convergence_monitor=None):
+		return ReinforcementLearningQLearning.train_lambda(self, number_of_iterations, crash_algo, trace_decay, sarsa, trace_threshold,
+				trace_capacity, convergence_monitor)
+
+	#=============================
+	# train_kernel()
+	#	- OVERRIDED from ReinforcementLearningQLearning - SARSA update
+	#=============================
+	def train_kernel(self, number_of_iterations, crash_algo, sarsa=True, block_steps=65536):
+		return ReinforcementLearningQLearning.train_kernel(self, number_of_iterations, crash_algo, sarsa, block_steps)
+
 
 #=============================
 # MAIN PROGRAM
@@ -121,7 +202,23 @@ def main():
 	parser.add_argument('number_of_iterations', type=int, default=999, help='number of iterations')
 	parser.add_argument('crash_algorithm', type=int, default=0, help='crash algo: 0 = minor, 1 = major')
 	parser.add_argument('learning_analysis', type=int, default=0, help='do learning analysis or not, 0 = no, 1 = yes')
+	parser.add_argument('--reachable_only', action='store_true', help='only store states reachable from the start line')
+	parser.add_argument('--acceleration_failure', type=float, default=0, help='probability an acceleration has no effect')
+	parser.add_argument('--path_collisions', action='store_true', help='check walls & the finish line along the whole path of a move')
+	parser.add_argument('--num_cars', type=int, default=0, help='> 0 = train that many cars in lockstep (train_batch())')
+	parser.add_argument('--trace_decay', type=float, default=0, help='> 0 = SARSA(lambda) w/ that lambda (train_lambda())')
+	parser.add_argument('--kernel', action='store_true', help='train w/ whole episode kernels (train_kernel())')
+	parser.add_argument('--start_distribution', type=str, default='start_line', choices=['start_line', 'uniform', 'curriculum'],
+			help='where training episodes start')
+	parser.add_argument('--curriculum_fraction', type=float, default=0.5, help='fraction of the episodes the curriculum takes to reach the start line')
+	parser.add_argument('--early_stopping', action='store_true', help='stop training once it converges (see ConvergenceMonitor)')
+	parser.add_argument('--evaluate_rollouts', type=int, default=0, help='> 0 = evaluate w/ that many headless rollouts per start point instead of test()')
+	parser.add_argument('--seed', type=int, default=None, help='seed of the learner\'s random generator')
+	parser.add_argument('--random_ties', action='store_true', help='break ties between the best actions randomly')
+	parser.add_argument('--metrics_file', type=str, default=None, help='write per sweep/episode training metrics to this .jsonl file')
 	args = parser.parse_args()
+	if args.early_stopping and (args.num_cars > 0 or args.kernel):
+		parser.error('--early_stopping does not work w/ --num_cars or --kernel')
 
 	track_file = args.track_file
 	num_iterations = args.number_of_iterations
@@ -132,11 +229,42 @@ def main():
 	print('Training file:', track_file, 'for', num_iterations, ' and crash algo:', crash_algo)
 
 	print()
-	sarsa_learning = ReinforcementLearningSarsaLearning(track_file)
-	learn_result = sarsa_learning.train(num_iterations, crash_algo)
+	start_time = time.time()
+	sarsa_learning = ReinforcementLearningSarsaLearning(track_file, args.reachable_only, args.acceleration_failure, args.path_collisions,
+			args.seed, args.random_ties, args.start_distribution, args.curriculum_fraction)
+	print('construction seconds:', time.time() - start_time, 'q_table shape:', sarsa_learning.q_table.shape, 'bytes:', sarsa_learning.q_table.nbytes)
+	memory_report = sarsa_learning.state_space.get_memory_report(sarsa_learning.get_bytes_per_state())
+	print('states:', memory_report[0], 'of', memory_report[1], 'grid states, q_table bytes:', memory_report[3], \
+			'(grid:', memory_report[2], 'saved:', memory_report[4], ')')
+	metrics_listener = None
+	if args.metrics_file is not None:
+		metrics_listener = JsonlListener(args.metrics_file)
+		sarsa_learning.add_training_listener(metrics_listener)
+	start_time = time.time()
+	if args.num_cars > 0:
+		learn_result = sarsa_learning.train_batch(num_iterations, crash_algo, args.num_cars)
+	elif args.kernel:
+		print('numba available:', episode_kernels.NUMBA_AVAILABLE)
+		learn_result = sarsa_learning.train_kernel(num_iterations, crash_algo)
+	else:
+		convergence_monitor = ConvergenceMonitor() if args.early_stopping else None
+		if args.trace_decay > 0:
+			learn_result = sarsa_learning.train_lambda(num_iterations, crash_algo, args.trace_decay, convergence_monitor=convergence_monitor)
+		else:
+			learn_result = sarsa_learning.train(num_iterations, crash_algo, convergence_monitor)
+		print('Stopped:', sarsa_learning.stop_reason)
+	print('Training results, seconds:', time.time() - start_time)
+	if metrics_listener is not None:
+		metrics_listener.close()
+		print('Training metrics written to', args.metrics_file)
 
 	print()
-	test_result = sarsa_learning.test(crash_algo)
+	if args.evaluate_rollouts > 0:
+		evaluation = sarsa_learning.evaluate(crash_algo, args.evaluate_rollouts)
+		print('Evaluation: rollouts:', evaluation['rollouts'], 'finish rate:', evaluation['finish_rate'], 'mean steps:', evaluation['mean_steps'],
+				'step percentiles (5, 25, 50, 75, 95):', evaluation['step_percentiles'], 'crashes:', evaluation['crashes'])
+	else:
+		test_result = sarsa_learning.test(crash_algo)
 
 	if learning_analysis != 0:
 		print()
@@ -10,10 +10,124 @@ import argparse
 import operator
 import random
 import copy
+import heapq
+import math
+import time
+import os
+import shutil
+import tempfile
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
 from base_model2 import BaseModel
 from race_simulator import RaceSimulator
 from track import Track
 from car import Car
+from transition_model import DEFAULT_CACHE_DIR, DYNAMICS_VERSION, get_track_hash
+from training_metrics import JsonlListener
+
+#=============================
+# create_shared_array()
+#	- ndarray backed by a new multiprocessing.shared_memory block
+#@return	(shared memory block, array, spec to attach to it from another process)
+#=============================
+def create_shared_array(shape, dtype):
+	dtype = np.dtype(dtype)
+	size = max(1, int(np.prod(shape)) * dtype.itemsize)
+	shared_block = shared_memory.SharedMemory(create=True, size=size)
+	array = np.ndarray(shape, dtype=dtype, buffer=shared_block.buf)
+	return (shared_block, array, (shared_block.name, shape, dtype.str))
+
+#=============================
+# attach_shared_array()
+#	- ndarray view of a shared memory block made by create_shared_array()
+#@return	(shared memory block, array)
+#=============================
+def attach_shared_array(spec):
+	shared_block = shared_memory.SharedMemory(name=spec[0])
+	array = np.ndarray(spec[1], dtype=np.dtype(spec[2]), buffer=shared_block.buf)
+	return (shared_block, array)
+
+#=============================
+# value_iteration_worker()
+#	- one worker process of ReinforcementLearningValueIteration.train_parallel()
+#	- attaches to the shared tables & runs sweep_shard()
+#	- a worker that fails aborts the barrier so no other process waits for it forever, a worker whose barrier was
+#		aborted (by the main process or another worker) just stops
+#@param	specs	dict of table name to create_shared_array() spec
+#@param	acceleration_failure, failure_action	see TransitionModel.get_expected_q()
+#=============================
+def value_iteration_worker(specs, shard_start, shard_end, worker_idx, barrier, discount_factor, reward,
+		acceleration_failure=0, failure_action=4):
+	shared_blocks = list()
+	tables = dict()
+	try:
+		for name in specs:
+			shared_block, tables[name] = attach_shared_array(specs[name])
+			shared_blocks.append(shared_block)
+		sweep_shard(tables, shard_start, shard_end, worker_idx, barrier, discount_factor, reward, acceleration_failure, failure_action)
+	except threading.BrokenBarrierError:
+		pass #another process gave up
+	except BaseException:
+		barrier.abort()
+		raise
+
+	tables.clear()
+	for shared_block in shared_blocks:
+		shared_block.close()
+
+#=============================
+# sweep_shard()
+#	- sweeps states [shard_start, shard_end) of the shared tables, then waits at the barrier twice:
+#		once so the main process can check the deltas, once more for its stop/continue decision
+#	- value tables are double buffered, sweep k reads v_table_<k%2> & writes v_table_<(k+1)%2>
+#@param	tables	dict of table name to shared array
+#=============================
+def sweep_shard(tables, shard_start, shard_end, worker_idx, barrier, discount_factor, reward, acceleration_failure, failure_action):
+	next_state = tables['next_state'][shard_start:shard_end]
+	finish = tables['finish'][shard_start:shard_end]
+	q_table = tables['q_table'][shard_start:shard_end]
+	p_table = tables['p_table'][shard_start:shard_end]
+	v_tables = (tables['v_table_0'], tables['v_table_1'])
+
+	iteration = 0
+	done = False
+	while(not done):
+		v_table = v_tables[iteration % 2]
+		v_table_next = v_tables[(iteration + 1) % 2][shard_start:shard_end]
+
+		#q = r + discount * V(s'), crossing the finish line is worth 0
+		np.take(v_table, next_state, out=q_table)
+		q_table *= discount_factor
+		q_table += reward
+		q_table[finish] = 0
+		if acceleration_failure > 0:
+			failed_q_vals = q_table[:, failure_action:failure_action + 1] * acceleration_failure
+			q_table *= 1 - acceleration_failure
+			q_table += failed_q_vals
+
+		#The value is the max q-value, the policy is its (first) action
+		if shard_end > shard_start:
+			np.max(q_table, axis=-1, out=v_table_next)
+			p_table[...] = np.argmax(q_table, axis=-1)
+			tables['deltas'][worker_idx] = np.max(np.abs(v_table[shard_start:shard_end] - v_table_next))
+
+		barrier.wait() #sweep done
+		barrier.wait() #main process decided
+		done = tables['control'][0] == 1
+		iteration += 1
+
+#=============================
+# watch_workers()
+#	- watchdog thread of train_parallel(): aborts the barrier once a worker process has exited,
+#		a worker killed outright (e.g. out of memory) can't abort it itself
+#@param	stop_event	threading.Event, set once the workers are done
+#=============================
+def watch_workers(processes, barrier, stop_event, poll_seconds=0.2):
+	while not stop_event.wait(poll_seconds):
+		if any(process.exitcode is not None for process in processes):
+			barrier.abort()
+			return
 
 #=============================
 # ReinforcementLearningValueIteration
@@ -25,148 +139,646 @@ class ReinforcementLearningValueIteration(BaseModel, RaceSimulator):
 	#=============================
 	# __init__()
 	#	- create track, super class constructors, and create initial model states & values
+	#	- tables are indexed by compact state id (see StateSpace), walls are never stored
+	#@param	engine			'loop' (python loops over list tables) or 'numpy' (whole-array sweeps over ndarray tables)
+	#@param	reachable_only	only store states reachable from the start line
+	#@param	acceleration_failure	probability an acceleration has no effect, values become expectations over both outcomes
+	#@param	path_collisions	check walls & the finish line along the whole path of a move (see PathTable)
 	#=============================
-	def __init__(self, file_name):
+	def __init__(self, file_name, engine='loop', reachable_only=False, acceleration_failure=0, path_collisions=False):
 		new_track = Track(file_name)
 		BaseModel.__init__(self, new_track.data)
-		RaceSimulator.__init__(self, new_track)
+		RaceSimulator.__init__(self, new_track, acceleration_failure=acceleration_failure, path_collisions=path_collisions)
 		self.accelerations = [[-1,-1],[-1,0],[-1,1], [0,-1],[0,0],[0,1], [1,-1],[1,0],[1,1]]
 		self.velocity_range = 11 # This is {+/-5} offset from 0
 		self.velocity_offset = 5
 		self.accel_range = 3 # This is {+/-1} offset from 0
 		self.accel_offset = 1
-		self.v_table = self.create_v_table(self.track.shape) #state value table
-		self.p_table = self.create_v_table(self.track.shape) #Policy table
-		self.q_table = self.create_q_table(self.track.shape) #q_table values
+		self.discount_factor = 0.95
+		self.engine = engine
+		self.reachable_only = reachable_only
+		self.solver_name = 'value_iteration' #artifact name, see get_artifact_dir()
+		self.converged = False #whether the last train() met its stopping criterion (not just ran out of iterations)
+		self.create_state_space(reachable_only)
+		if self.engine == 'numpy':
+			self.v_table = self.create_v_array(self.state_space.num_states) #state value table
+			self.p_table = self.create_p_array(self.state_space.num_states) #Policy table (index into accelerations)
+			self.q_table = self.create_q_array(self.state_space.num_states) #q_table values
+		else:
+			self.v_table = self.create_v_table(self.state_space.num_states) #state value table
+			self.p_table = self.create_v_table(self.state_space.num_states) #Policy table
+			self.q_table = self.create_q_table(self.state_space.num_states) #q_table values
 
 	#=============================
 	# create_q_table()
-	#	- create the multi-dimensional table representing the state space
-	#	- NOTE: velocities will be offset to make indexing easier, -5:0, -4:1, -3:2 ... 0:5, 1:6, 2:7, ... 5:10
-	#		- simply add '5' to the velocity value to reach it's index
+	#	- create the table representing the state-action space, one list of action values per state id
 	#=============================
-	def create_q_table(self, grid_shape):
+	def create_q_table(self, num_states):
 		state_action_tbl = list()
-		for x in range(grid_shape[0]):
-			x_list = list()
-			for y in range(grid_shape[1]):
-				y_list = list()
-				for x_vel in range(0, self.velocity_range):
-					x_vel_list = list()
-					for y_vel in range(0, self.velocity_range):
-						#initialize state value to 0
-						y_vel_list = list()
-						for idx in range(0, len(self.accelerations)):
-							y_vel_list.append(0)
-						x_vel_list.append(y_vel_list)
-					y_list.append(x_vel_list)
-				x_list.append(y_list)
-			state_action_tbl.append(x_list)
+		for state in range(num_states):
+			#initialize state-action values to 0
+			state_action_tbl.append([0] * len(self.accelerations))
 		return state_action_tbl
 
 	#=============================
 	# create_v_table()
-	#	- create the multi-dimensional table representing the state space
-	#	- NOTE: velocities will be offset to make indexing easier, -5:0, -4:1, -3:2 ... 0:5, 1:6, 2:7, ... 5:10
-	#		- simply add '5' to the velocity value to reach it's index
-	#=============================
-	def create_v_table(self, grid_shape):
-		state_value_table = list()
-		for x in range(grid_shape[0]):
-			x_list = list()
-			for y in range(grid_shape[1]):
-				y_list = list()
-				for x_vel in range(0, self.velocity_range):
-					x_vel_list = list()
-					for y_vel in range(0, self.velocity_range):
-						#initialize state value to 0
-						x_vel_list.append(0)
-					y_list.append(x_vel_list)
-				x_list.append(y_list)
-			state_value_table.append(x_list)
-		return state_value_table
+	#	- create the table representing the state space, one value per state id
+	#=============================
+	def create_v_table(self, num_states):
+		#initialize state value to 0
+		return [0] * num_states
+
+	#=============================
+	# create_v_array()
+	#	- ndarray version of create_v_table() for the numpy engine
+	#=============================
+	def create_v_array(self, num_states):
+		return np.zeros(num_states)
+
+	#=============================
+	# create_p_array()
+	#	- policy table for the numpy engine
+	#	- stores the index into self.accelerations rather than the acceleration itself
+	#=============================
+	def create_p_array(self, num_states):
+		return np.zeros(num_states, dtype=np.int8)
+
+	#=============================
+	# create_q_array()
+	#	- ndarray version of create_q_table() for the numpy engine
+	#	- shape (state, acceleration_idx)
+	#=============================
+	def create_q_array(self, num_states):
+		return np.zeros((num_states, len(self.accelerations)))
+
+	#=============================
+	# get_bytes_per_state()
+	#	- bytes the value, q-value & policy tables take per state (as float64, 9 x float64 & int8)
+	#=============================
+	def get_bytes_per_state(self):
+		return 8 + 8 * len(self.accelerations) + 1
+
+	#=============================
+	# find_finish_distances()
+	#	- fewest moves from each state to crossing the finish line (backwards breadth first search)
+	#	- values flow backwards from the finish, so in-place sweeps in this order see their best next state
+	#		already updated
+	#@return	int array per state id, -1 for states that can't reach the finish
+	#=============================
+	def find_finish_distances(self, transition_model):
+		moves = transition_model.finish == 0 #crossing the finish line leads nowhere
+		distances = np.full(len(moves), -1, dtype=np.int32)
+		frontier = ~moves.all(axis=1)
+		distance = 1
+		while frontier.any():
+			distances[frontier] = distance
+			distance += 1
+			#Any unvisited state w/ a move into the frontier
+			frontier = (frontier[transition_model.next_state] & moves).any(axis=1) & (distances < 0)
+		return distances
+
+	#=============================
+	# get_sweep_order()
+	#	- state ids sorted by find_finish_distances(), closest first (states that can't reach the finish last)
+	#@return	(state ids, their distances)
+	#=============================
+	def get_sweep_order(self, transition_model):
+		distances = self.find_finish_distances(transition_model)
+		distances = np.where(distances < 0, np.iinfo(np.int32).max, distances)
+		sweep_order = np.argsort(distances, kind='stable')
+		return (sweep_order, distances[sweep_order])
+
+	#=============================
+	# find_predecessors()
+	#	- invert the transition model
+	#@return	list (per state id) of lists of the state ids that can move into that state
+	#=============================
+	def find_predecessors(self, transition_model):
+		num_states, num_actions = transition_model.next_state.shape
+		moves = transition_model.finish == 0 #crossing the finish line leads nowhere
+		next_states = transition_model.next_state[moves]
+		states = np.repeat(np.arange(num_states), num_actions)[moves.ravel()]
+		pairs = np.unique(next_states.astype(np.int64) * num_states + states)
+		counts = np.bincount(pairs // num_states, minlength=num_states)
+		return [state_list.tolist() for state_list in np.split(pairs % num_states, np.cumsum(counts)[:-1])]
+
+	#=============================
+	# get_q_values()
+	#	- (expected) q-values of a state w/ list versions of the transition model arrays
+	#@return	list of q-values, one per acceleration
+	#=============================
+	def get_q_values(self, state, v_table, next_state, reward, finish, discount_factor, transition_model):
+		q_vals = list()
+		for accel_idx in range(0, len(self.accelerations)):
+			q_val = reward[state][accel_idx]
+			if not finish[state][accel_idx]:
+				q_val += discount_factor * v_table[next_state[state][accel_idx]]
+			q_vals.append(q_val)
+		return transition_model.get_expected_q_values(q_vals)
+
+	#=============================
+	# get_best_action()
+	#	- one bellman backup of a state w/ list versions of the transition model arrays
+	#@return	(max q-value, index of its (first) acceleration)
+	#=============================
+	def get_best_action(self, state, v_table, next_state, reward, finish, discount_factor, transition_model):
+		q_vals = self.get_q_values(state, v_table, next_state, reward, finish, discount_factor, transition_model)
+		max_q_val = -999999
+		policy_idx = 0
+		for accel_idx in range(0, len(self.accelerations)):
+			q_val = q_vals[accel_idx]
+			if q_val > max_q_val:
+				policy_idx = accel_idx
+				max_q_val = q_val
+		return (max_q_val, policy_idx)
 
 	#=============================
 	# train()
 	#	- Learn Values of every state (via value iteration)
+	#@param	mode	'jacobi' = every sweep reads a copy of the previous sweep's values
+	#				'gauss_seidel' = in-place sweeps, ordered by (move) distance to the finish line
+	#				'prioritized' = prioritized sweeping, see train_prioritized()
+	#@param	workers	number of processes for numpy engine jacobi sweeps, see train_parallel()
+	#@param	stop_on_policy	numpy engine, one process: also sweep until a sweep changes no action, see train_vectorized()
 	#=============================
-	def train(self, max_iterations, car_algo):
+	def train(self, max_iterations, car_algo, mode='jacobi', workers=1, stop_on_policy=False):
+		if workers > 1:
+			if self.engine == 'numpy' and mode == 'jacobi':
+				if stop_on_policy:
+					print('stop_on_policy only applies to one process, stopping', workers, 'workers on the residual')
+				return self.train_parallel(max_iterations, car_algo, workers)
+			print('workers only apply to numpy engine jacobi sweeps, running', self.engine, mode, 'in one process')
+		if stop_on_policy and (self.engine != 'numpy' or mode == 'prioritized'):
+			print('stop_on_policy only applies to numpy engine sweeps, stopping', self.engine, mode, 'on the residual')
+		if mode == 'prioritized':
+			return self.train_prioritized(max_iterations, car_algo)
+		if self.engine == 'numpy':
+			return self.train_vectorized(max_iterations, car_algo, mode, stop_on_policy)
+
 		#initialize values
-		tmp_car = self.create_start_car(car_algo)
-		discount_factor = 0.95
+		transition_model = self.get_transition_model(car_algo)
+		discount_factor = self.discount_factor
 		reward = -1
 		bellman_error_magnitude = 0.1
 		self.training_iterations = 0
 		max_delta = 0
 		error_history = [max_delta]
+		if mode == 'gauss_seidel':
+			sweep_order = self.get_sweep_order(transition_model)[0].tolist()
+			#Start pessimistic (the value of never finishing) so states not yet swept never look best
+			self.v_table = [reward / (1 - discount_factor)] * len(self.v_table)
+		else:
+			sweep_order = range(0, len(self.v_table))
+		training_metrics = self.start_training_metrics('train', transition_model)
 
 		done = False
 		while(not done and self.training_iterations < max_iterations):
 			max_delta = 0
 			self.training_iterations += 1
-			#Make previous deep copy
-			v_table_previous = copy.deepcopy(self.v_table)
+			if mode == 'gauss_seidel':
+				#In-place, states later in the sweep already see this sweep's values
+				v_table_previous = self.v_table
+			else:
+				#Make previous deep copy
+				v_table_previous = copy.deepcopy(self.v_table)
 
 			#Iterate through & update EVERY state
-			for x in range(0, len(self.v_table)):
-				y_vals = self.v_table[x]
-				for y in range(0, len(y_vals)):
-					x_vel_vals = self.v_table[x][y]
-					for x_vel in range(0, len(x_vel_vals)):
-						y_vel_vals = self.v_table[x][y][x_vel]
-						for y_vel in range(0, len(y_vel_vals)):
-							#UPDATE THIS STATE VALUE & POLICY
-							max_q_val = -999999
-							policy = [0,0]
-							for accel_idx in range(0, len(self.accelerations)):
-								acceleration = self.accelerations[accel_idx]
-								reward = -1
-								#Find the next state
-								tmp_car.position = [x,y]
-								tmp_car.velocity = [x_vel - self.velocity_offset, y_vel - self.velocity_offset]
-								tmp_car.accelerate(acceleration)
-
-								cross_finish_line = tmp_car.move()
-
-								#find the next state value
-								x_next = tmp_car.position[0] #Note if crossing finish line, DO NOT USE, position not updated
-								y_next = tmp_car.position[1]
-								x_next_vel = tmp_car.velocity[0] + self.velocity_offset
-								y_next_vel = tmp_car.velocity[1] + self.velocity_offset
-								
-								state_val_next = float(0)
-								if cross_finish_line:
-									state_val_next = float(0)
-									reward = 0
-								else:
-									state_val_next = float(v_table_previous[x_next][y_next][x_next_vel][y_next_vel])
-
-								#Calculate q_value 
-								q_val = reward + discount_factor * state_val_next
-								self.q_table[x][y][x_vel][y_vel][accel_idx] = q_val
-
-								#Track the max q_val
-								if q_val > max_q_val:
-									policy = acceleration
-									max_q_val = q_val
-
-							#update the value & policy w/ the best action result
-							#The value should be the max q-value
-							prev_q_val = self.v_table[x][y][x_vel][y_vel]
-							self.v_table[x][y][x_vel][y_vel] = max_q_val
-							#Remember the max delta for stopping point
-							delta = prev_q_val - max_q_val
-							if delta > max_delta:
-								print('itr:', self.training_iterations, 'new max value delta', delta)
-								max_delta = delta
-							#The action associated with this q-value is now the policy
-							self.p_table[x][y][x_vel][y_vel] = policy
+			for state in sweep_order:
+				#UPDATE THIS STATE VALUE & POLICY
+				q_vals = list()
+				for accel_idx in range(0, len(self.accelerations)):
+					#Find the next state (reward is 0 for crossing the finish line, -1 otherwise)
+					state_next, reward, cross_finish_line = transition_model.get_outcome(state, accel_idx)
+
+					#find the next state value
+					state_val_next = float(0)
+					if not cross_finish_line:
+						state_val_next = float(v_table_previous[state_next])
+
+					#Calculate q_value 
+					q_vals.append(reward + discount_factor * state_val_next)
+				#Expected q_value if the acceleration can fail
+				q_vals = transition_model.get_expected_q_values(q_vals)
+
+				max_q_val = -999999
+				policy = [0,0]
+				for accel_idx in range(0, len(self.accelerations)):
+					acceleration = self.accelerations[accel_idx]
+					q_val = q_vals[accel_idx]
+					self.q_table[state][accel_idx] = q_val
+
+					#Track the max q_val
+					if q_val > max_q_val:
+						policy = acceleration
+						max_q_val = q_val
+
+				#update the value & policy w/ the best action result
+				#The value should be the max q-value
+				prev_q_val = self.v_table[state]
+				self.v_table[state] = max_q_val
+				#Remember the max delta for stopping point
+				delta = abs(prev_q_val - max_q_val)
+				if delta > max_delta:
+					max_delta = delta
+				#The action associated with this q-value is now the policy
+				self.p_table[state] = policy
 			error_history.append(max_delta)
+			if training_metrics is not None:
+				training_metrics.end_sweep(len(sweep_order), max_delta)
 			if max_delta < bellman_error_magnitude:
 				done = True
 
+		self.converged = done
+		if training_metrics is not None:
+			training_metrics.end_training()
 		return (self.training_iterations, error_history)
 
+	#=============================
+	# train_vectorized()
+	#	- Learn Values of every state (via value iteration) w/ the numpy engine
+	#	- 'jacobi' sweeps are one gather + max over the whole q_table, same update as train()
+	#	- 'gauss_seidel' sweeps update one block of states (all at the same move distance to the finish) at a time,
+	#		in place, closest block first
+	#	- stop_on_policy = the residual must be below 0.1 AND the sweep must change no action: w/ a discount factor < 1
+	#		far away values all crowd the value of never finishing, the residual can drop below 0.1 before the finish
+	#		line's value has reached a far away start line (big tracks)
+	#=============================
+	def train_vectorized(self, max_iterations, car_algo, mode='jacobi', stop_on_policy=False):
+		if mode == 'gauss_seidel':
+			return self.train_vectorized_in_place(max_iterations, car_algo, stop_on_policy)
+
+		#initialize values
+		discount_factor = self.discount_factor
+		reward = -1
+		bellman_error_magnitude = 0.1
+		self.training_iterations = 0
+		max_delta = 0
+		error_history = [max_delta]
+
+		transition_model = self.get_transition_model(car_algo)
+		next_state = transition_model.next_state
+		finish = transition_model.finish == 1
+		v_table_next = np.empty_like(self.v_table)
+		training_metrics = self.start_training_metrics('train_vectorized', transition_model)
+
+		done = False
+		while(not done and self.training_iterations < max_iterations):
+			self.training_iterations += 1
+
+			#q = r + discount * V(s'), crossing the finish line is worth 0
+			np.take(self.v_table, next_state, out=self.q_table)
+			self.q_table *= discount_factor
+			self.q_table += reward
+			self.q_table[finish] = 0
+			transition_model.get_expected_q(self.q_table)
+
+			#The value is the max q-value, the policy is its (first) action
+			np.max(self.q_table, axis=-1, out=v_table_next)
+			policy = np.argmax(self.q_table, axis=-1)
+			policy_changes = int(np.count_nonzero(policy != self.p_table)) if stop_on_policy else 0
+			self.p_table[...] = policy
+
+			#Remember the max delta for stopping point
+			max_delta = float(np.max(np.abs(self.v_table - v_table_next)))
+			self.v_table, v_table_next = v_table_next, self.v_table
+
+			error_history.append(max_delta)
+			if training_metrics is not None:
+				training_metrics.end_sweep(len(self.v_table), max_delta)
+			if max_delta < bellman_error_magnitude and policy_changes == 0:
+				done = True
+
+		self.converged = done
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.training_iterations, error_history)
+
+	#=============================
+	# train_vectorized_in_place()
+	#	- Gauss-Seidel version of train_vectorized(), see train_vectorized()
+	#=============================
+	def train_vectorized_in_place(self, max_iterations, car_algo, stop_on_policy=False):
+		#initialize values
+		discount_factor = self.discount_factor
+		reward = -1
+		bellman_error_magnitude = 0.1
+		self.training_iterations = 0
+		max_delta = 0
+		error_history = [max_delta]
+
+		transition_model = self.get_transition_model(car_algo)
+		sweep_order, distances = self.get_sweep_order(transition_model)
+		blocks = np.split(sweep_order, np.flatnonzero(np.diff(distances)) + 1)
+		block_next_state = [transition_model.next_state[block] for block in blocks]
+		block_finish = [transition_model.finish[block] == 1 for block in blocks]
+		#Start pessimistic (the value of never finishing) so states not yet swept never look best
+		self.v_table[:] = reward / (1 - discount_factor)
+		training_metrics = self.start_training_metrics('train_vectorized_in_place', transition_model)
+
+		done = False
+		while(not done and self.training_iterations < max_iterations):
+			self.training_iterations += 1
+			max_delta = 0
+			policy_changes = 0
+
+			for block_idx in range(0, len(blocks)):
+				block = blocks[block_idx]
+				#q = r + discount * V(s'), crossing the finish line is worth 0
+				q_vals = self.v_table[block_next_state[block_idx]]
+				q_vals *= discount_factor
+				q_vals += reward
+				q_vals[block_finish[block_idx]] = 0
+				transition_model.get_expected_q(q_vals)
+				self.q_table[block] = q_vals
+
+				#The value is the max q-value, the policy is its (first) action
+				max_q_vals = np.max(q_vals, axis=-1)
+				max_delta = max(max_delta, float(np.max(np.abs(self.v_table[block] - max_q_vals))))
+				self.v_table[block] = max_q_vals
+				policy = np.argmax(q_vals, axis=-1)
+				if stop_on_policy:
+					policy_changes += int(np.count_nonzero(policy != self.p_table[block]))
+				self.p_table[block] = policy
+
+			error_history.append(max_delta)
+			if training_metrics is not None:
+				training_metrics.end_sweep(len(self.v_table), max_delta)
+			if max_delta < bellman_error_magnitude and policy_changes == 0:
+				done = True
+
+		self.converged = done
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.training_iterations, error_history)
+
+	#=============================
+	# train_parallel()
+	#	- train_vectorized() jacobi sweeps, sharded by state id (i.e. by track row) across worker processes
+	#	- tables live in multiprocessing.shared_memory, nothing but the shard bounds is sent to a worker,
+	#		the processes sync w/ a barrier per sweep (see value_iteration_worker())
+	#	- every state gets the exact same update as in one process, so results are identical
+	#	- a worker that fails or dies breaks the barrier (see watch_workers()), raises RuntimeError
+	#=============================
+	def train_parallel(self, max_iterations, car_algo, workers):
+		#initialize values
+		discount_factor = self.discount_factor
+		reward = -1
+		bellman_error_magnitude = 0.1
+		self.training_iterations = 0
+		max_delta = 0
+		error_history = [max_delta]
+		self.converged = False
+		if max_iterations < 1:
+			return (self.training_iterations, error_history)
+
+		transition_model = self.get_transition_model(car_algo)
+		num_states = len(self.v_table)
+		shared_blocks = list()
+		specs = dict()
+		tables = dict()
+		for name, shape, dtype in [('next_state', transition_model.next_state.shape, np.int32),
+				('finish', transition_model.finish.shape, bool), ('q_table', self.q_table.shape, self.q_table.dtype),
+				('p_table', self.p_table.shape, self.p_table.dtype), ('v_table_0', self.v_table.shape, self.v_table.dtype),
+				('v_table_1', self.v_table.shape, self.v_table.dtype), ('deltas', (workers,), np.float64), ('control', (1,), np.int8)]:
+			shared_block, tables[name], specs[name] = create_shared_array(shape, dtype)
+			shared_blocks.append(shared_block)
+		tables['next_state'][...] = transition_model.next_state
+		tables['finish'][...] = transition_model.finish == 1
+		tables['v_table_0'][...] = self.v_table
+		tables['deltas'][...] = 0
+		tables['control'][0] = 0
+
+		context = multiprocessing.get_context()
+		barrier = context.Barrier(workers + 1)
+		shard_bounds = np.linspace(0, num_states, workers + 1).astype(int)
+		processes = list()
+		stop_event = threading.Event()
+		training_metrics = self.start_training_metrics('train_parallel', transition_model)
+		try:
+			for worker_idx in range(0, workers):
+				process = context.Process(target=value_iteration_worker, args=(specs, shard_bounds[worker_idx], \
+						shard_bounds[worker_idx + 1], worker_idx, barrier, discount_factor, reward, \
+						transition_model.acceleration_failure, transition_model.failure_action), daemon=True)
+				process.start()
+				processes.append(process)
+			watchdog = threading.Thread(target=watch_workers, args=(processes, barrier, stop_event), daemon=True)
+			watchdog.start()
+
+			done = False
+			try:
+				while(not done):
+					barrier.wait() #every shard swept
+					self.training_iterations += 1
+					max_delta = float(np.max(tables['deltas']))
+					error_history.append(max_delta)
+					if training_metrics is not None:
+						training_metrics.end_sweep(num_states, max_delta)
+					self.converged = max_delta < bellman_error_magnitude
+					if self.converged or self.training_iterations >= max_iterations:
+						done = True
+						tables['control'][0] = 1
+					barrier.wait() #let the workers go on (or stop)
+			except threading.BrokenBarrierError:
+				for process in processes:
+					process.join(1)
+				raise RuntimeError('value iteration worker failed, exit codes: %s' % [process.exitcode for process in processes])
+
+			stop_event.set()
+			for process in processes:
+				process.join()
+
+			self.v_table[...] = tables['v_table_%d' % (self.training_iterations % 2)]
+			self.q_table[...] = tables['q_table']
+			self.p_table[...] = tables['p_table']
+		finally:
+			stop_event.set()
+			for process in processes:
+				if process.is_alive():
+					process.terminate()
+			tables.clear()
+			for shared_block in shared_blocks:
+				shared_block.close()
+				shared_block.unlink()
+
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.training_iterations, error_history)
+
+	#=============================
+	# train_prioritized()
+	#	- Learn Values of every state via prioritized sweeping (either engine)
+	#	- always back up the state w/ the biggest bellman residual |max_a q(s,a) - V(s)| next,
+	#		then re-check the residuals of the states that can move into it
+	#	- stops once no residual is above the same 0.1 threshold used by the sweeps
+	#	- max_iterations / training_iterations count (equivalent) sweeps, i.e. multiples of the number of states
+	#=============================
+	def train_prioritized(self, max_iterations, car_algo):
+		#initialize values
+		discount_factor = self.discount_factor
+		bellman_error_magnitude = 0.1
+		max_delta = 0
+		error_history = [max_delta]
+
+		transition_model = self.get_transition_model(car_algo)
+		next_state = transition_model.next_state.tolist()
+		reward = transition_model.reward.tolist()
+		finish = transition_model.finish.tolist()
+		predecessors = self.find_predecessors(transition_model)
+		num_states = len(next_state)
+		training_metrics = self.start_training_metrics('train_prioritized', transition_model)
+		#Start pessimistic (the value of never finishing), the finish line is then the only source of
+		#big residuals and every state is backed up about once, in finishing order
+		v_table = [-1 / (1 - discount_factor)] * num_states
+
+		#Queue every state by its residual, biggest first (heapq is a min heap)
+		priorities = [0.0] * num_states
+		priority_queue = list()
+		for state in range(0, num_states):
+			residual = abs(self.get_best_action(state, v_table, next_state, reward, finish, discount_factor, transition_model)[0] - v_table[state])
+			if residual > bellman_error_magnitude:
+				priorities[state] = residual
+				priority_queue.append((-residual, state))
+		heapq.heapify(priority_queue)
+
+		self.backups = 0
+		while(priority_queue and self.backups < max_iterations * num_states):
+			neg_residual, state = heapq.heappop(priority_queue)
+			if -neg_residual != priorities[state]:
+				continue #stale entry, the state was queued again w/ a bigger residual
+			priorities[state] = 0.0
+
+			#UPDATE THIS STATE VALUE
+			max_q_val = self.get_best_action(state, v_table, next_state, reward, finish, discount_factor, transition_model)[0]
+			max_delta = max(max_delta, abs(v_table[state] - max_q_val))
+			v_table[state] = max_q_val
+			self.backups += 1
+			if self.backups % num_states == 0:
+				error_history.append(max_delta)
+				if training_metrics is not None:
+					#An equivalent sweep: num_states backups, the residual is its biggest value change
+					training_metrics.end_sweep(num_states, max_delta)
+				max_delta = 0
+
+			#Its value changed, so did the residual of every state that can move into it
+			for predecessor in predecessors[state]:
+				residual = abs(self.get_best_action(predecessor, v_table, next_state, reward, finish, discount_factor, transition_model)[0] - v_table[predecessor])
+				if residual > bellman_error_magnitude and residual > priorities[predecessor]:
+					priorities[predecessor] = residual
+					heapq.heappush(priority_queue, (-residual, predecessor))
+
+		if self.backups % num_states != 0:
+			error_history.append(max_delta)
+			if training_metrics is not None:
+				training_metrics.end_sweep(self.backups % num_states, max_delta)
+		self.training_iterations = math.ceil(self.backups / num_states)
+		self.converged = not any(priorities) #no residual above the threshold left in the queue
+
+		#Fill in q-values & policy from the final values
+		q_table = list()
+		p_table = list()
+		for state in range(0, num_states):
+			q_vals = self.get_q_values(state, v_table, next_state, reward, finish, discount_factor, transition_model)
+			q_table.append(q_vals)
+			p_table.append(q_vals.index(max(q_vals)))
+
+		if self.engine == 'numpy':
+			self.v_table[:] = v_table
+			self.q_table[:] = q_table
+			self.p_table[:] = p_table
+		else:
+			self.v_table = v_table
+			self.q_table = q_table
+			self.p_table = [self.accelerations[policy_idx] for policy_idx in p_table]
+
+		if training_metrics is not None:
+			training_metrics.end_training()
+		return (self.training_iterations, error_history)
+
+	#=============================
+	# get_policy_acceleration()
+	#	- look up the policy acceleration for a state id, whichever engine was used
+	#=============================
+	def get_policy_acceleration(self, state):
+		if self.engine == 'numpy':
+			return self.accelerations[self.p_table[state]]
+		return self.p_table[state]
+
+	#=============================
+	# get_artifact_dir()
+	#	- directory of the solved tables for a crash algorithm
+	#	- keyed by the track file hash, crash algo, discount, acceleration failure, path collisions, state space
+	#		& dynamics version
+	#=============================
+	def get_artifact_dir(self, crash_algo, cache_dir=DEFAULT_CACHE_DIR):
+		track_name = os.path.splitext(os.path.basename(self.track.file_name))[0]
+		state_space_name = 'reachable' if self.reachable_only else 'valid'
+		path_name = '_paths' if self.path_table is not None else ''
+		dir_name = '%s_%s_%s_crash%d_discount%g_failure%g%s_%s_v%d' % (self.solver_name, track_name, get_track_hash(self.track.file_name)[:16],
+				crash_algo, self.discount_factor, self.acceleration_failure, path_name, state_space_name, DYNAMICS_VERSION)
+		return os.path.join(cache_dir, 'policies', dir_name)
+
+	#=============================
+	# save_tables()
+	#	- write v_table, q_table & p_table (as acceleration indices) to .npy files
+	#	- the files are written into a temp dir next to the artifact, which then replaces the artifact as a whole,
+	#		so load_tables() never sees a half written artifact (e.g. an interrupted --retrain overwrite)
+	#@return	artifact directory
+	#=============================
+	def save_tables(self, crash_algo, cache_dir=DEFAULT_CACHE_DIR):
+		artifact_dir = self.get_artifact_dir(crash_algo, cache_dir)
+		policies_dir = os.path.dirname(artifact_dir)
+		os.makedirs(policies_dir, exist_ok=True)
+		if self.engine == 'numpy':
+			p_table = np.asarray(self.p_table, dtype=np.int8)
+		else:
+			p_table = np.array([self.accelerations.index(list(policy)) for policy in self.p_table], dtype=np.int8)
+		temp_dir = tempfile.mkdtemp(dir=policies_dir, suffix='.tmp')
+		try:
+			np.save(os.path.join(temp_dir, 'v_table.npy'), np.asarray(self.v_table, dtype=np.float64))
+			np.save(os.path.join(temp_dir, 'q_table.npy'), np.asarray(self.q_table, dtype=np.float64))
+			np.save(os.path.join(temp_dir, 'p_table.npy'), p_table)
+			if os.path.exists(artifact_dir):
+				#Move the old artifact out of the way first, a directory can't be renamed over a non-empty one
+				os.replace(artifact_dir, os.path.join(temp_dir, 'old'))
+			os.replace(temp_dir, artifact_dir)
+		except BaseException:
+			shutil.rmtree(temp_dir, ignore_errors=True)
+			raise
+		shutil.rmtree(os.path.join(artifact_dir, 'old'), ignore_errors=True)
+		return artifact_dir
+
+	#=============================
+	# load_tables()
+	#	- read tables written by save_tables()
+	#	- numpy engine tables are copy-on-write memory maps, only the pages a rollout touches get read
+	#		(& training over them never writes back to the files)
+	#	- loop engine tables are read into lists
+	#@return	True if an artifact was found, False = missing, unreadable or mismatched artifact (train instead)
+	#=============================
+	def load_tables(self, crash_algo, cache_dir=DEFAULT_CACHE_DIR):
+		artifact_dir = self.get_artifact_dir(crash_algo, cache_dir)
+		if not os.path.exists(os.path.join(artifact_dir, 'p_table.npy')):
+			return False
+		try:
+			v_table = np.load(os.path.join(artifact_dir, 'v_table.npy'), mmap_mode='c')
+			q_table = np.load(os.path.join(artifact_dir, 'q_table.npy'), mmap_mode='c')
+			p_table = np.load(os.path.join(artifact_dir, 'p_table.npy'), mmap_mode='c')
+		except (OSError, ValueError):
+			print('artifact is unreadable, ignoring', artifact_dir)
+			return False
+		if len(p_table) != self.state_space.num_states or len(v_table) != len(p_table) or len(q_table) != len(p_table):
+			print('artifact does not match the state space, ignoring', artifact_dir)
+			return False
+		if self.engine == 'numpy':
+			self.v_table = v_table
+			self.q_table = q_table
+			self.p_table = p_table
+		else:
+			self.v_table = v_table.tolist()
+			self.q_table = q_table.tolist()
+			self.p_table = [self.accelerations[policy_idx] for policy_idx in p_table]
+		return True
+
 	#=============================
 	# test()
 	#	- test the model (i.e. traverse using policy p_table) 
@@ -183,13 +795,10 @@ class ReinforcementLearningValueIteration(BaseModel, RaceSimulator):
 		while(not crossed_finish and self.iterations < 50):
 			#self.print_state(test_car)
 			#get proper indexing for state-action (q-table) 
-			x_idx = test_car.position[0]
-			y_idx = test_car.position[1]
-			x_vel_idx = test_car.velocity[0] + self.velocity_offset #account for offset to make index positive
-			y_vel_idx = test_car.velocity[1] + self.velocity_offset #account for offset to make index positive
+			state = self.state_space.get_state_id(test_car.position, test_car.velocity)
 
 			#Get action 'a' acceleration to take via policy
-			acceleration = self.p_table[x_idx][y_idx][x_vel_idx][y_vel_idx]
+			acceleration = self.get_policy_acceleration(state)
 
 			#Get next state via applying action
 			test_car.accelerate(acceleration)
@@ -211,21 +820,54 @@ def main():
 	parser.add_argument('max_iterations', type=int, default=999, help='max number of iterations')
 	parser.add_argument('crash_algorithm', type=int, default=0, help='crash algo: 0 = minor, 1 = major')
 	parser.add_argument('learning_analysis', type=int, default=0, help='do learning analysis or not, 0 = no, 1 = yes')
+	parser.add_argument('--engine', type=str, default='loop', choices=['loop', 'numpy'], help='value iteration engine')
+	parser.add_argument('--reachable_only', action='store_true', help='only store states reachable from the start line')
+	parser.add_argument('--mode', type=str, default='jacobi', choices=['jacobi', 'gauss_seidel', 'prioritized'], help='value iteration update mode')
+	parser.add_argument('--workers', type=int, default=1, help='worker processes for numpy engine jacobi sweeps')
+	parser.add_argument('--stop_on_policy', action='store_true', help='numpy engine: sweep until the policy stops changing too (big tracks)')
+	parser.add_argument('--acceleration_failure', type=float, default=0, help='probability an acceleration has no effect')
+	parser.add_argument('--path_collisions', action='store_true', help='check walls & the finish line along the whole path of a move')
+	parser.add_argument('--retrain', action='store_true', help='train even if solved tables are cached')
+	parser.add_argument('--metrics_file', type=str, default=None, help='write per sweep/episode training metrics to this .jsonl file')
 	args = parser.parse_args()
 
 	track_file = args.track_file
 	max_iterations = args.max_iterations
 	crash_algo = args.crash_algorithm
 	learning_analysis = args.learning_analysis
+	engine = args.engine
 
 	print()
-	print('Training file:', track_file, 'for max itr', max_iterations, ' and crash algo:', crash_algo)
+	print('Training file:', track_file, 'for max itr', max_iterations, ' and crash algo:', crash_algo, 'engine:', engine)
 
 	print()
-	value_iteration = ReinforcementLearningValueIteration(track_file)
-	learn_result = value_iteration.train(max_iterations, crash_algo)
-	print('Training results')
-	print('training iterations', learn_result)
+	value_iteration = ReinforcementLearningValueIteration(track_file, engine, args.reachable_only, args.acceleration_failure,
+			args.path_collisions)
+	memory_report = value_iteration.state_space.get_memory_report(value_iteration.get_bytes_per_state())
+	print('states:', memory_report[0], 'of', memory_report[1], 'grid states, table bytes:', memory_report[3], \
+			'(grid:', memory_report[2], 'saved:', memory_report[4], ')')
+	metrics_listener = None
+	if args.metrics_file is not None:
+		metrics_listener = JsonlListener(args.metrics_file)
+		value_iteration.add_training_listener(metrics_listener)
+	start_time = time.time()
+	#Cached tables may have stopped on the residual alone
+	if not args.retrain and not args.stop_on_policy and value_iteration.load_tables(crash_algo):
+		learn_result = (0, [0])
+		print('Loaded solved tables, seconds:', time.time() - start_time, 'from', value_iteration.get_artifact_dir(crash_algo))
+	else:
+		learn_result = value_iteration.train(max_iterations, crash_algo, args.mode, args.workers, args.stop_on_policy)
+		print('Training results, mode:', args.mode, 'seconds:', time.time() - start_time)
+		print('training iterations', learn_result)
+		#Only cache converged tables
+		if value_iteration.converged:
+			try:
+				print('Saved solved tables to', value_iteration.save_tables(crash_algo))
+			except OSError as error:
+				print('Could not save solved tables -', error)
+	if metrics_listener is not None:
+		metrics_listener.close()
+		print('Training metrics written to', args.metrics_file)
 
 	print()
 	test_result = value_iteration.test(crash_algo)
@@ -0,0 +1,102 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Solver scaling report over generated tracks of growing size
+
+import argparse
+import time
+import numpy as np
+from track_generator import get_generated_track
+from reinforcement_learning_value_iteration import ReinforcementLearningValueIteration
+from reinforcement_learning_q_learning import ReinforcementLearningQLearning
+from reinforcement_learning_sarsa_learning import ReinforcementLearningSarsaLearning
+from policy_evaluator import PolicyEvaluator, get_policy_indices, get_start_states
+
+LEARNERS = {'q_learning': ReinforcementLearningQLearning, 'sarsa': ReinforcementLearningSarsaLearning}
+
+#=============================
+# run_solver()
+#	- build one solver on a track & time its transition model & its training separately,
+#		then race its greedy policy once from every start point
+#@param	solver_name		'value_iteration' (numpy engine, jacobi sweeps until the policy stops changing), 'q_learning' or 'sarsa'
+#@param	iterations		max sweeps (value iteration) or episodes (learners)
+#@return	(states, transition model seconds, training seconds, sweeps or episodes run, training steps (0 for value iteration),
+#			greedy mean steps from the start line, start points finished, start points)
+#=============================
+def run_solver(solver_name, track_file, crash_algo, iterations, seed):
+	if solver_name == 'value_iteration':
+		solver = ReinforcementLearningValueIteration(track_file, 'numpy')
+	else:
+		solver = LEARNERS[solver_name](track_file, seed=seed)
+	start_time = time.time()
+	transition_model = solver.get_transition_model(crash_algo)
+	model_seconds = time.time() - start_time
+
+	start_time = time.time()
+	if solver_name == 'value_iteration':
+		#The 0.1 residual alone stops before a far away start line gets the finish line's value
+		learn_result = solver.train(iterations, crash_algo, stop_on_policy=True)
+	else:
+		learn_result = solver.train(iterations, crash_algo)
+	train_seconds = time.time() - start_time
+	if solver_name == 'value_iteration':
+		iterations_run = learn_result[0]
+		train_steps = 0
+		policy = get_policy_indices(solver.p_table)
+	else:
+		iterations_run = len(learn_result[0])
+		train_steps = int(np.sum(learn_result[0]))
+		policy = get_policy_indices(solver.q_table)
+
+	policy_evaluator = PolicyEvaluator(transition_model, random_generator=np.random.default_rng(seed))
+	start_states = get_start_states(transition_model, solver.track)
+	evaluation = policy_evaluator.evaluate(policy, start_states, 1)
+	return (transition_model.num_states, model_seconds, train_seconds, iterations_run, train_steps, evaluation['mean_steps'],
+			int(np.sum(evaluation['crossed_finish'])), len(start_states))
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - solver scaling report')
+	parser = argparse.ArgumentParser(description='solver scaling report over generated tracks')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[100, 200, 400, 800],
+			help='track sizes (size x size) to generate (2000 needs about 2.5 GB)')
+	parser.add_argument('--corridor_widths', type=int, nargs='+', default=[4], help='corridor widths to generate')
+	parser.add_argument('--num_turns', type=int, nargs='+', default=[4], help='corners in the corridor')
+	parser.add_argument('--track_seeds', type=int, nargs='+', default=[0], help='layout seeds')
+	parser.add_argument('--solvers', type=str, nargs='+', default=['value_iteration', 'q_learning', 'sarsa'], help='solvers to time')
+	parser.add_argument('--crash_algorithm', type=int, default=0, help='crash algo: 0 = minor, 1 = major')
+	parser.add_argument('--sweeps', type=int, default=999, help='max value iteration sweeps')
+	parser.add_argument('--episodes', type=int, default=1000, help='learner episodes')
+	parser.add_argument('--seed', type=int, default=0, help='seed of every run')
+	args = parser.parse_args()
+
+	print()
+	print('size, corridor width, turns, track seed, solver, states, transition model seconds, train seconds, sweeps or episodes,',
+			'train steps per second, greedy mean steps, start points finished, solved')
+	unsolved = 0
+	for size in args.sizes:
+		for corridor_width in args.corridor_widths:
+			for num_turns in args.num_turns:
+				for track_seed in args.track_seeds:
+					track_file = get_generated_track(size, size, corridor_width, num_turns, track_seed)
+					for solver_name in args.solvers:
+						iterations = args.sweeps if solver_name == 'value_iteration' else args.episodes
+						num_states, model_seconds, train_seconds, iterations_run, train_steps, mean_steps, finished, num_starts = \
+								run_solver(solver_name, track_file, args.crash_algorithm, iterations, args.seed)
+						#A run whose greedy policy doesn't finish from every start point stopped before solving the track
+						solved = finished == num_starts
+						unsolved += 0 if solved else 1
+						print(size, corridor_width, num_turns, track_seed, solver_name, num_states, '%.3f' % model_seconds,
+								'%.3f' % train_seconds, iterations_run, int(train_steps / train_seconds), '%.1f' % mean_steps, finished,
+								'yes' if solved else 'NO')
+	if unsolved > 0:
+		print()
+		print(unsolved, 'run(s) did not solve their track, their times are not comparable scaling data points:')
+		print('	value iteration needs more --sweeps, learners more --episodes')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,132 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Where training episodes start
+
+import argparse
+import numpy as np
+from track import Track
+from state_space import StateSpace
+
+#=============================
+# StartDistribution
+#
+# - Class to pick the start state of every training episode
+# - 'start_line' = a starting point w/ 0 velocity (same states as RaceSimulator.create_start_car())
+# - 'uniform' = any valid (track or start) point w/ any velocity in the state space (exploring starts)
+# - 'curriculum' = points w/ 0 velocity near the finish first, moving out ring by ring (see Track.find_finish_distances())
+#	over the first curriculum_fraction of training, then the start line
+#=============================
+class StartDistribution():
+
+	#=============================
+	# __init__()
+	#@param	track				Track object
+	#@param	state_space			StateSpace the learner's tables use
+	#@param	random_generator	np.random.Generator to draw from
+	#@param	mode				'start_line', 'uniform' or 'curriculum'
+	#@param	curriculum_fraction	fraction of the episodes the curriculum takes to reach the start line
+	#=============================
+	def __init__(self, track, state_space, random_generator, mode='start_line', curriculum_fraction=0.5):
+		self.mode = mode
+		self.random_generator = random_generator
+		self.curriculum_fraction = curriculum_fraction
+		velocities = np.arange(state_space.velocity_range) - state_space.velocity_offset
+
+		start_points = track.start_point_array.astype(np.int64)
+		self.start_states = state_space.get_state_ids_vectorized((start_points[:, 0], start_points[:, 1]), (0, 0))
+
+		#Every velocity at every valid point
+		valid_points = track.valid_point_array.astype(np.int64)
+		x, x_vel, y_vel = np.meshgrid(valid_points[:, 0], velocities, velocities, indexing='ij')
+		y = np.broadcast_to(valid_points[:, 1].reshape(-1,1,1), x.shape)
+		uniform_states = state_space.get_state_ids_vectorized((x, y), (x_vel, y_vel)).ravel()
+		self.uniform_states = uniform_states[uniform_states >= 0]
+
+		#0 velocity at every valid point, nearest the finish first, out to the farthest starting point
+		finish_distance_grid = track.find_finish_distances()
+		finish_distances = finish_distance_grid[valid_points[:, 0], valid_points[:, 1]]
+		curriculum_states = state_space.get_state_ids_vectorized((valid_points[:, 0], valid_points[:, 1]), (0, 0))
+		kept = (curriculum_states >= 0) & (finish_distances >= 0)
+		order = np.argsort(finish_distances[kept], kind='stable')
+		self.curriculum_states = curriculum_states[kept][order]
+		self.curriculum_distances = finish_distances[kept][order]
+		self.max_distance = int(np.max(finish_distance_grid[start_points[:, 0], start_points[:, 1]]))
+
+	#=============================
+	# get_curriculum_distance()
+	#	- farthest distance from the finish episodes may start at, grows linearly w/ the episode
+	#@return	int distance, -1 = curriculum over (start from the start line)
+	#=============================
+	def get_curriculum_distance(self, episode, number_of_episodes):
+		curriculum_episodes = self.curriculum_fraction * number_of_episodes
+		if episode >= curriculum_episodes:
+			return -1
+		return int(self.max_distance * (episode + 1) / curriculum_episodes)
+
+	#=============================
+	# sample_state()
+	#	- start state of an episode
+	#@param	episode				index of the episode
+	#@param	number_of_episodes	episodes in the training run
+	#@return	int state id
+	#=============================
+	def sample_state(self, episode, number_of_episodes):
+		if self.mode == 'uniform':
+			return int(self.uniform_states[self.random_generator.integers(0, len(self.uniform_states))])
+		if self.mode == 'curriculum':
+			distance = self.get_curriculum_distance(episode, number_of_episodes)
+			if distance >= 0:
+				num_states = int(np.searchsorted(self.curriculum_distances, distance, side='right'))
+				return int(self.curriculum_states[self.random_generator.integers(0, max(num_states, 1))])
+		return int(self.start_states[self.random_generator.integers(0, len(self.start_states))])
+
+	#=============================
+	# sample_states()
+	#	- sample_state() for many episodes at once (batched & kernel training)
+	#@param	episodes			int array, index of each episode
+	#@param	number_of_episodes	episodes in the training run
+	#@return	int array of state ids
+	#=============================
+	def sample_states(self, episodes, number_of_episodes):
+		episodes = np.asarray(episodes)
+		if self.mode == 'uniform':
+			return self.uniform_states[self.random_generator.integers(0, len(self.uniform_states), len(episodes))]
+		states = self.start_states[self.random_generator.integers(0, len(self.start_states), len(episodes))]
+		if self.mode == 'curriculum':
+			curriculum_episodes = self.curriculum_fraction * number_of_episodes
+			in_curriculum = episodes < curriculum_episodes
+			distances = (self.max_distance * (episodes[in_curriculum] + 1) / curriculum_episodes).astype(np.int64)
+			num_states = np.maximum(np.searchsorted(self.curriculum_distances, distances, side='right'), 1)
+			states[in_curriculum] = self.curriculum_states[self.random_generator.integers(0, num_states)]
+		return states
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing start distributions')
+	print()
+	parser = argparse.ArgumentParser(description='test start distributions')
+	parser.add_argument('file_name', type=str, help='track file name')
+	parser.add_argument('--episodes', type=int, default=1000, help='episodes to sample')
+	args = parser.parse_args()
+	print('INPUT VALUES')
+	print('--------------')
+	print('file_name: ', args.file_name)
+	print()
+
+	track = Track(args.file_name)
+	state_space = StateSpace(track)
+	for mode in ['start_line', 'uniform', 'curriculum']:
+		start_distribution = StartDistribution(track, state_space, np.random.default_rng(0), mode)
+		states = [start_distribution.sample_state(episode, args.episodes) for episode in range(args.episodes)]
+		batch_states = start_distribution.sample_states(np.arange(args.episodes), args.episodes)
+		print(mode, 'distinct start states:', len(set(states)), 'batched:', len(set(batch_states.tolist())))
+	print('curriculum distance by episode:', [(episode, start_distribution.get_curriculum_distance(episode, args.episodes)) \
+			for episode in range(0, args.episodes, args.episodes // 10)])
+
+
+if __name__ == '__main__':
+	main()
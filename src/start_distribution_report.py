@@ -0,0 +1,86 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Start distribution convergence report
+
+import argparse
+import time
+import numpy as np
+from reinforcement_learning_q_learning import ReinforcementLearningQLearning
+
+#=============================
+# run_start_distribution()
+#	- train one seeded q-learning model from a start distribution & score its greedy policy from the start line (see evaluate())
+#@return	(seconds, mean greedy steps, start points finished)
+#=============================
+def run_start_distribution(track_file, crash_algo, number_of_iterations, start_distribution, seed, curriculum_fraction=0.5):
+	q_learning = ReinforcementLearningQLearning(track_file, seed=seed, start_distribution=start_distribution,
+			curriculum_fraction=curriculum_fraction)
+	q_learning.get_transition_model(crash_algo)
+	start_time = time.time()
+	q_learning.train(number_of_iterations, crash_algo)
+	seconds = time.time() - start_time
+
+	evaluation = q_learning.evaluate(crash_algo, 1)
+	return (seconds, evaluation['mean_steps'], int(np.sum(evaluation['crossed_finish'])))
+
+#=============================
+# get_episodes_to_stable()
+#	- fewest episodes from which on every (bigger) budget's greedy policy finishes from every start point
+#		w/ mean steps <= target_steps
+#@param	runs	(episodes, seconds, mean greedy steps, start points finished) by increasing episodes
+#@return	episodes, None = never
+#=============================
+def get_episodes_to_stable(runs, num_start_points, target_steps):
+	episodes_to_stable = None
+	for episodes, seconds, mean_steps, finished in runs:
+		if finished == num_start_points and mean_steps <= target_steps:
+			if episodes_to_stable is None:
+				episodes_to_stable = episodes
+		else:
+			episodes_to_stable = None
+	return episodes_to_stable
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - start distribution convergence report')
+	parser = argparse.ArgumentParser(description='start distribution convergence report')
+	parser.add_argument('track_files', type=str, nargs='+', help='track file names')
+	parser.add_argument('--crash_algorithms', type=int, nargs='+', default=[0], help='crash algos: 0 = minor, 1 = major')
+	parser.add_argument('--start_distributions', type=str, nargs='+', default=['start_line', 'uniform', 'curriculum'],
+			help='start distributions to compare')
+	parser.add_argument('--episodes', type=int, nargs='+', default=[250, 500, 1000, 2000, 4000], help='training budgets, each trained from scratch')
+	parser.add_argument('--curriculum_fraction', type=float, default=0.5, help='fraction of the episodes the curriculum takes')
+	parser.add_argument('--tolerance', type=float, default=1.2, help='stable = greedy mean steps <= tolerance * best greedy mean steps of the track')
+	parser.add_argument('--seed', type=int, default=0, help='seed of every run')
+	args = parser.parse_args()
+
+	print()
+	print('track, crash algo, start distribution, episodes, seconds, greedy mean steps, start points finished')
+	for track_file in args.track_files:
+		for crash_algo in args.crash_algorithms:
+			results = dict()
+			for start_distribution in args.start_distributions:
+				results[start_distribution] = list()
+				for episodes in sorted(args.episodes):
+					seconds, mean_steps, finished = run_start_distribution(track_file, crash_algo, episodes, start_distribution, args.seed,
+							args.curriculum_fraction)
+					results[start_distribution].append((episodes, seconds, mean_steps, finished))
+					print(track_file, crash_algo, start_distribution, episodes, '%.2f' % seconds, '%.1f' % mean_steps, finished)
+
+			#Every start distribution of a track is held to the same target
+			num_start_points = len(ReinforcementLearningQLearning(track_file).track.start_points)
+			finished_runs = [run[2] for runs in results.values() for run in runs if run[3] == num_start_points]
+			target_steps = args.tolerance * min(finished_runs) if len(finished_runs) > 0 else 0
+			print()
+			print('track, crash algo, start distribution, episodes to a stable greedy policy (<= %.1f steps)' % target_steps)
+			for start_distribution, runs in results.items():
+				print(track_file, crash_algo, start_distribution, get_episodes_to_stable(runs, num_start_points, target_steps))
+			print()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,150 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Compact state space indexing
+
+import argparse
+import numpy as np
+from track import Track
+from transition_model import TransitionModel
+
+#=============================
+# StateSpace
+#
+# - Class to map (x, y, x_vel, y_vel) states to dense integer ids
+# - Only non-wall cells are kept (walls can never be occupied), optionally only the states
+#	reachable from the starting points
+# - flat state = index into the full (x, y, x_vel_idx, y_vel_idx) grid, same as TransitionModel
+#=============================
+class StateSpace():
+
+	#=============================
+	# __init__()
+	#	- find the states to keep & build the id lookups
+	#@param	track				Track object
+	#@param	transition_models	None = keep every velocity of every non-wall cell
+	#							list of (full grid) TransitionModels = keep only states reachable from
+	#							the starting points (w/ 0 velocity) under any of the models
+	#=============================
+	def __init__(self, track, transition_models=None):
+		self.track = track
+		self.velocity_range = 11 # This is {+/-5} offset from 0
+		self.velocity_offset = 5
+		self.state_shape = (track.shape[0], track.shape[1], self.velocity_range, self.velocity_range)
+		self.num_grid_states = int(np.prod(self.state_shape))
+
+		if transition_models is None:
+			in_space = self.find_valid_states()
+		else:
+			in_space = self.find_reachable_states(transition_models)
+
+		self.flat_states = np.flatnonzero(in_space).astype(np.int32) #state id -> flat state
+		self.num_states = len(self.flat_states)
+		self.state_ids = np.full(self.num_grid_states, -1, dtype=np.int32) #flat state -> state id (-1 = not kept)
+		self.state_ids[self.flat_states] = np.arange(self.num_states, dtype=np.int32)
+
+	#=============================
+	# find_valid_states()
+	#	- every velocity of every cell a car can be on
+	#	- finish cells are included: a car can land on one w/out crossing the line (see check_finish_line)
+	#@return	bool array over flat states
+	#=============================
+	def find_valid_states(self):
+		cells = self.track.track_mask | self.track.start_mask | self.track.finish_mask
+		return np.repeat(cells.ravel(), self.velocity_range * self.velocity_range)
+
+	#=============================
+	# find_reachable_states()
+	#	- breadth first search from the starting points over the transition models
+	#@return	bool array over flat states
+	#=============================
+	def find_reachable_states(self, transition_models):
+		reached = np.zeros(self.num_grid_states, dtype=bool)
+		start_states = [np.ravel_multi_index((point[0], point[1], self.velocity_offset, self.velocity_offset), self.state_shape)
+				for point in self.track.start_points]
+		frontier = np.unique(start_states)
+		reached[frontier] = True
+		while len(frontier) > 0:
+			next_states = np.unique(np.concatenate([model.next_state[frontier].ravel() for model in transition_models]))
+			frontier = next_states[~reached[next_states]]
+			reached[frontier] = True
+		return reached
+
+	#=============================
+	# get_state_id()
+	#	- (position, velocity) to state id
+	#@return	int state id, -1 if the state is not in the space
+	#=============================
+	def get_state_id(self, position, velocity):
+		x_vel_idx = velocity[0] + self.velocity_offset
+		y_vel_idx = velocity[1] + self.velocity_offset
+		flat_state = ((position[0] * self.state_shape[1] + position[1]) * self.velocity_range + x_vel_idx) * self.velocity_range + y_vel_idx
+		return int(self.state_ids[flat_state])
+
+	#=============================
+	# get_state_ids_vectorized()
+	#	- get_state_id() for whole arrays of states at once
+	#@param	position	(x_array, y_array)
+	#@param	velocity	(x_vel_array, y_vel_array)
+	#@return	int array of state ids, -1 where the state is not in the space
+	#=============================
+	def get_state_ids_vectorized(self, position, velocity):
+		x_vel_idx = np.asarray(velocity[0]) + self.velocity_offset
+		y_vel_idx = np.asarray(velocity[1]) + self.velocity_offset
+		flat_states = ((np.asarray(position[0]) * self.state_shape[1] + np.asarray(position[1])) * self.velocity_range + x_vel_idx) * \
+				self.velocity_range + y_vel_idx
+		return self.state_ids[flat_states]
+
+	#=============================
+	# get_state()
+	#	- state id to table indices
+	#@return	(x_idx, y_idx, x_vel_idx, y_vel_idx), velocities offset by 5
+	#=============================
+	def get_state(self, state_id):
+		flat_state, y_vel_idx = divmod(int(self.flat_states[state_id]), self.velocity_range)
+		flat_state, x_vel_idx = divmod(flat_state, self.velocity_range)
+		x_idx, y_idx = divmod(flat_state, self.state_shape[1])
+		return (x_idx, y_idx, x_vel_idx, y_vel_idx)
+
+	#=============================
+	# get_memory_report()
+	#	- how much a table over this space saves vs a full (x, y, x_vel, y_vel) grid table
+	#@param	bytes_per_state	bytes a table (or set of tables) stores per state
+	#@return	(num_states, num_grid_states, grid_bytes, compact_bytes, saved_bytes)
+	#		compact_bytes includes the id lookup arrays
+	#=============================
+	def get_memory_report(self, bytes_per_state):
+		grid_bytes = self.num_grid_states * bytes_per_state
+		compact_bytes = self.num_states * bytes_per_state + self.flat_states.nbytes + self.state_ids.nbytes
+		return (self.num_states, self.num_grid_states, grid_bytes, compact_bytes, grid_bytes - compact_bytes)
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing state space')
+	print()
+	parser = argparse.ArgumentParser(description='test state space')
+	parser.add_argument('file_name', type=str, help='track file name')
+	args = parser.parse_args()
+	file_name = args.file_name
+	print('INPUT VALUES')
+	print('--------------')
+	print('file_name: ', file_name)
+	print()
+
+	track = Track(file_name)
+	bytes_per_state = 8 * 10 #value + 9 q-values as float64
+	valid_space = StateSpace(track)
+	reachable_space = StateSpace(track, [TransitionModel(track, 0), TransitionModel(track, 1)])
+
+	print('LOG BASIC DATA')
+	print('----------------')
+	for name, state_space in [('valid', valid_space), ('reachable', reachable_space)]:
+		report = state_space.get_memory_report(bytes_per_state)
+		print(name, 'states:', report[0], 'of', report[1], 'grid bytes:', report[2], 'compact bytes:', report[3], 'saved bytes:', report[4])
+
+
+if __name__ == '__main__':
+	main()
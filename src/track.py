@@ -5,13 +5,63 @@
 #@description	Track encapsulation
 
 import argparse
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
 import numpy as np
 
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache')
+PARSE_VERSION = 1 #bump whenever parse_track()'s arrays change, so older cache files are not loaded
+
+#=============================
+# get_track_hash()
+#	- sha1 of a track file's contents, the cache key of everything derived from a track
+#@return	hex digest
+#=============================
+def get_track_hash(file_name):
+	with open(file_name, 'rb') as track_file:
+		return hashlib.sha1(track_file.read()).hexdigest()
+
+#=============================
+# save_npz()
+#	- write arrays to a .npz cache file atomically: into a temp file next to it, then renamed over it,
+#		so a process reading the cache at the same time never sees a half written file
+#@param	arrays	dict of name -> array
+#=============================
+def save_npz(file_name, arrays):
+	directory = os.path.dirname(file_name)
+	os.makedirs(directory, exist_ok=True)
+	temp_fd, temp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+	try:
+		with os.fdopen(temp_fd, 'wb') as temp_file:
+			np.savez(temp_file, **arrays)
+		os.replace(temp_name, file_name)
+	except BaseException:
+		os.remove(temp_name)
+		raise
+
+#=============================
+# load_npz()
+#	- read every array of a .npz cache file
+#@return	dict of name -> array, None = missing or unreadable file (a cache miss)
+#=============================
+def load_npz(file_name):
+	try:
+		with np.load(file_name) as npz_file:
+			return dict(npz_file)
+	except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+		return None
+
 #=============================
 # Track
 #
 #	- Class to encapsulate track
 #	- '#' = wall, '.' = track, 'S' = start, 'F' = finish
+#	- also kept as an int8 grid of cell codes w/ a bool mask & an (n, 2) point array per cell type, plus a per-cell closest start lookup
+#	- files are parsed in one pass & cached (cache_dir/tracks/*.npz, None = no cache) keyed by the file's hash & mtime
+#		& PARSE_VERSION, the cache is best-effort: an unwritable cache_dir only costs the parse next time
 #=============================
 class Track():
 
@@ -21,27 +71,77 @@ class Track():
 	#	- find relevant areas
 	#@return	list of starting points as tuples
 	#=============================
-	def __init__(self, file_name, data=None):
+	def __init__(self, file_name, data=None, cache_dir=DEFAULT_CACHE_DIR):
 		self.TRK_CHAR = '.'
 		self.WALL_CHAR = '#'
 		self.START_CHAR = 'S'
 		self.END_CHAR = 'F'
+		self.OTHER_CODE = -1 #any other character
+		self.WALL_CODE = 0
+		self.TRK_CODE = 1
+		self.START_CODE = 2
+		self.END_CODE = 3
 
 		self.file_name = file_name
+		self.cache_file = None
 		if data == None:
-			#Get data from file
-			self.data = self.read_track_as_2darray(self.file_name)
-			self.np_data = np.array(self.data, dtype='str')
+			#Get data from file, or the parsed copy of it cached under its hash & mtime
+			parsed_track = None
+			if cache_dir is not None:
+				self.cache_file = self.get_cache_file(cache_dir)
+			if self.cache_file is not None:
+				parsed_track = load_npz(self.cache_file)
+			if parsed_track is None:
+				parsed_track = self.parse_track(self.read_track_chars(self.file_name))
+				if self.cache_file is not None:
+					try:
+						save_npz(self.cache_file, parsed_track)
+					except OSError as error:
+						print('Track: could not cache', self.file_name, '-', error)
 		else:
 			self.data = data
-
-		self.shape = (len(self.data), len(self.data[0]))
-		self.start_points = self.find_starting_points(self.data)
-		self.finish_points = self.find_finish_points(self.data)
+			parsed_track = self.parse_track(np.array(self.data, dtype='S1').view(np.uint8))
+
+		self.chars = parsed_track['chars']
+		self.grid = parsed_track['grid']
+		#(n, 2) int arrays of every cell type, row by row (the order of the point lists)
+		self.wall_point_array = parsed_track['wall_point_array']
+		self.track_point_array = parsed_track['track_point_array']
+		self.start_point_array = parsed_track['start_point_array']
+		self.finish_point_array = parsed_track['finish_point_array']
+		self.closest_start_idx = parsed_track['closest_start_idx']
+		self.shape = self.chars.shape
+		if data == None:
+			#data (lists of characters) is only built when first used, see __getattr__()
+			self.np_data = self.chars.astype(np.uint32).view('U1')
+		self.wall_mask = self.grid == self.WALL_CODE
+		self.track_mask = self.grid == self.TRK_CODE
+		self.start_mask = self.grid == self.START_CODE
+		self.finish_mask = self.grid == self.END_CODE
+		self.valid_point_array = np.concatenate((self.track_point_array, self.start_point_array))
+
+		self.start_points = self.get_point_list(self.start_point_array)
+		self.finish_points = self.get_point_list(self.finish_point_array)
 		self.finish_line = self.find_finish_line() #Find the x-range & y-range of the wall
-		self.wall_points = self.find_wall_points(self.data)
-		self.track_points = self.find_track_points(self.data)
-		self.valid_points = self.track_points + self.start_points
+		#wall_points, track_points & valid_points (lists of tuples) are only built when first used
+
+	#=============================
+	# __getattr__()
+	#	- the python object versions of the track (one object per cell) are built the first time they are used:
+	#		data (lists of characters) & the point lists (tuples) of the point arrays
+	#=============================
+	def __getattr__(self, name):
+		point_array_names = {'wall_points': 'wall_point_array', 'track_points': 'track_point_array', 'valid_points': 'valid_point_array'}
+		if name == 'data':
+			raw = self.__dict__['chars'].tobytes()
+			cols = self.__dict__['shape'][1]
+			value = [list(raw[idx:idx + cols].decode('latin-1')) for idx in range(0, len(raw), cols)]
+		elif name in point_array_names:
+			value = self.get_point_list(self.__dict__[point_array_names[name]])
+		else:
+			raise AttributeError(name)
+		setattr(self, name, value)
+		return value
 
 	#=============================
 	# print_track()
@@ -52,58 +152,127 @@ class Track():
 			print(''.join(str(n) for n in lines))
 
 	#=============================
-	# read_track_as_1darray()
-	#	- read the track from a given file
-	#@param		file_name
-	#@return	data as 1d array
-	#=============================
-	def read_track_as_1darray(self, file_name):
-		lines = list()
-		with open(file_name) as track_file:
-			for line in track_file:
-				lines.append(line)
-		lines = lines[1:] #account for first line being size
-		return lines
-
+	# parse_track()
+	#	- everything the track needs from its characters, the arrays that are cached
+	#@param	chars	uint8 array of the track characters, shape (rows, cols)
+	#@return	dict of arrays: chars, grid, wall/track/start/finish_point_array & closest_start_idx
 	#=============================
-	# read_track_as_2darray()
-	#	- read the track from a given file
-	#@param		file_name
-	#@return	data as 2d array
-	#=============================
-	def read_track_as_2darray(self, file_name):
-		lines = list()
-		with open(file_name) as track_file:
-			for line in track_file:
-				tmpline = list()
-				for char in line:
-					tmpline.append(char)
-				tmpline = tmpline[:-1] #remove the \n
-				lines.append(tmpline)
-		lines = lines[1:] #account for first line being dimensions of grid
-		return lines
+	def parse_track(self, chars):
+		grid = self.encode_grid(chars)
+		parsed_track = {'chars': chars, 'grid': grid}
+		for name, code in [('wall', self.WALL_CODE), ('track', self.TRK_CODE), ('start', self.START_CODE), ('finish', self.END_CODE)]:
+			parsed_track[name + '_point_array'] = self.find_point_array(grid == code)
+		parsed_track['closest_start_idx'] = self.find_closest_start_idx(chars.shape, parsed_track['start_point_array'])
+		return parsed_track
 
 	#=============================
-	# find_starting_points()
-	#	- find the end starting points of the track
-	#	- assumes starting points are in a straight line
-	#@return	list of starting points as tuples
+	# get_cache_file()
+	#	- where the parsed track is cached, keyed by the file's hash & mtime & PARSE_VERSION
+	#@return	.npz file name, None = the track file can't be read
 	#=============================
-	def find_starting_points(self, track):
-		#Search for character 'S'
-		starting_points = [(ix,iy) for ix, row in enumerate(track) for iy, i in enumerate(row) if i == self.START_CHAR]
-		return starting_points
+	def get_cache_file(self, cache_dir):
+		if not os.path.exists(self.file_name):
+			return None
+		track_name = os.path.splitext(os.path.basename(self.file_name))[0]
+		return os.path.join(cache_dir, 'tracks', '%s_%s_%d_v%d.npz' % (track_name, get_track_hash(self.file_name)[:16],
+				os.stat(self.file_name).st_mtime_ns, PARSE_VERSION))
 
 	#=============================
-	# find_finish_points()
-	#	- find the finish points of the track
-	#	- assumes finish points rae in a straight line
-	#@return	list of starting points as tuples
+	# read_track_chars()
+	#	- read the track from a given file in one go
+	#	- the first line is the 'rows,cols' size of the grid, the rows that follow must match it
+	#@param		file_name
+	#@return	uint8 array of the track characters, shape (rows, cols)
 	#=============================
-	def find_finish_points(self, track):
-		#Search for character 'F'
-		finish_points = [(ix,iy) for ix, row in enumerate(track) for iy, i in enumerate(row) if i == self.END_CHAR]
-		return finish_points
+	def read_track_chars(self, file_name):
+		with open(file_name, 'rb') as track_file:
+			lines = track_file.read().splitlines()
+		header = lines[0].split(b',') if len(lines) > 0 else list()
+		if len(header) != 2 or not header[0].strip().isdigit() or not header[1].strip().isdigit():
+			raise ValueError('%s: first line must be the track size as rows,cols' % file_name)
+		rows = int(header[0])
+		cols = int(header[1])
+
+		lines = lines[1:] #account for first line being dimensions of grid
+		while len(lines) > rows and len(lines[-1].strip()) == 0:
+			lines.pop()
+		if len(lines) != rows:
+			raise ValueError('%s: header says %d rows, found %d' % (file_name, rows, len(lines)))
+		for row, line in enumerate(lines):
+			if len(line) != cols:
+				raise ValueError('%s: header says %d columns, row %d has %d' % (file_name, cols, row, len(line)))
+		return np.frombuffer(b''.join(lines), dtype=np.uint8).reshape(rows, cols)
+
+	#=============================
+	# encode_grid()
+	#	- track characters to cell codes, one lookup per cell
+	#@param	chars	uint8 array of track characters
+	#@return	int8 array, same shape
+	#=============================
+	def encode_grid(self, chars):
+		codes = np.full(256, self.OTHER_CODE, dtype=np.int8)
+		codes[ord(self.WALL_CHAR)] = self.WALL_CODE
+		codes[ord(self.TRK_CHAR)] = self.TRK_CODE
+		codes[ord(self.START_CHAR)] = self.START_CODE
+		codes[ord(self.END_CHAR)] = self.END_CODE
+		return codes.take(chars)
+
+	#=============================
+	# find_point_array()
+	#	- points of a cell type mask, row by row
+	#@return	(n, 2) int32 array of points
+	#=============================
+	def find_point_array(self, mask):
+		return np.stack(np.divmod(np.flatnonzero(mask).astype(np.int32), mask.shape[1]), axis=1)
+
+	#=============================
+	# get_point_list()
+	#	- (n, 2) point array as a list of (x,y) tuples
+	#=============================
+	def get_point_list(self, point_array):
+		return list(zip(point_array[:, 0].tolist(), point_array[:, 1].tolist()))
+
+	#=============================
+	# find_closest_start_idx()
+	#	- index (into the starting points) of the closest starting point of every cell
+	#	- ties resolve to the first start point, same as np.argmin in find_closest_starting_point()
+	#@param	shape			(rows, cols) of the track
+	#@param	starting_points	(n, 2) int array
+	#@return	int array, shape shape
+	#=============================
+	def find_closest_start_idx(self, shape, starting_points):
+		closest_start_idx = np.zeros(shape, dtype=np.int32)
+		if len(starting_points) == 0:
+			return closest_start_idx
+		#A block of rows at a time, big tracks w/ long start lines would need (rows, cols, start points) at once
+		y_difference = np.abs(np.arange(shape[1])[:, np.newaxis] - starting_points[:, 1])
+		block_rows = max(1, (1 << 22) // (shape[1] * len(starting_points)))
+		for block_start in range(0, shape[0], block_rows):
+			x = np.arange(block_start, min(block_start + block_rows, shape[0]))
+			difference_vals = np.abs(x[:, np.newaxis, np.newaxis] - starting_points[:, 0]) + y_difference
+			closest_start_idx[x] = np.argmin(difference_vals, axis=-1)
+		return closest_start_idx
+
+	#=============================
+	# find_finish_distances()
+	#	- fewest cell to cell moves (to any of the 8 neighbours, never through a wall) from every cell to a finish cell
+	#	- grown out from the finish cells one ring at a time
+	#@return	int array, shape self.shape, -1 = wall or no path
+	#=============================
+	def find_finish_distances(self):
+		open_cells = self.track_mask | self.start_mask | self.finish_mask
+		distances = np.full(self.shape, -1, dtype=np.int32)
+		frontier = self.finish_mask.copy()
+		distance = 0
+		while np.any(frontier):
+			distances[frontier] = distance
+			distance += 1
+			grown = np.zeros((self.shape[0] + 2, self.shape[1] + 2), dtype=bool)
+			for x_offset in range(0, 3):
+				for y_offset in range(0, 3):
+					grown[x_offset:x_offset + self.shape[0], y_offset:y_offset + self.shape[1]] |= frontier
+			frontier = grown[1:-1, 1:-1] & open_cells & (distances < 0)
+		return distances
 
 	#=============================
 	# find_finish_line()
@@ -112,20 +281,15 @@ class Track():
 	#@return	tuple	(type_of_line, pt1, pt2) where type of line is horizontal (0) or vert(1)
 	#=============================
 	def find_finish_line(self):
-
-		max_diff = 0
-		max_diff_pt1 = 0
-		max_diff_pt2 = 0
-
-		for point_idx1 in range(0, len(self.finish_points)):
-			test_point1 = np.array(self.finish_points[point_idx1])
-			for point_idx2 in range(0, len(self.finish_points)):
-				test_point2 = np.array(self.finish_points[point_idx2])
-				diff = np.sum(np.abs(test_point1 - test_point2))
-				if diff > max_diff:
-					max_diff_pt1 = test_point1
-					max_diff_pt2 = test_point2
-					max_diff = diff
+		#First pair (in point order) that is farthest apart, w/out trying every pair:
+		#the farthest point from any point is an extreme of x+y or x-y
+		points = self.finish_point_array
+		diagonals = np.stack((points[:, 0] + points[:, 1], points[:, 0] - points[:, 1]), axis=1)
+		farthest = np.max(np.maximum(diagonals - np.min(diagonals, axis=0), np.max(diagonals, axis=0) - diagonals), axis=1)
+		point_idx1 = int(np.argmax(farthest))
+		point_idx2 = int(np.argmax(np.sum(np.abs(points - points[point_idx1]), axis=1)))
+		max_diff_pt1 = points[point_idx1].astype(np.int64)
+		max_diff_pt2 = points[point_idx2].astype(np.int64)
 
 		type_of_line = 0 #horizontal(0) or vertical(1)
 		difference = max_diff_pt1 - max_diff_pt2
@@ -135,16 +299,6 @@ class Track():
 			type_of_line = 1 #vertical
 
 		return (type_of_line, max_diff_pt1, max_diff_pt2)
-	
-	#=============================
-	# find_wall_points()
-	#	- find the wall points of the track
-	#@return	list of starting points as tuples
-	#=============================
-	def find_wall_points(self, track):
-		#Search for character '#'
-		wall_points = [(ix,iy) for ix, row in enumerate(track) for iy, i in enumerate(row) if i == self.WALL_CHAR]
-		return wall_points
 
 	#=============================
 	# is_wall_point()
@@ -157,7 +311,7 @@ class Track():
 			return True
 		elif(position[0] < 0 or position[1] < 0):
 			return True
-		elif(self.data[position[0]][position[1]] == self.WALL_CHAR):
+		elif(self.grid.item(position[0], position[1]) == self.WALL_CODE):
 			return True
 		else:
 			return False
@@ -169,7 +323,7 @@ class Track():
 	#@return	bool result
 	#=============================
 	def is_track_point(self, position):
-		if (self.data[position[0], position[1]] == self.TRK_CHAR):
+		if (self.grid.item(position[0], position[1]) == self.TRK_CODE):
 			return True
 		else:
 			return False
@@ -181,33 +335,11 @@ class Track():
 	#@return	bool result
 	#=============================
 	def is_start_point(self, position):
-		if (self.data[position[0], position[1]] == self.START_CHAR):
+		if (self.grid.item(position[0], position[1]) == self.START_CODE):
 			return True
 		else:
 			return False
 
-	#=============================
-	# is_track_point()
-	#	- determine if position is track 
-	#@param	position	(x,y)
-	#@return	bool result
-	#=============================
-	def is_track_point(self, position):
-		if (self.data[position[0], position[1]] == self.track_char):
-			return True
-		else:
-			return False
-
-	#=============================
-	# find_track_points()
-	#	- find the track points of the track
-	#@return	list of starting points as tuples
-	#=============================
-	def find_track_points(self, track):
-		#Search for character track_char
-		track_points = [(ix,iy) for ix, row in enumerate(track) for iy, i in enumerate(row) if i == self.TRK_CHAR]
-		return track_points
-
 	#=============================
 	# find_closest_track_point()
 	#	- find the track point which is closest 
@@ -224,9 +356,12 @@ class Track():
 	#=============================
 	# find_closest_starting_point()
 	#	- find the starting points of the track
+	#	- positions on the grid are a lookup in closest_start_idx (no allocation)
 	#@return	list of starting points as tuples
 	#=============================
 	def find_closest_starting_point(self, position):
+		if 0 <= position[0] < self.shape[0] and 0 <= position[1] < self.shape[1]:
+			return self.start_points[self.closest_start_idx[position[0], position[1]]]
 		pos = np.array(position)
 		starting_points = np.array(self.start_points)
 		difference_vals = np.sum(np.abs(starting_points - pos), axis=1)
@@ -288,6 +423,105 @@ class Track():
 
 		return crossed_finish_line
 
+	#=============================
+	# is_wall_point_vectorized()
+	#	- is_wall_point() for whole arrays of positions at once
+	#@param	position	(x_array, y_array) of any (matching) shape
+	#@return	bool array, True where wall or off the grid
+	#=============================
+	def is_wall_point_vectorized(self, position):
+		return self.get_cell_codes_vectorized(position) == self.WALL_CODE
+
+	#=============================
+	# get_cell_codes_vectorized()
+	#	- cell codes for whole arrays of positions at once, off the grid counts as wall
+	#@param	position	(x_array, y_array) of any (matching) shape
+	#@return	int8 array of cell codes
+	#=============================
+	def get_cell_codes_vectorized(self, position):
+		x = np.asarray(position[0])
+		y = np.asarray(position[1])
+		off_grid = (x < 0) | (y < 0) | (x > self.shape[0]-1) | (y > self.shape[1]-1)
+		x_safe = np.clip(x, 0, self.shape[0]-1)
+		y_safe = np.clip(y, 0, self.shape[1]-1)
+		return np.where(off_grid, self.WALL_CODE, self.grid[x_safe, y_safe]).astype(np.int8)
+
+	#=============================
+	# is_track_point_vectorized()
+	#	- is_track_point() for whole arrays of positions at once (False off the grid)
+	#@param	position	(x_array, y_array) of any (matching) shape
+	#@return	bool array
+	#=============================
+	def is_track_point_vectorized(self, position):
+		return self.get_cell_codes_vectorized(position) == self.TRK_CODE
+
+	#=============================
+	# is_start_point_vectorized()
+	#	- is_start_point() for whole arrays of positions at once (False off the grid)
+	#@param	position	(x_array, y_array) of any (matching) shape
+	#@return	bool array
+	#=============================
+	def is_start_point_vectorized(self, position):
+		return self.get_cell_codes_vectorized(position) == self.START_CODE
+
+	#=============================
+	# is_finish_point_vectorized()
+	#	- is the position a finish cell, for whole arrays of positions at once (False off the grid)
+	#@param	position	(x_array, y_array) of any (matching) shape
+	#@return	bool array
+	#=============================
+	def is_finish_point_vectorized(self, position):
+		return self.get_cell_codes_vectorized(position) == self.END_CODE
+
+	#=============================
+	# find_closest_starting_point_vectorized()
+	#	- find_closest_starting_point() for whole arrays of positions at once
+	#	- ties resolve to the first start point, same as np.argmin in the scalar version
+	#	- positions on the grid are a gather from closest_start_idx
+	#@param	position	(x_array, y_array) of any (matching) shape
+	#@return	(x_array, y_array) of closest starting points
+	#=============================
+	def find_closest_starting_point_vectorized(self, position):
+		x = np.asarray(position[0])
+		y = np.asarray(position[1])
+		starting_points = self.start_point_array
+		if np.all((x >= 0) & (y >= 0) & (x < self.shape[0]) & (y < self.shape[1])):
+			closest_idx = self.closest_start_idx[x, y]
+		else:
+			difference_vals = np.abs(x[..., np.newaxis] - starting_points[:, 0]) + \
+					np.abs(y[..., np.newaxis] - starting_points[:, 1])
+			closest_idx = np.argmin(difference_vals, axis=-1)
+		return (starting_points[closest_idx, 0], starting_points[closest_idx, 1])
+
+	#=============================
+	# check_finish_line_vectorized()
+	#	- check_finish_line() for whole arrays of moves at once
+	#	- mirrors the scalar version exactly (including which coordinate the vertical bounds check uses)
+	#@param		position1	(x_array, y_array) positions before the move
+	#@param		position2	(x_array, y_array) positions after the move
+	#@return	bool array, True where the move is at or beyond the finish line
+	#=============================
+	def check_finish_line_vectorized(self, position1, position2):
+		if self.finish_line[0] == 0: #horizontal line
+			line_idx = 0
+			bounds_idx = 1
+		else: #vertical line
+			line_idx = 1
+			bounds_idx = 0
+		#NOTE: the scalar version checks position1[1] against the bounds for both line types
+		bounds_position = np.asarray(position1[1])
+
+		line_val = self.finish_line[1][line_idx]
+		p1_diff = line_val - np.asarray(position1[line_idx])
+		p2_diff = line_val - np.asarray(position2[line_idx])
+		line_check = ((p1_diff < 0) & (0 < p2_diff)) | ((p2_diff < 0) & (0 < p1_diff)) | (p2_diff == 0)
+
+		bound1 = self.finish_line[1][bounds_idx]
+		bound2 = self.finish_line[2][bounds_idx]
+		bounds_check = (min(bound1, bound2) <= bounds_position) & (bounds_position <= max(bound1, bound2))
+
+		return line_check & bounds_check
+
 
 #=============================
 # MAIN PROGRAM
@@ -305,7 +539,14 @@ def main():
 	print('file_name: ', file_name)
 	print()
 
+	start = time.time()
+	Track(file_name, cache_dir=None)
+	print('parse time (s):', time.time() - start)
+	Track(file_name)
+	start = time.time()
 	track = Track(file_name)
+	print('cached load time (s):', time.time() - start, track.cache_file)
+	print()
 
 	print('LOG BASIC DATA')
 	print('----------------')
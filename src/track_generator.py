@@ -0,0 +1,191 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Random track generation, tracks of any size for scaling benchmarks
+
+import argparse
+import os
+import time
+import numpy as np
+from track import Track, DEFAULT_CACHE_DIR
+
+GENERATED_TRACK_DIR = os.path.join(DEFAULT_CACHE_DIR, 'generated_tracks')
+
+#=============================
+# TrackGenerator
+#
+# - Class to generate random tracks in the track file format (a 'rows,cols' line, then rows of '#', '.', 'S', 'F')
+# - the track is a corridor corridor_width cells wide along num_turns + 1 straight segments, alternating between
+#	vertical & horizontal, carved out of walls (the outer border is always wall)
+# - start line across the open end of the first segment, finish line across the open end of the last one,
+#	the last segment is always vertical so the finish line is along a row (like every track in data/)
+# - consecutive segments share the corridor_width square at their corner, so there is always a path from the start line
+#	to the finish line, a layout where the two lines land on or next to each other is redrawn
+#=============================
+class TrackGenerator():
+
+	#=============================
+	# __init__()
+	#@param	rows, cols			size of the track, at least 2 * corridor_width + 3
+	#@param	corridor_width		width of the corridor & length of the start & finish lines
+	#@param	num_turns			corners in the corridor
+	#@param	seed				seed of the layout, same seed = same track
+	#@param	max_attempts		layouts to draw before giving up
+	#=============================
+	def __init__(self, rows, cols, corridor_width=4, num_turns=4, seed=None, max_attempts=100):
+		self.TRK_CHAR = ord('.')
+		self.WALL_CHAR = ord('#')
+		self.START_CHAR = ord('S')
+		self.END_CHAR = ord('F')
+
+		if min(rows, cols) < 2 * corridor_width + 3:
+			raise ValueError('a %dx%d track is too small for a corridor %d wide' % (rows, cols, corridor_width))
+		self.shape = (rows, cols)
+		self.corridor_width = corridor_width
+		self.num_turns = num_turns
+		self.max_attempts = max_attempts
+		self.random_generator = np.random.default_rng(seed)
+
+	#=============================
+	# get_waypoints()
+	#	- corners of the corridor, the top left cell of a corridor_width square each
+	#	- each segment moves along one axis (alternating, the last one along the rows) at least corridor_width + 1 cells
+	#@return	list of (x, y) waypoints, num_turns + 2 of them
+	#=============================
+	def get_waypoints(self):
+		#Corners stay inside the 1 cell wall border
+		max_corner = (self.shape[0] - 1 - self.corridor_width, self.shape[1] - 1 - self.corridor_width)
+		point = [int(self.random_generator.integers(1, max_corner[0] + 1)), int(self.random_generator.integers(1, max_corner[1] + 1))]
+		waypoints = [tuple(point)]
+		for segment in range(0, self.num_turns + 1):
+			axis = (self.num_turns - segment) % 2 #0 = along the rows (vertical), the last segment is vertical
+			choices = np.arange(1, max_corner[axis] + 1)
+			choices = choices[np.abs(choices - point[axis]) > self.corridor_width]
+			point[axis] = int(self.random_generator.choice(choices))
+			waypoints.append(tuple(point))
+		return waypoints
+
+	#=============================
+	# get_end_line()
+	#	- cells of the line across the open end of a segment
+	#@param	end_point		waypoint at the open end
+	#@param	other_point		waypoint at the other end of the segment
+	#@return	(x_slice, y_slice) of the line
+	#=============================
+	def get_end_line(self, end_point, other_point):
+		width = self.corridor_width
+		line = [slice(end_point[0], end_point[0] + width), slice(end_point[1], end_point[1] + width)]
+		axis = 0 if end_point[0] != other_point[0] else 1
+		#The edge of the corridor_width square facing away from the segment
+		edge = end_point[axis] if end_point[axis] < other_point[axis] else end_point[axis] + width - 1
+		line[axis] = slice(edge, edge + 1)
+		return tuple(line)
+
+	#=============================
+	# draw_track()
+	#	- one layout
+	#@return	uint8 array of track characters, None = the start & finish lines are too close
+	#=============================
+	def draw_track(self):
+		width = self.corridor_width
+		chars = np.full(self.shape, self.WALL_CHAR, dtype=np.uint8)
+		waypoints = self.get_waypoints()
+		for point1, point2 in zip(waypoints[:-1], waypoints[1:]):
+			chars[min(point1[0], point2[0]):max(point1[0], point2[0]) + width, min(point1[1], point2[1]):max(point1[1], point2[1]) + width] = \
+					self.TRK_CHAR
+
+		start_line = self.get_end_line(waypoints[0], waypoints[1])
+		finish_line = self.get_end_line(waypoints[-1], waypoints[-2])
+		chars[start_line] = self.START_CHAR
+		chars[finish_line] = self.END_CHAR
+
+		#Lines that touch (or overwrite each other) would let a car finish from the start line
+		start_points = np.argwhere(chars == self.START_CHAR)
+		finish_points = np.argwhere(chars == self.END_CHAR)
+		if len(start_points) < width or np.min(np.abs(start_points[:, np.newaxis] - finish_points).sum(axis=2)) <= width:
+			return None
+		return chars
+
+	#=============================
+	# generate()
+	#	- draw layouts until one is valid
+	#@return	uint8 array of track characters, shape (rows, cols)
+	#=============================
+	def generate(self):
+		for attempt in range(0, self.max_attempts):
+			chars = self.draw_track()
+			if chars is not None:
+				return chars
+		raise ValueError('no valid %dx%d layout w/ %d turns in %d attempts' % (self.shape[0], self.shape[1], self.num_turns, self.max_attempts))
+
+	#=============================
+	# write()
+	#	- generate a track & write it as a track file
+	#@param	file_name
+	#=============================
+	def write(self, file_name):
+		chars = self.generate()
+		newlines = np.full((self.shape[0], 1), ord('\n'), dtype=np.uint8)
+		with open(file_name, 'wb') as track_file:
+			track_file.write(b'%d,%d\n' % self.shape)
+			track_file.write(np.concatenate((chars, newlines), axis=1).tobytes())
+
+#=============================
+# get_generated_track()
+#	- file name of a generated track, generated into directory the first time it is asked for
+#@return	track file name
+#=============================
+def get_generated_track(rows, cols, corridor_width=4, num_turns=4, seed=0, directory=GENERATED_TRACK_DIR):
+	file_name = os.path.join(directory, 'generated_%dx%d_width%d_turns%d_seed%d.txt' % (rows, cols, corridor_width, num_turns, seed))
+	if not os.path.exists(file_name):
+		os.makedirs(directory, exist_ok=True)
+		TrackGenerator(rows, cols, corridor_width, num_turns, seed).write(file_name)
+	return file_name
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing track generation')
+	print()
+	parser = argparse.ArgumentParser(description='test track generation')
+	parser.add_argument('rows', type=int, help='track rows')
+	parser.add_argument('cols', type=int, help='track columns')
+	parser.add_argument('--corridor_width', type=int, default=4, help='width of the corridor')
+	parser.add_argument('--num_turns', type=int, default=4, help='corners in the corridor')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the layout')
+	parser.add_argument('--output', type=str, default=None, help='track file to write, default = the generated track cache')
+	parser.add_argument('--print_track', action='store_true', help='print the track')
+	parser.add_argument('--check_path', action='store_true', help='find the cell moves from the start line to the finish (slow on big tracks)')
+	args = parser.parse_args()
+	print('INPUT VALUES')
+	print('--------------')
+	print('rows: ', args.rows)
+	print('cols: ', args.cols)
+	print('corridor_width: ', args.corridor_width)
+	print('num_turns: ', args.num_turns)
+	print('seed: ', args.seed)
+	print()
+
+	start = time.time()
+	if args.output is not None:
+		TrackGenerator(args.rows, args.cols, args.corridor_width, args.num_turns, args.seed).write(args.output)
+		file_name = args.output
+	else:
+		file_name = get_generated_track(args.rows, args.cols, args.corridor_width, args.num_turns, args.seed)
+	print('track file:', file_name, 'seconds:', time.time() - start)
+
+	start = time.time()
+	track = Track(file_name)
+	print('load seconds:', time.time() - start)
+	print('valid points:', len(track.valid_point_array), 'start points:', len(track.start_points), 'finish line:', track.finish_line)
+	if args.check_path:
+		finish_distances = track.find_finish_distances()
+		print('cell moves from the start line to the finish:', finish_distances[track.start_point_array[:, 0], track.start_point_array[:, 1]].tolist())
+	if args.print_track:
+		track.print_track()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,187 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Training instrumentation: listeners & the metrics every train() hands them
+
+import json
+import time
+
+#=============================
+# TrainingListener
+#
+# - Base class of listeners to training runs (see RaceSimulator.add_training_listener())
+# - a train() run calls start_training() once, end_sweep() (value & policy iteration) or end_episode() (q-learning & SARSA)
+#	after every sweep or episode & end_training() once, each w/ a dict of metrics (see TrainingMetrics)
+# - every hook does nothing, override the ones you need
+#=============================
+class TrainingListener():
+
+	def start_training(self, metrics):
+		pass
+
+	def end_sweep(self, metrics):
+		pass
+
+	def end_episode(self, metrics):
+		pass
+
+	def end_training(self, metrics):
+		pass
+
+#=============================
+# JsonlListener
+#
+# - TrainingListener writing one json object per line: the metrics plus 'event' ('start_training', 'sweep', 'episode'
+#	or 'end_training')
+# - episode_interval = write every n-th episode only, long runs have many short episodes
+#=============================
+class JsonlListener(TrainingListener):
+
+	#=============================
+	# __init__()
+	#@param	file_name			.jsonl file, overwritten
+	#@param	episode_interval	write episodes 1, 1 + n, 1 + 2n, ...
+	#=============================
+	def __init__(self, file_name, episode_interval=1):
+		self.file_name = file_name
+		self.episode_interval = episode_interval
+		self.jsonl_file = open(file_name, 'w')
+
+	#=============================
+	# write()
+	#	- one event as a json line
+	#=============================
+	def write(self, event, metrics):
+		record = {'event': event}
+		record.update(metrics)
+		self.jsonl_file.write(json.dumps(record) + '\n')
+
+	def start_training(self, metrics):
+		self.write('start_training', metrics)
+
+	def end_sweep(self, metrics):
+		self.write('sweep', metrics)
+
+	def end_episode(self, metrics):
+		if (metrics['episode'] - 1) % self.episode_interval == 0:
+			self.write('episode', metrics)
+
+	def end_training(self, metrics):
+		self.write('end_training', metrics)
+		self.jsonl_file.flush()
+
+	#=============================
+	# close()
+	#	- close the file, nothing can be written afterwards
+	#=============================
+	def close(self):
+		self.jsonl_file.close()
+
+#=============================
+# TrainingMetrics
+#
+# - Class to time & count one train() run & hand the metrics to the listeners
+# - only created when a listener is attached (see RaceSimulator.start_training_metrics()), a train() run w/out
+#	listeners doesn't time or count anything
+# - start_training: solver, method (the train function), num_states, num_actions, table_bytes (value, q-value & policy tables),
+#	transition_model_bytes
+# - sweep: sweep, seconds, states_updated, states_per_second, bellman_residual (max value change of the sweep)
+# - episode: episode, seconds, steps, steps_per_second, epsilon, learning_rate, max_q_change (None = not tracked), finished
+# - end_training: start_training's metrics plus seconds, sweeps, episodes, states_updated, steps,
+#	states_per_second & steps_per_second over the whole run
+#=============================
+class TrainingMetrics():
+
+	#=============================
+	# __init__()
+	#@param	listeners	TrainingListeners to report to
+	#@param	run_info	dict of start_training's metrics
+	#=============================
+	def __init__(self, listeners, run_info):
+		self.listeners = listeners
+		self.run_info = run_info
+
+	#=============================
+	# start()
+	#	- start the clock & counters
+	#=============================
+	def start(self):
+		self.sweeps = 0
+		self.episodes = 0
+		self.states_updated = 0
+		self.steps = 0
+		for listener in self.listeners:
+			listener.start_training(dict(self.run_info))
+		self.start_time = time.perf_counter()
+		self.last_time = self.start_time
+
+	#=============================
+	# get_seconds()
+	#	- seconds since the last sweep or episode
+	#=============================
+	def get_seconds(self):
+		now = time.perf_counter()
+		seconds = now - self.last_time
+		self.last_time = now
+		return seconds
+
+	#=============================
+	# end_sweep()
+	#@param	states_updated		states backed up in the sweep
+	#@param	bellman_residual	max value change of the sweep
+	#=============================
+	def end_sweep(self, states_updated, bellman_residual):
+		seconds = self.get_seconds()
+		self.sweeps += 1
+		self.states_updated += states_updated
+		metrics = {'sweep': self.sweeps,
+				'seconds': seconds,
+				'states_updated': int(states_updated),
+				'states_per_second': states_updated / seconds if seconds > 0 else 0.0,
+				'bellman_residual': float(bellman_residual)}
+		for listener in self.listeners:
+			listener.end_sweep(metrics)
+
+	#=============================
+	# end_episode()
+	#@param	steps			environment steps of the episode
+	#@param	max_q_change	biggest absolute q-value change of the episode, None = not tracked
+	#@param	finished		crossed the finish line (False = ran out of steps)
+	#=============================
+	def end_episode(self, steps, epsilon, learning_rate, max_q_change, finished):
+		seconds = self.get_seconds()
+		self.episodes += 1
+		self.steps += steps
+		metrics = {'episode': self.episodes,
+				'seconds': seconds,
+				'steps': int(steps),
+				'steps_per_second': steps / seconds if seconds > 0 else 0.0,
+				'epsilon': float(epsilon),
+				'learning_rate': float(learning_rate),
+				'max_q_change': float(max_q_change) if max_q_change is not None else None,
+				'finished': bool(finished)}
+		for listener in self.listeners:
+			listener.end_episode(metrics)
+
+	#=============================
+	# end_training()
+	#	- totals of the run
+	#@param	episodes, steps		totals for train functions that don't report every episode, None = the counted ones
+	#=============================
+	def end_training(self, episodes=None, steps=None):
+		seconds = time.perf_counter() - self.start_time
+		if episodes is not None:
+			self.episodes = episodes
+		if steps is not None:
+			self.steps = steps
+		metrics = dict(self.run_info)
+		metrics.update({'seconds': seconds,
+				'sweeps': self.sweeps,
+				'episodes': self.episodes,
+				'states_updated': int(self.states_updated),
+				'steps': int(self.steps),
+				'states_per_second': self.states_updated / seconds if seconds > 0 else 0.0,
+				'steps_per_second': self.steps / seconds if seconds > 0 else 0.0})
+		for listener in self.listeners:
+			listener.end_training(metrics)
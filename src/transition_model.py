@@ -0,0 +1,308 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Precomputed (deterministic) transition model of a track
+
+import argparse
+import hashlib
+import os
+import random
+import time
+import numpy as np
+from track import Track, DEFAULT_CACHE_DIR, get_track_hash, save_npz, load_npz
+from car import Car
+from path_table import PathTable
+
+DYNAMICS_VERSION = 2 #bump whenever Car/Track physics (or the cached tables) change so old caches are not reused
+
+#=============================
+# TransitionModel
+#
+# - Class to encapsulate the result of Car.accelerate() + Car.move() for every state-action of a track
+# - state = flat index of (x, y, x_vel_idx, y_vel_idx), velocities offset by 5 like the learners' tables
+# - action = flat index of (x_accel_idx, y_accel_idx), accelerations offset by 1, i.e. 3*(ax+1) + (ay+1)
+# - the arrays hold the outcome of an acceleration that works, a failed acceleration has the outcome of
+#	the (0,0) action, so stochastic dynamics need no extra arrays (& no separate cache)
+#=============================
+class TransitionModel():
+
+	#=============================
+	# __init__()
+	#	- load the model from the cache, or build (and cache) it, an unwritable cache_dir only costs the build next time
+	#@param	track		Track object, the cache key is the hash of track.file_name
+	#@param	crash_type	0 = minor crash, 1 = major crash
+	#@param	cache_dir	where to keep built models, None = do not cache
+	#@param	state_space	optional StateSpace, states (in & out) become its compact state ids
+	#@param	acceleration_failure	probability an acceleration has no effect (0 = deterministic)
+	#@param	path_table	optional PathTable, walls & the finish line count anywhere along a move (see Car.move())
+	#=============================
+	def __init__(self, track, crash_type=0, cache_dir=DEFAULT_CACHE_DIR, state_space=None, acceleration_failure=0, path_table=None):
+		self.track = track
+		self.crash_type = crash_type
+		self.path_table = path_table
+		self.cache_dir = cache_dir
+		self.state_space = state_space
+		self.acceleration_failure = acceleration_failure
+		self.accelerations = [[-1,-1],[-1,0],[-1,1], [0,-1],[0,0],[0,1], [1,-1],[1,0],[1,1]]
+		self.failure_action = self.accelerations.index([0,0]) #a failed acceleration acts like (0,0)
+		self.velocity_range = 11 # This is {+/-5} offset from 0
+		self.velocity_offset = 5
+		self.state_shape = (track.shape[0], track.shape[1], self.velocity_range, self.velocity_range)
+		self.num_states = int(np.prod(self.state_shape))
+		self.num_actions = len(self.accelerations)
+
+		self.from_cache = False
+		cache_file = self.get_cache_file()
+		if cache_file is not None and self.load(cache_file):
+			self.from_cache = True
+		else:
+			#Only the state space's states are built, walls & dropped states never take memory
+			self.build(self.state_space)
+			if cache_file is not None:
+				try:
+					self.save(cache_file)
+				except OSError as error:
+					print('TransitionModel: could not cache', cache_file, '-', error)
+		if self.state_space is not None:
+			self.num_states = self.state_space.num_states
+
+	#=============================
+	# get_cache_file()
+	#	- cache file name, keyed by the hash of the track file, the crash type, path collisions, the dynamics version
+	#		& (for a model over a StateSpace) the hash of its states
+	#@return	path or None if not caching
+	#=============================
+	def get_cache_file(self):
+		if self.cache_dir is None:
+			return None
+		track_hash = get_track_hash(self.track.file_name)
+		track_name = os.path.splitext(os.path.basename(self.track.file_name))[0]
+		path_name = '_paths' if self.path_table is not None else ''
+		states_name = ''
+		if self.state_space is not None:
+			states_name = '_states%s' % hashlib.sha1(self.state_space.flat_states.tobytes()).hexdigest()[:16]
+		file_name = '%s_%s_crash%d%s%s_v%d.npz' % (track_name, track_hash[:16], self.crash_type, path_name, states_name, DYNAMICS_VERSION)
+		return os.path.join(self.cache_dir, file_name)
+
+	#=============================
+	# build()
+	#	- simulate Car.accelerate() + Car.move() for every state-action, a chunk of states (row by row) at a time
+	#	- same rules as the Car class: velocity limit per component, finish line checked before walls,
+	#		minor crash stays put, major crash goes to the closest starting point, both zero the velocity
+	#	- finishing state-actions point back at their own state (their next value is never used)
+	#	- crash = 1 where the move hit a wall (for reporting, the crash is already in next_state)
+	#@param	state_space		StateSpace to build (states in & out are its ids), None = every state of the full grid
+	#@param	chunk_states	states simulated at once, bounds the temporary arrays
+	#=============================
+	def build(self, state_space=None, chunk_states=1 << 16):
+		flat_states = state_space.flat_states if state_space is not None else None
+		num_states = len(flat_states) if flat_states is not None else self.num_states
+		velocities = np.arange(self.velocity_range) - self.velocity_offset
+		accelerations = np.array(self.accelerations)
+		self.next_state = np.empty((num_states, self.num_actions), dtype=np.int32)
+		self.finish = np.empty((num_states, self.num_actions), dtype=np.int32)
+		self.crash = np.empty((num_states, self.num_actions), dtype=np.int8)
+
+		for chunk_start in range(0, num_states, chunk_states):
+			chunk = slice(chunk_start, min(chunk_start + chunk_states, num_states))
+			if flat_states is not None:
+				chunk_flat_states = flat_states[chunk].astype(np.int64)
+			else:
+				chunk_flat_states = np.arange(chunk.start, chunk.stop, dtype=np.int64)
+			state, y_vel_idx = np.divmod(chunk_flat_states, self.velocity_range)
+			state, x_vel_idx = np.divmod(state, self.velocity_range)
+			x, y = np.divmod(state, self.state_shape[1])
+			#(states, 1) against the (actions,) accelerations
+			x = x.reshape(-1,1)
+			y = y.reshape(-1,1)
+			x_vel = velocities[x_vel_idx].reshape(-1,1)
+			y_vel = velocities[y_vel_idx].reshape(-1,1)
+			chunk_shape = (len(chunk_flat_states), self.num_actions)
+
+			#accelerate()
+			new_x_vel = x_vel + accelerations[:,0]
+			new_y_vel = y_vel + accelerations[:,1]
+			new_x_vel = np.where(np.abs(new_x_vel) <= self.velocity_offset, new_x_vel, x_vel)
+			new_y_vel = np.where(np.abs(new_y_vel) <= self.velocity_offset, new_y_vel, y_vel)
+
+			#move()
+			position = (np.broadcast_to(x, chunk_shape), np.broadcast_to(y, chunk_shape))
+			next_position = (position[0] + new_x_vel, position[1] + new_y_vel)
+			if self.path_table is not None:
+				finish, crash = self.path_table.get_path_result_vectorized(position, (new_x_vel, new_y_vel))
+			else:
+				finish = self.track.check_finish_line_vectorized(position, next_position)
+				crash = ~finish & self.track.is_wall_point_vectorized(next_position)
+			if self.crash_type == 0:
+				crash_position = position
+			else:
+				#Only depends on the cell, so look it up once per state
+				crash_position = self.track.find_closest_starting_point_vectorized((x, y))
+
+			next_x = np.where(finish, x, np.where(crash, crash_position[0], next_position[0]))
+			next_y = np.where(finish, y, np.where(crash, crash_position[1], next_position[1]))
+			next_x_vel = np.where(finish, x_vel, np.where(crash, 0, new_x_vel)) + self.velocity_offset
+			next_y_vel = np.where(finish, y_vel, np.where(crash, 0, new_y_vel)) + self.velocity_offset
+
+			next_state = np.ravel_multi_index((next_x, next_y, next_x_vel, next_y_vel), self.state_shape)
+			if state_space is not None:
+				#The state space is closed under the transitions, every next state has an id
+				next_state = state_space.state_ids[next_state]
+			self.next_state[chunk] = next_state
+			self.finish[chunk] = finish
+			self.crash[chunk] = crash
+		self.reward = np.where(self.finish == 1, 0, -1).astype(np.int32)
+
+	#=============================
+	# save()
+	#	- write the model arrays to a .npz file (atomically, see save_npz())
+	#=============================
+	def save(self, file_name):
+		save_npz(file_name, {'next_state': self.next_state, 'reward': self.reward, 'finish': self.finish, 'crash': self.crash})
+
+	#=============================
+	# load()
+	#	- read the model arrays from a .npz file
+	#@return	True if loaded, False = missing, unreadable or incomplete file (build() instead)
+	#=============================
+	def load(self, file_name):
+		model_arrays = load_npz(file_name)
+		if model_arrays is None or any(name not in model_arrays for name in ['next_state', 'reward', 'finish', 'crash']):
+			return False
+		self.next_state = model_arrays['next_state']
+		self.reward = model_arrays['reward']
+		self.finish = model_arrays['finish']
+		self.crash = model_arrays['crash']
+		return True
+
+	#=============================
+	# encode_state()
+	#	- (position, velocity) to state index
+	#@return	int state
+	#=============================
+	def encode_state(self, position, velocity):
+		if self.state_space is not None:
+			return self.state_space.get_state_id(position, velocity)
+		x_vel_idx = velocity[0] + self.velocity_offset
+		y_vel_idx = velocity[1] + self.velocity_offset
+		return ((position[0] * self.state_shape[1] + position[1]) * self.velocity_range + x_vel_idx) * self.velocity_range + y_vel_idx
+
+	#=============================
+	# decode_state()
+	#	- state index to table indices
+	#@return	(x_idx, y_idx, x_vel_idx, y_vel_idx), velocities offset by 5
+	#=============================
+	def decode_state(self, state):
+		if self.state_space is not None:
+			return self.state_space.get_state(state)
+		state, y_vel_idx = divmod(state, self.velocity_range)
+		state, x_vel_idx = divmod(state, self.velocity_range)
+		x_idx, y_idx = divmod(state, self.state_shape[1])
+		return (x_idx, y_idx, x_vel_idx, y_vel_idx)
+
+	#=============================
+	# get_outcome()
+	#	- result of a state-action when the acceleration works
+	#@return	(next_state, reward, crossed_finish_line)
+	#=============================
+	def get_outcome(self, state, action):
+		return (int(self.next_state[state, action]), int(self.reward[state, action]), self.finish[state, action] == 1)
+
+	#=============================
+	# step()
+	#	- drop-in replacement for car.accelerate(acceleration) + car.move()
+	#	- samples a failed acceleration w/ probability acceleration_failure, like Car
+	#@param	state	state index
+	#@param	action	action index (into self.accelerations)
+	#@param	random_generator	np.random.Generator the failures are drawn from, None = the random module (like Car)
+	#@return	(next_state, reward, crossed_finish_line)
+	#=============================
+	def step(self, state, action, random_generator=None):
+		if self.acceleration_failure > 0 and \
+				(random_generator.random() if random_generator is not None else random.random()) < self.acceleration_failure:
+			action = self.failure_action
+		return self.get_outcome(state, action)
+
+	#=============================
+	# get_expected_q()
+	#	- turn q-values of the (deterministic) outcomes into expected q-values, in place
+	#	- q(s,a) = (1 - p) * q_works(s,a) + p * q_works(s,(0,0)), one weighted sum over the whole array
+	#@param	q_vals	ndarray, last axis = actions
+	#@return	q_vals
+	#=============================
+	def get_expected_q(self, q_vals):
+		if self.acceleration_failure > 0:
+			failed_q_vals = q_vals[..., self.failure_action:self.failure_action + 1] * self.acceleration_failure
+			q_vals *= 1 - self.acceleration_failure
+			q_vals += failed_q_vals
+		return q_vals
+
+	#=============================
+	# get_expected_q_values()
+	#	- get_expected_q() for a python list of one state's q-values
+	#@return	list of q-values
+	#=============================
+	def get_expected_q_values(self, q_vals):
+		if self.acceleration_failure > 0:
+			failed_q_val = q_vals[self.failure_action] * self.acceleration_failure
+			q_vals = [q_val * (1 - self.acceleration_failure) + failed_q_val for q_val in q_vals]
+		return q_vals
+
+	#=============================
+	# get_bytes()
+	#	- bytes the tables take
+	#=============================
+	def get_bytes(self):
+		return self.next_state.nbytes + self.reward.nbytes + self.finish.nbytes + self.crash.nbytes
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - testing transition model')
+	print()
+	parser = argparse.ArgumentParser(description='test transition model')
+	parser.add_argument('file_name', type=str, help='track file name')
+	parser.add_argument('crash_algo', type=int, help='crash algorithm, 0 or 1')
+	parser.add_argument('--samples', type=int, default=10000, help='number of random state-actions to check against Car')
+	parser.add_argument('--path_collisions', action='store_true', help='check walls & the finish line along the whole path of a move')
+	args = parser.parse_args()
+	file_name = args.file_name
+	crash_algo = args.crash_algo
+	print('INPUT VALUES')
+	print('--------------')
+	print('file_name: ', file_name)
+	print('crash_algo: ', crash_algo)
+	print()
+
+	track = Track(file_name)
+	path_table = PathTable(track) if args.path_collisions else None
+	start = time.time()
+	model = TransitionModel(track, crash_algo, cache_dir=None, path_table=path_table)
+	print('build time (s):', time.time() - start)
+	TransitionModel(track, crash_algo, path_table=path_table) #make sure the cache is populated
+	start = time.time()
+	model = TransitionModel(track, crash_algo, path_table=path_table)
+	print('cached load time (s):', time.time() - start, 'from cache:', model.from_cache)
+	print('states:', model.num_states, 'actions:', model.num_actions)
+	print('bytes:', model.get_bytes())
+
+	#Cross-check against the Car simulation
+	mismatches = 0
+	for idx in range(args.samples):
+		state = random.randrange(model.num_states)
+		action = random.randrange(model.num_actions)
+		x_idx, y_idx, x_vel_idx, y_vel_idx = model.decode_state(state)
+		car = Car(track, [x_idx, y_idx], [x_vel_idx - model.velocity_offset, y_vel_idx - model.velocity_offset], crash_algo,
+				path_table=path_table)
+		car.accelerate(model.accelerations[action])
+		crossed_finish = car.move()
+		next_state, reward, done = model.get_outcome(state, action)
+		if done != crossed_finish or (not done and next_state != model.encode_state(car.position, car.velocity)):
+			mismatches += 1
+	print('mismatches vs Car:', mismatches, 'of', args.samples)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,92 @@
+#!/usr/local/bin/python3
+
+#@author		Brandon Tarney
+#@date			12/5/2018
+#@description	Value iteration convergence report
+
+import argparse
+import time
+import numpy as np
+from reinforcement_learning_value_iteration import ReinforcementLearningValueIteration
+from reinforcement_learning_policy_iteration import ReinforcementLearningPolicyIteration
+
+#=============================
+# run_value_iteration()
+#	- train one value iteration model & time it (the transition model is built before the clock starts)
+#@return	(model, training iterations, seconds)
+#=============================
+def run_value_iteration(track_file, crash_algo, engine, mode, workers=1, max_iterations=999, acceleration_failure=0):
+	value_iteration = ReinforcementLearningValueIteration(track_file, engine, acceleration_failure=acceleration_failure)
+	value_iteration.get_transition_model(crash_algo)
+	start_time = time.time()
+	learn_result = value_iteration.train(max_iterations, crash_algo, mode, workers)
+	return (value_iteration, learn_result[0], time.time() - start_time)
+
+#=============================
+# run_policy_iteration()
+#	- train one policy iteration model & time it, same as run_value_iteration()
+#@return	(model, policy iterations, seconds)
+#=============================
+def run_policy_iteration(track_file, crash_algo, evaluation, max_iterations=999, acceleration_failure=0):
+	policy_iteration = ReinforcementLearningPolicyIteration(track_file, evaluation, acceleration_failure=acceleration_failure)
+	policy_iteration.get_transition_model(crash_algo)
+	start_time = time.time()
+	learn_result = policy_iteration.train(max_iterations, crash_algo)
+	return (policy_iteration, learn_result[0], time.time() - start_time)
+
+#=============================
+# get_policy_indices()
+#	- policy table as acceleration indices, whichever engine was used
+#=============================
+def get_policy_indices(value_iteration):
+	if value_iteration.engine == 'numpy':
+		return np.array(value_iteration.p_table)
+	return np.array([value_iteration.accelerations.index(list(policy)) for policy in value_iteration.p_table])
+
+#=============================
+# MAIN PROGRAM
+#=============================
+def main():
+	print('Main() - value iteration convergence report')
+	parser = argparse.ArgumentParser(description='value iteration convergence report')
+	parser.add_argument('track_files', type=str, nargs='+', help='track file names')
+	parser.add_argument('--crash_algorithms', type=int, nargs='+', default=[0, 1], help='crash algos: 0 = minor, 1 = major')
+	parser.add_argument('--engines', type=str, nargs='+', default=['numpy', 'loop'], help='value iteration engines')
+	parser.add_argument('--modes', type=str, nargs='+', default=['jacobi', 'gauss_seidel', 'prioritized'], help='update modes')
+	parser.add_argument('--workers', type=int, nargs='+', default=[1], help='worker counts (only numpy engine jacobi uses > 1)')
+	parser.add_argument('--acceleration_failures', type=float, nargs='+', default=[0], help='acceleration failure probabilities')
+	parser.add_argument('--policy_evaluations', type=str, nargs='*', default=['linear', 'modified'], help='policy iteration evaluations to compare against')
+	args = parser.parse_args()
+
+	print()
+	print('track, crash algo, acceleration failure, engine, mode, workers, sweeps, seconds, max value diff vs first, policy diffs vs first')
+	for track_file in args.track_files:
+		for crash_algo in args.crash_algorithms:
+			for acceleration_failure in args.acceleration_failures:
+				reference = None
+				for engine in args.engines:
+					for mode in args.modes:
+						for workers in args.workers:
+							if workers > 1 and (engine != 'numpy' or mode != 'jacobi'):
+								continue
+							value_iteration, sweeps, seconds = run_value_iteration(track_file, crash_algo, engine, mode, workers,
+									acceleration_failure=acceleration_failure)
+							values = np.array(value_iteration.v_table)
+							policy = get_policy_indices(value_iteration)
+							if reference is None:
+								reference = (values, policy)
+							value_diff = np.max(np.abs(values - reference[0]))
+							policy_diffs = np.sum(policy != reference[1])
+							print(track_file, crash_algo, acceleration_failure, engine, mode, workers, sweeps, '%.4f' % seconds, value_diff, policy_diffs)
+				#Policy differences w/ a ~0 value difference are ties between equally good actions
+				for evaluation in args.policy_evaluations:
+					policy_iteration, iterations, seconds = run_policy_iteration(track_file, crash_algo, evaluation,
+							acceleration_failure=acceleration_failure)
+					value_diff = np.max(np.abs(policy_iteration.v_table - reference[0]))
+					policy_diffs = np.sum(policy_iteration.p_table != reference[1])
+					print(track_file, crash_algo, acceleration_failure, 'policy_iteration', evaluation, 1, iterations, '%.4f' % seconds,
+							value_diff, policy_diffs)
+
+
+if __name__ == '__main__':
+	main()